@@ -4,15 +4,37 @@ DeepResearch Flask 微服务
 通过 OpenRouter API 调用 Tongyi-DeepResearch-30B-A3B 模型
 为 ThinkCraft 提供深度研究能力
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from openai import OpenAI
 from deep_research_client import DeepResearchClient
+from cache import SizedTTLCache, TTLCache, fingerprint
+from search_cache import SearchResultCache
+from jobs import JobCancelled, JobManager
+from keyword_matcher import compile_keywords
+from source_dedup import dedupe_sources
+from prompt_budget import estimate_tokens, fit_to_budget
+from request_context import RequestContext
+from prompt_templates import TemplateRegistry, compile_template
+from chapters import DOCUMENT_CHAPTERS, get_chapter
+from http_transport import get_default_transport
+from retry_policy import RetriesExhausted, RetryPolicy, find_error
+from config import Config
+from circuit_breaker import BreakerRegistry, CircuitOpenError, FailoverChain, ProvidersUnavailable
+import batch_ranking
+import metrics
+from profiling import RequestProfiler
+from single_flight import FlightTimeout, LeaderFailed, SingleFlight
+import deadlines
+from deadlines import DeadlineExceeded, RequestCancelled
+from domain_reputation import get_domain_reputation, parse_host, parse_hosts
 from pathlib import Path
-from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
 import os
 from dotenv import load_dotenv
 import time
+import json
+import contextvars
 import logging
 import re
 
@@ -31,7 +53,8 @@ CORS(app)
 
 # OpenRouter 配置
 OPENROUTER_API_KEY = os.getenv('OPENROUTER_API_KEY')
-OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+# 可指向 OpenRouter 兼容网关或本地替身服务（基准测试）
+OPENROUTER_BASE_URL = os.getenv('OPENROUTER_BASE_URL') or 'https://openrouter.ai/api/v1'
 # 支持配置模型名称，默认使用 DeepResearch，可以设置为免费模型进行测试
 # 免费模型示例: openrouter/auto (自动路由到免费模型)
 MODEL_NAME = os.getenv('OPENROUTER_MODEL', 'alibaba/tongyi-deepresearch-30b-a3b')
@@ -44,235 +67,188 @@ DEEPRESEARCH_API_URL = os.getenv('DEEPRESEARCH_API_URL')
 
 # 超时配置
 REQUEST_TIMEOUT = 600  # 10分钟
+# 请求整体截止时间（秒），可由请求头 X-DeepResearch-Timeout 或 ?timeout= 覆盖（不超过 REQUEST_TIMEOUT）；
+# 默认略短于 REQUEST_TIMEOUT，调用方放弃前结束并返回 504，不再继续消耗上游
+REQUEST_DEADLINE = float(os.getenv('DEEPRESEARCH_REQUEST_DEADLINE', 590))
+# 检索阶段为合成预留的时间（秒），检索至少可用剩余时间的 60%
+SYNTHESIS_RESERVE = float(os.getenv('DEEPRESEARCH_SYNTHESIS_RESERVE', 120))
+RETRIEVAL_MIN_SHARE = 0.6
+# 检索摘要最多使用剩余时间的比例，超出时使用默认 query
+SUMMARY_MAX_SHARE = 0.15
+
+# 上游 HTTP 连接池（OpenRouter 与检索提供商共享，按 host 分池并保持长连接）
+HTTP_TRANSPORT = get_default_transport()
 
 # 初始化 OpenAI 客户端（兼容 OpenRouter）
+# 重试由 UPSTREAM_POLICY 统一负责，关闭 SDK 自带重试避免叠加
 client = OpenAI(
     api_key=OPENROUTER_API_KEY,
     base_url=OPENROUTER_BASE_URL,
-    timeout=REQUEST_TIMEOUT
+    timeout=REQUEST_TIMEOUT,
+    max_retries=0,
+    http_client=HTTP_TRANSPORT.client_for(OPENROUTER_BASE_URL)
 )
 
+# 上游调用重试/退避/对冲策略（默认值取自 Config.MAX_RETRIES / RETRY_DELAY）
+UPSTREAM_POLICY = RetryPolicy.from_config(Config)
+# 检索摘要可降级为默认 query，只重试一次
+SUMMARY_MAX_RETRIES = 1
+
+# 检索结果缓存（SQLite，同主机多进程共享）
+SEARCH_CACHE = SearchResultCache.from_env()
+
 # 初始化 DeepResearch 客户端（检索/迭代）
 research_client = DeepResearchClient(
     api_key=DEEPRESEARCH_API_KEY,
     api_url=DEEPRESEARCH_API_URL,
-    provider=DEEPRESEARCH_PROVIDER
+    provider=DEEPRESEARCH_PROVIDER,
+    search_cache=SEARCH_CACHE,
+    transport=HTTP_TRANSPORT,
+    retry_policy=UPSTREAM_POLICY
 )
 
-# 章节提示词模板（作为兜底）
-CHAPTER_PROMPTS = {
-    'executive-summary': """
-基于以下产品创意，生成商业计划书的执行摘要：
-
-产品创意：
-{conversation}
-
-请提供：
-1. 项目概述（2-3句话）
-2. 核心价值主张
-3. 目标市场和用户
-4. 商业模式简述
-5. 关键里程碑
-
-要求：简洁专业，突出亮点，字数控制在500字以内。
-""",
-    'market-analysis': """
-基于以下产品创意，进行深度市场分析：
-
-产品创意：
-{conversation}
+# 检索提供商故障转移：主提供商之后依次尝试备用提供商，全部不可用时回退到 OpenRouter 单次生成
+RETRIEVAL_PROVIDERS = ('tavily', 'perplexity', 'openai', 'mock')
+# 不访问外部 API、无需密钥的提供商（mock 用于容量测试，见 mock_provider.py）
+KEYLESS_PROVIDERS = ('mock',)
 
-请提供：
-1. 目标市场规模（TAM/SAM/SOM）和增长趋势
-2. 用户画像、需求痛点和行为特征
-3. 市场驱动因素和发展机会
-4. 行业标准和最佳实践
-
-要求：提供数据支持和可靠来源，进行多轮网络搜索验证。
-""",
-    'competitive-landscape': """
-分析以下产品的竞争格局：
-
-产品创意：
-{conversation}
-
-请提供：
-1. 主要竞品列表和核心特点
-2. 竞争优势对比矩阵
-3. 市场定位和差异化策略
-4. 竞争壁垒和护城河
-
-要求：提供具体的竞品数据和市场份额信息。
-""",
-    'solution': """
-基于以下产品创意，详细描述解决方案：
-
-产品创意：
-{conversation}
 
-请提供：
-1. 产品功能和特性
-2. 技术架构和实现方案
-3. 用户体验设计
-4. 创新点和差异化
+def _fallback_research_clients():
+    """DEEPRESEARCH_FALLBACK_PROVIDERS 中已配置 DEEPRESEARCH_API_KEY_<PROVIDER> 的备用提供商"""
+    clients = []
+    for provider in os.getenv('DEEPRESEARCH_FALLBACK_PROVIDERS', '').split(','):
+        provider = provider.strip().lower()
+        if provider not in RETRIEVAL_PROVIDERS or provider == DEEPRESEARCH_PROVIDER:
+            continue
+        api_key = os.getenv(f'DEEPRESEARCH_API_KEY_{provider.upper()}')
+        if not api_key and provider not in KEYLESS_PROVIDERS:
+            logger.warning(f'备用检索提供商未配置 DEEPRESEARCH_API_KEY_{provider.upper()}，已跳过: {provider}')
+            continue
+        clients.append((provider, DeepResearchClient(
+            api_key=api_key,
+            api_url=os.getenv(f'DEEPRESEARCH_API_URL_{provider.upper()}'),
+            provider=provider,
+            search_cache=SEARCH_CACHE,
+            transport=HTTP_TRANSPORT,
+            retry_policy=UPSTREAM_POLICY
+        )))
+    return clients
 
-要求：技术可行，逻辑清晰。
-""",
-    'business-model': """
-基于以下产品创意，设计商业模式：
 
-产品创意：
-{conversation}
+FALLBACK_RESEARCH_CLIENTS = _fallback_research_clients()
 
-请提供：
-1. 收入模式和定价策略
-2. 成本结构分析
-3. 盈利能力预测
-4. 规模化路径
+# 每个上游一个熔断器（按滚动窗口的失败率与慢调用率打开，半开探测恢复）
+BREAKERS = BreakerRegistry.from_env()
+# 综合/单次生成/流式等长文本生成的耗时随输出长度（DEPTH_CONFIG.max_tokens）增长，正常即可超过慢调用阈值，
+# 单独设置阈值（0 表示不计慢调用，超时仍按失败统计），避免健康的长生成把共享的 openrouter 熔断器打开
+GENERATION_STAGES = frozenset({'synthesis', 'single-shot', 'stream'})
+GENERATION_SLOW_CALL = float(os.getenv('DEEPRESEARCH_BREAKER_GENERATION_SLOW_CALL', 0))
 
-要求：数据合理，逻辑严密。
-""",
-    'financial-projection': """
-基于以下产品创意，进行财务预测分析：
 
-产品创意：
-{conversation}
+def breaker_slow_call(name):
+    """OpenRouter 调用阶段的慢调用阈值覆盖值：长文本生成用 GENERATION_SLOW_CALL，其余沿用熔断器默认值"""
+    return GENERATION_SLOW_CALL if name in GENERATION_STAGES else None
 
-请提供：
-1. 收入模型和定价策略
-2. 成本结构和盈亏平衡点
-3. 3-5年财务预测
-4. 行业财务基准和估值参考
 
-要求：提供行业数据和财务模型参考。
-""",
-    'marketing-strategy': """
-基于以下产品创意，制定营销策略：
+def is_interruption(error):
+    """任务取消、请求截止时间耗尽或客户端断开：不计入上游失败，也不切换提供商"""
+    return any(find_error(error, kind) is not None for kind in (JobCancelled, DeadlineExceeded, RequestCancelled))
 
-产品创意：
-{conversation}
 
-请提供：
-1. 目标客户定位
-2. 营销渠道和推广策略
-3. 品牌建设和传播
-4. 获客成本和转化率预估
+FAILOVER = FailoverChain(BREAKERS, is_abort=is_interruption)
 
-要求：策略可行，数据支持。
-""",
-    'team-structure': """
-基于以下产品创意，设计团队架构：
+# 服务启动时预热上游连接（每个 host 的连接数，0 表示不预热）
+HTTP_PREWARM_CONNECTIONS = int(os.getenv('DEEPRESEARCH_HTTP_PREWARM', 2))
 
-产品创意：
-{conversation}
 
-请提供：
-1. 核心团队成员和职责
-2. 组织架构设计
-3. 人才招聘计划
-4. 团队文化和价值观
+def prewarm_upstreams():
+    """
+    后台预热已配置上游的连接
 
-要求：结构合理，职责清晰。
-""",
-    'risk-assessment': """
-基于以下产品创意，进行风险分析：
+    由服务入口（python app.py、asyncio 服务启动）调用，导入本模块（测试、基准）时不访问网络；
+    gunicorn 多进程部署可在 post_fork 钩子中调用。
+    """
+    return HTTP_TRANSPORT.warm(
+        ([OPENROUTER_BASE_URL] if OPENROUTER_API_KEY else [])
+        + ([research_client.api_url] if DEEPRESEARCH_API_KEY and DEEPRESEARCH_PROVIDER in RETRIEVAL_PROVIDERS
+           and DEEPRESEARCH_PROVIDER not in KEYLESS_PROVIDERS else [])
+        + [fallback.api_url for provider, fallback in FALLBACK_RESEARCH_CLIENTS if provider not in KEYLESS_PROVIDERS],
+        connections=HTTP_PREWARM_CONNECTIONS
+    )
 
-产品创意：
-{conversation}
+# 文档类型 -> 固定章节（按文档顺序），章节元数据见 chapters.py
+BUSINESS_PLAN_NINE_CHAPTERS = frozenset(DOCUMENT_CHAPTERS['business'])
+PROPOSAL_SIX_CHAPTERS = frozenset(DOCUMENT_CHAPTERS['proposal'])
 
-请提供：
-1. 市场风险和应对策略
-2. 技术风险和解决方案
-3. 运营风险和预防措施
-4. 财务风险和控制手段
+# 整文档生成时所有请求共享的章节并发上限
+DOCUMENT_CHAPTER_CONCURRENCY = int(os.getenv('DEEPRESEARCH_DOCUMENT_CONCURRENCY', 4))
+_DOCUMENT_EXECUTOR = ThreadPoolExecutor(
+    max_workers=max(1, DOCUMENT_CHAPTER_CONCURRENCY),
+    thread_name_prefix='document-chapter'
+)
 
-要求：全面客观，措施具体。
-"""
-}
 
-BUSINESS_PLAN_NINE_CHAPTERS = {
-    'executive-summary',
-    'market-analysis',
-    'solution',
-    'business-model',
-    'competitive-landscape',
-    'marketing-strategy',
-    'team-structure',
-    'financial-projection',
-    'risk-assessment'
-}
+def submit_document_chapter(fn, *args, **kwargs):
+    """提交整文档章节任务：提交时计入排队数，开始执行时转为执行中，结束时扣除"""
+    def run():
+        metrics.DOCUMENT_QUEUED.dec()
+        with metrics.DOCUMENT_ACTIVE.track():
+            return fn(*args, **kwargs)
 
-PROPOSAL_SIX_CHAPTERS = {
-    'project-summary',
-    'problem-insight',
-    'product-solution',
-    'implementation-path',
-    'budget-planning',
-    'risk-control'
-}
+    metrics.DOCUMENT_QUEUED.inc()
+    try:
+        return _DOCUMENT_EXECUTOR.submit(run)
+    except BaseException:
+        metrics.DOCUMENT_QUEUED.dec()
+        raise
 
-# Prompt 文件路径与缓存
+# Prompt 文件路径与模板注册表（启动时预加载，变更由后台监听重新编译）
 PROJECT_ROOT = Path(__file__).resolve().parents[3]
 PROMPT_ROOT = PROJECT_ROOT / 'prompts' / 'scene-1-dialogue' / 'deep-research'
-_PROMPT_CACHE = {}
+PROMPT_TEMPLATES = TemplateRegistry.from_env(PROMPT_ROOT)
+PROMPT_TEMPLATES.start()
 SOURCE_MIN_RELEVANCE = 0.75
 SOURCE_MAX_ITEMS = 10
+RANKING_WEIGHTS = batch_ranking.DEFAULT_WEIGHTS
+BATCH_RANKING_MIN_SOURCES = int(os.getenv('DEEPRESEARCH_BATCH_RANKING_MIN_SOURCES', 200))
+
+# 检索摘要缓存：同一对话重复生成章节时跳过摘要 LLM 调用
+SUMMARY_CACHE = TTLCache(
+    maxsize=int(os.getenv('DEEPRESEARCH_SUMMARY_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('DEEPRESEARCH_SUMMARY_CACHE_TTL', 3600)),
+    name='summary'
+)
 
+# 章节结果缓存（可选）：同一请求指纹的重试与"重新生成"直接返回已有结果，
+# 请求头 X-DeepResearch-Cache: bypass 或 Cache-Control: no-cache 时强制重新生成并刷新缓存
+CHAPTER_CACHE_HEADER = 'X-DeepResearch-Cache'
+CHAPTER_CACHE = SizedTTLCache(
+    max_bytes=int(os.getenv('DEEPRESEARCH_CHAPTER_CACHE_MAX_BYTES', 32 * 1024 * 1024)),
+    ttl=float(os.getenv('DEEPRESEARCH_CHAPTER_CACHE_TTL', 1800)),
+    name='chapter'
+) if os.getenv('DEEPRESEARCH_CHAPTER_CACHE', 'false').strip().lower() in ('1', 'true', 'yes', 'on') else None
 
-def _strip_frontmatter(content: str) -> str:
-    if content.startswith('---'):
-        parts = content.split('---', 2)
-        if len(parts) == 3:
-            return parts[2].strip()
-    return content.strip()
+# 相同请求合并执行：调用方重试或用户重复点击时，重复请求等待正在执行的流水线并共享结果（同主机多进程共享登记）
+COALESCED_HEADER = 'X-DeepResearch-Coalesced'
+# leader 失败时登记其错误分类，其它进程的等待方返回相同的状态码与 retryable
+SINGLE_FLIGHT = SingleFlight.from_env(is_abort=is_interruption, describe_error=lambda error: error_payload(error))
 
 
-def _load_prompt_file(relative_path: str, fallback: str = '') -> str:
-    file_path = PROMPT_ROOT / relative_path
-    try:
-        stat = file_path.stat()
-        cached = _PROMPT_CACHE.get(str(file_path))
-        if cached and cached['mtime'] == stat.st_mtime:
-            return cached['content']
-        content = file_path.read_text(encoding='utf-8')
-        content = _strip_frontmatter(content)
-        _PROMPT_CACHE[str(file_path)] = {'mtime': stat.st_mtime, 'content': content}
-        logger.info(f'Prompt热更新加载: {file_path}')
-        return content
-    except Exception:
-        return fallback
-
-
-def _render_template(template: str, **kwargs) -> str:
-    rendered = template
-    for key, value in kwargs.items():
-        rendered = rendered.replace('{' + key + '}', value)
-    return rendered
+def _prompt_file_version(relative_path: str) -> float:
+    """返回 prompt 文件的 mtime，文件不存在时返回 0（使用兜底模板）"""
+    return PROMPT_TEMPLATES.version(relative_path)
+
 
 def format_conversation(conversation_history):
-    """格式化对话历史"""
-    if isinstance(conversation_history, list):
-        return '\n'.join([
-            f"{msg.get('role', 'user')}: {msg.get('content', '')}"
-            for msg in conversation_history
-        ])
-    return str(conversation_history)
+    """格式化对话历史（接受原始对话或 RequestContext，超长对话为压缩后的文本）"""
+    return RequestContext.of(conversation_history).text
 
 def build_research_prompt(chapter_id, conversation_history):
     """构建研究提示词"""
     conversation_text = format_conversation(conversation_history)
-
-    fallback = CHAPTER_PROMPTS.get(chapter_id, """
-基于以下产品创意，生成{chapter_id}章节内容：
-
-产品创意：
-{conversation}
-
-请提供专业、详细的分析和建议。
-""")
-
-    template = _load_prompt_file(f'chapters/{chapter_id}.md', fallback)
-    return _render_template(template, conversation=conversation_text, chapter_id=chapter_id)
+    chapter = get_chapter(chapter_id)
+    template = PROMPT_TEMPLATES.get(chapter.prompt_path, chapter.fallback_prompt)
+    return template.render(conversation=conversation_text, chapter_id=chapter_id)
 
 def build_search_summary(conversation_history, chapter_id):
     """生成简短检索摘要（<=350字符），用于构建搜索query"""
@@ -290,18 +266,10 @@ def build_search_summary(conversation_history, chapter_id):
 对话内容：
 {conversation}
 """
-    template = _load_prompt_file('search-summary.md', fallback)
-    return _render_template(template, conversation=conversation_text, chapter_id=chapter_id)
+    template = PROMPT_TEMPLATES.get('search-summary.md', fallback)
+    return template.render(conversation=conversation_text, chapter_id=chapter_id)
 
-def build_synthesis_prompt(chapter_id, conversation_history, sources):
-    """构建带来源的最终合成提示词"""
-    conversation_text = format_conversation(conversation_history)
-    sources_text = '\n'.join([
-        f"[{idx + 1}] {s.get('title', '未知来源')} - {s.get('url', '')}\n{s.get('snippet', '')}"
-        for idx, s in enumerate(sources or [])
-    ])
-
-    fallback = """
+SYNTHESIS_FALLBACK = """
 你是一位专业的商业分析师和研究专家。请基于用户提供的信息与检索来源，生成高质量的章节内容。
 
 章节: {chapter_id}
@@ -323,78 +291,83 @@ def build_synthesis_prompt(chapter_id, conversation_history, sources):
 {sources}
 """
 
-    template = _load_prompt_file('synthesis.md', fallback)
-    return _render_template(
-        template,
-        chapter_id=chapter_id,
-        conversation=conversation_text,
-        sources=(sources_text if sources_text else '（无来源）')
+
+def _format_sources(sources):
+    return '\n'.join([
+        f"[{idx + 1}] {s.get('title', '未知来源')} - {s.get('url', '')}\n{s.get('snippet', '')}"
+        for idx, s in enumerate(sources or [])
+    ]) or '（无来源）'
+
+
+def _format_source_refs(sources):
+    return '\n'.join([
+        f"[{idx + 1}] {s.get('title', '未知来源')} - {s.get('url', '')}"
+        for idx, s in enumerate(sources or [])
+    ]) or '（无来源）'
+
+
+def _dedupe_source_sections(template):
+    """来源只完整插入一次，后续 {sources} 改为仅含编号、标题与 URL 的清单"""
+    head, sep, tail = template.partition('{sources}')
+    if not sep:
+        return template
+    return head + sep + tail.replace('{sources}', '{source_refs}')
+
+
+def synthesis_input_budget(config):
+    """按研究深度的输入预算，且不超过模型上下文减去输出 max_tokens 后的空间"""
+    context_room = MODEL_CONTEXT_TOKENS - config['max_tokens'] - 512
+    return max(1024, min(config['input_budget'], context_room))
+
+
+def assemble_synthesis_prompt(chapter_id, conversation_history, sources, input_budget=0):
+    """
+    在 token 预算内组装合成提示词
+
+    去除重复的来源区块；超出预算时依次裁剪最早的对话轮次与相关度最低的来源。
+
+    Returns:
+        (提示词, 实际使用的来源, BudgetReport)；来源编号与提示词保持一致
+    """
+    template = PROMPT_TEMPLATES.get('synthesis.md', SYNTHESIS_FALLBACK)
+    compact_template = compile_template(_dedupe_source_sections(template.source))
+    context = RequestContext.of(conversation_history)
+    turns = context.turns
+
+    def render(kept_turns, kept_sources, tpl=compact_template):
+        return tpl.render(
+            chapter_id=chapter_id,
+            conversation=context.format(kept_turns),
+            sources=_format_sources(kept_sources),
+            source_refs=_format_source_refs(kept_sources)
+        )
+
+    full_tokens = estimate_tokens(render(turns, sources or [], template))
+    prompt, _, kept_sources, report = fit_to_budget(
+        render, turns, sources or [], input_budget, full_tokens=full_tokens
     )
+    if report.saved_tokens:
+        logger.info(
+            f"合成提示词预算: {chapter_id}, 预算: {input_budget}, "
+            f"{report.original_tokens} -> {report.final_tokens} tokens, "
+            f"移除来源: {report.dropped_sources}, 移除对话轮次: {report.dropped_turns}"
+        )
+    return prompt, kept_sources, report
 
 
-def _chapter_keywords(chapter_id: str):
-    chapter_map = {
-        'project-summary': ['立项', '机会', '场景', '痛点', '需求', '市场'],
-        'problem-insight': ['用户', '问题', '痛点', '价值主张', '画像'],
-        'product-solution': ['产品', '功能', '方案', '架构', 'MVP'],
-        'implementation-path': ['路线图', '里程碑', '实施', '资源', '计划'],
-        'budget-planning': ['预算', '成本', '收益', 'ROI', '投入产出'],
-        'risk-control': ['风险', '合规', '控制', '预案', '决策'],
-        'market-analysis': ['市场', '规模', '增长', '用户', '趋势'],
-        'competitive-landscape': ['竞品', '竞争', '差异化', '市场份额'],
-        'business-model': ['商业模式', '收入', '成本', '定价'],
-        'financial-projection': ['财务', '收入', '利润', '成本', '预测'],
-        'marketing-strategy': ['营销', '渠道', '获客', '品牌', '转化'],
-        'team-structure': ['团队', '组织', '人才', '岗位']
-    }
-    return chapter_map.get(chapter_id, [chapter_id.replace('-', ' ')])
+def build_synthesis_prompt(chapter_id, conversation_history, sources):
+    """构建带来源的最终合成提示词"""
+    return assemble_synthesis_prompt(chapter_id, conversation_history, sources)[0]
 
 
 def _extract_intent_keywords(conversation_history, chapter_id):
-    stopwords = {
-        '的', '了', '和', '与', '及', '或', '以及', '对于', '关于', '基于', '进行', '分析', '如何',
-        '哪些', '什么', '是否', '我们', '你们', '他们', '这个', '那个', '一个', '需要', '可以', '项目',
-        '产品', '市场', '行业', '用户', '公司', '企业', '计划', '报告', '策略', '模式', '核心', '关键'
-    }
-    text = format_conversation(conversation_history)
-    raw = re.split(r'[\s,，。.;；:：/\\\-\(\)\[\]{}"\'\n\r\t]+', text.lower())
-    keywords = []
-    seen = set()
-    for token in raw:
-        token = token.strip()
-        if len(token) < 2 or token in stopwords:
-            continue
-        if token in seen:
-            continue
-        seen.add(token)
-        keywords.append(token)
-        if len(keywords) >= 20:
-            break
-    chapter_keys = [str(k).lower() for k in _chapter_keywords(chapter_id)]
-    return chapter_keys + keywords
+    return list(get_chapter(chapter_id).keywords) + list(RequestContext.of(conversation_history).intent_tokens)
 
 
 def _domain_quality_score(url: str) -> float:
-    domain = (urlparse(url).netloc or '').lower()
-    if not domain:
+    if not parse_host(url):
         return -0.5
-
-    preferred = [
-        '.gov', '.edu', 'who.int', 'worldbank.org', 'oecd.org', 'imf.org', 'un.org',
-        'reuters.com', 'bloomberg.com', 'statista.com', 'mckinsey.com', 'gartner.com',
-        'forrester.com', 'sciencedirect.com', 'nature.com', 'ieee.org'
-    ]
-    deprioritized = [
-        'zhihu.com', 'baike.baidu.com', 'csdn.net', 'sohu.com', 'toutiao.com',
-        'forum', 'bbs', 'blog'
-    ]
-    for item in preferred:
-        if item in domain:
-            return 0.22
-    for item in deprioritized:
-        if item in domain:
-            return -0.18
-    return 0.0
+    return get_domain_reputation().score(url, 'ranking')
 
 
 def _source_text(source):
@@ -405,21 +378,21 @@ def _source_text(source):
     ]).lower()
 
 
-def _lexical_relevance(source, intent_keywords):
+def _intent_matcher(intent_keywords):
+    """意图关键词匹配器（前 6 个关键词命中权重 1.2，其余 1.0），按关键词组缓存"""
+    keywords = tuple(intent_keywords)
+    return compile_keywords(keywords, tuple(1.2 if idx < 6 else 1.0 for idx in range(len(keywords))))
+
+
+def _lexical_relevance(source, intent_keywords, matcher=None, text=None):
     if not intent_keywords:
         return 0.0
-    text = _source_text(source)
+    text = _source_text(source) if text is None else text
     if not text:
         return 0.0
 
-    weighted_hits = 0.0
-    matched = 0
-    for idx, keyword in enumerate(intent_keywords):
-        if not keyword:
-            continue
-        if keyword in text:
-            matched += 1
-            weighted_hits += 1.2 if idx < 6 else 1.0
+    matcher = matcher or _intent_matcher(intent_keywords)
+    matched, weighted_hits = matcher.weigh(text)
     coverage = matched / max(1, min(len(intent_keywords), 12))
     return min(1.0, (weighted_hits / 10.0) + coverage * 0.6)
 
@@ -445,11 +418,20 @@ def _normalize_source(raw_source):
 
 
 def rank_and_filter_sources(raw_sources, conversation_history, chapter_id, max_items=SOURCE_MAX_ITEMS):
-    """来源归一化、去重、相关性重排，返回高相关 TopN。"""
+    """来源归一化、相关性重排、去重，返回高相关 TopN。"""
+    with metrics.stage_timer('ranking'):
+        sources = _rank_sources(raw_sources, conversation_history, chapter_id, max_items)
+    metrics.SOURCES.inc(len(sources), outcome='kept')
+    metrics.SOURCES.inc(max(0, len(raw_sources or []) - len(sources)), outcome='dropped')
+    return sources
+
+
+def _rank_sources(raw_sources, conversation_history, chapter_id, max_items):
     if not raw_sources:
         return []
 
     intent_keywords = _extract_intent_keywords(conversation_history, chapter_id)
+    matcher = _intent_matcher(intent_keywords)
     normalized = []
     seen_urls = set()
     for raw in raw_sources:
@@ -464,19 +446,45 @@ def rank_and_filter_sources(raw_sources, conversation_history, chapter_id, max_i
     if not normalized:
         return []
 
+    # 大批量候选按列构建特征矩阵并用 NumPy 打分，小批量逐条计算开销更低
+    if batch_ranking.available() and len(normalized) >= BATCH_RANKING_MIN_SOURCES:
+        return _batch_rank_sources(normalized, intent_keywords, matcher, max_items)
+
+    lexical = [_lexical_relevance(source, intent_keywords, matcher=matcher) for source in normalized]
+    prior = [float(source.get('relevance') or 0) for source in normalized]
+    domain = [_domain_quality_score(source.get('url', '')) for source in normalized]
+
+    lexical_weight, prior_weight, domain_weight = RANKING_WEIGHTS
     rescored = []
-    for source in normalized:
-        lexical = _lexical_relevance(source, intent_keywords)
-        prior = float(source.get('relevance') or 0)
-        prior = max(0.0, min(1.0, prior))
-        domain = _domain_quality_score(source.get('url', ''))
-        final_score = lexical * 0.70 + prior * 0.25 + domain
+    for source, lexical_score, prior_score, domain_score in zip(normalized, lexical, prior, domain):
+        prior_score = max(0.0, min(1.0, prior_score))
+        final_score = lexical_score * lexical_weight + prior_score * prior_weight + domain_score * domain_weight
         source['relevance'] = round(max(0.0, min(1.0, final_score)), 3)
         rescored.append(source)
 
     rescored.sort(key=lambda item: item.get('relevance', 0), reverse=True)
     strong = [item for item in rescored if item.get('relevance', 0) >= SOURCE_MIN_RELEVANCE]
-    return strong[:max_items]
+    # 规范化 URL 与近重复摘要折叠，每组保留得分最高的来源
+    return dedupe_sources(strong, limit=max_items)
+
+
+def _batch_rank_sources(normalized, intent_keywords, matcher, max_items):
+    texts = [_source_text(source) for source in normalized]
+    lexical = batch_ranking.lexical_column(texts, matcher, len(intent_keywords))
+    prior = [source['relevance'] for source in normalized]
+    reputation = get_domain_reputation()
+    domain = batch_ranking.lookup_column(
+        parse_hosts(source['url'] for source in normalized),
+        lambda host: reputation.score_host(host, 'ranking') if host else -0.5
+    )
+    order, scores = batch_ranking.rank_features(
+        lexical, prior, domain, SOURCE_MIN_RELEVANCE, len(normalized), weights=RANKING_WEIGHTS
+    )
+    ranked = []
+    for idx, score in zip(order, scores):
+        normalized[idx]['relevance'] = score
+        ranked.append(normalized[idx])
+    return dedupe_sources(ranked, limit=max_items)
 
 
 def append_canonical_source_list(content, sources):
@@ -498,9 +506,857 @@ def health_check():
         'status': 'ok',
         'service': 'deep-research',
         'model': MODEL_NAME,
+        'caches': {
+            'summary': SUMMARY_CACHE.stats(),
+            'search': SEARCH_CACHE.stats() if SEARCH_CACHE else None,
+            'chapter': CHAPTER_CACHE.stats() if CHAPTER_CACHE else None
+        },
+        'jobs': JOB_MANAGER.stats(),
+        'prompts': PROMPT_TEMPLATES.stats(),
+        'http': HTTP_TRANSPORT.stats(),
+        'upstream': UPSTREAM_POLICY.stats(),
+        'breakers': BREAKERS.stats(),
+        'singleFlight': SINGLE_FLIGHT.stats() if SINGLE_FLIGHT else None,
+        'providerChain': [provider for provider, _ in research_chain()] + ['openrouter'],
         'timestamp': time.time()
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus 指标"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@app.before_request
+def _track_request_start():
+    metrics.IN_FLIGHT.labels(endpoint=request.endpoint or 'unknown').inc()
+
+
+@app.teardown_request
+def _track_request_end(error=None):
+    metrics.IN_FLIGHT.labels(endpoint=request.endpoint or 'unknown').dec()
+
+
+def collect_service_metrics():
+    """抓取时从缓存、任务队列与连接池的 stats() 导出指标"""
+    collected = metrics.cache_metrics({
+        'summary': SUMMARY_CACHE.stats(),
+        'search': SEARCH_CACHE.stats() if SEARCH_CACHE else None,
+        'chapter': CHAPTER_CACHE.stats() if CHAPTER_CACHE else None
+    })
+    collected.append(metrics.CollectedMetric(
+        'deepresearch_jobs', 'gauge', '异步任务数（按状态）',
+        [({'status': status}, count) for status, count in JOB_MANAGER.stats().items()]
+    ))
+    http_stats = HTTP_TRANSPORT.stats()
+    collected.append(metrics.CollectedMetric(
+        'deepresearch_http_pool_in_flight', 'gauge', '上游连接池在途请求数',
+        [({'origin': origin}, stats['inFlight']) for origin, stats in http_stats.items()]
+    ))
+    collected.append(metrics.CollectedMetric(
+        'deepresearch_http_pool_saturated_requests', 'counter', '发起时连接池已满的上游请求数',
+        [({'origin': origin}, stats['saturatedRequests']) for origin, stats in http_stats.items()]
+    ))
+    if SINGLE_FLIGHT is not None:
+        flight_stats = SINGLE_FLIGHT.stats()
+        collected.append(metrics.CollectedMetric(
+            'deepresearch_single_flight_requests', 'counter', '章节请求合并执行次数（leader 执行 / follower 共享结果 / 接管失联执行）',
+            [({'role': role}, flight_stats[role]) for role in ('leaders', 'followers', 'takeovers')]
+        ))
+    return collected
+
+
+metrics.REGISTRY.register_collector(collect_service_metrics)
+
+# 按请求开启的 cProfile 剖析（DEEPRESEARCH_PROFILING=1 时响应 X-DeepResearch-Profile 请求头）
+PROFILER = RequestProfiler.from_env()
+
+
+@app.route('/debug/profiles', methods=['GET'])
+def list_profiles():
+    """已保存的请求剖析结果"""
+    if not PROFILER.enabled:
+        return jsonify({'error': '未开启请求剖析（DEEPRESEARCH_PROFILING）'}), 404
+    return jsonify({'profiles': PROFILER.list()})
+
+
+@app.route('/debug/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """剖析结果文本报告，?sort=cumulative|tottime|ncalls&limit=60"""
+    report = PROFILER.report(
+        profile_id,
+        sort=request.args.get('sort', 'cumulative'),
+        limit=request.args.get('limit', 60, type=int)
+    ) if PROFILER.enabled else None
+    if report is None:
+        return jsonify({'error': f'剖析结果不存在: {profile_id}'}), 404
+    return Response(report, content_type='text/plain; charset=utf-8')
+
+
+# 异步任务：进程内线程池 + 本地任务存储
+JOB_MANAGER = JobManager(
+    max_workers=int(os.getenv('DEEPRESEARCH_JOB_WORKERS', 4)),
+    ttl=float(os.getenv('DEEPRESEARCH_JOB_TTL', 3600))
+)
+
+# 根据研究深度设置参数
+DEPTH_CONFIG = {
+    'shallow': {'temperature': 0.7, 'synthesis_temperature': 0.4, 'max_tokens': 2000, 'iterations': 2, 'input_budget': 6000},
+    'medium': {'temperature': 0.85, 'synthesis_temperature': 0.5, 'max_tokens': 4000, 'iterations': 3, 'input_budget': 10000},
+    'deep': {'temperature': 0.9, 'synthesis_temperature': 0.6, 'max_tokens': 6000, 'iterations': 5, 'input_budget': 16000}
+}
+
+# 合成模型上下文窗口（tokens），输入预算不超过上下文减去输出 max_tokens
+MODEL_CONTEXT_TOKENS = int(os.getenv('OPENROUTER_MODEL_CONTEXT_TOKENS', 131072))
+
+
+def validate_chapter(doc_type, chapter_id):
+    """校验章节是否属于文档类型的固定章节，返回错误信息或 None"""
+    if doc_type == 'business' and chapter_id not in BUSINESS_PLAN_NINE_CHAPTERS:
+        return f'商业计划书仅支持固定九章，收到无效章节: {chapter_id}'
+    if doc_type == 'proposal' and chapter_id not in PROPOSAL_SIX_CHAPTERS:
+        return f'产品立项材料仅支持固定六章，收到无效章节: {chapter_id}'
+    return None
+
+
+def document_summary_scope(chapter_ids):
+    """整文档共享检索摘要覆盖的章节（提示词中的章节与摘要缓存键均使用该范围）"""
+    return ', '.join(chapter_ids)
+
+
+def summary_cache_key(conversation_history, chapter_id):
+    return fingerprint(
+        RequestContext.of(conversation_history).fingerprint,
+        chapter_id,
+        _prompt_file_version('search-summary.md'),
+        MODEL_NAME
+    )
+
+
+def chapter_cache_key(chapter_id, conversation_history, doc_type, research_depth):
+    """章节结果缓存键：请求参数 + 对话指纹 + 相关 prompt 文件版本 + 模型与检索提供商"""
+    return fingerprint(
+        chapter_id,
+        doc_type,
+        research_depth,
+        RequestContext.of(conversation_history).fingerprint,
+        _prompt_file_version(get_chapter(chapter_id).prompt_path),
+        _prompt_file_version('search-summary.md'),
+        _prompt_file_version('synthesis.md'),
+        MODEL_NAME,
+        ','.join(provider for provider, _ in research_chain())
+    )
+
+
+def request_deadline(headers, args):
+    """按请求头 X-DeepResearch-Timeout / 查询参数 timeout 创建请求截止时间"""
+    lowered = {key.lower(): value for key, value in headers.items()}
+    return deadlines.Deadline.from_request(lowered, args, REQUEST_DEADLINE, maximum=REQUEST_TIMEOUT)
+
+
+def chapter_cache_bypassed(headers):
+    """请求是否要求跳过章节结果缓存（headers 需支持不区分大小写的小写键查找）"""
+    value = (headers.get(CHAPTER_CACHE_HEADER.lower()) or '').strip().lower()
+    cache_control = (headers.get('cache-control') or '').lower()
+    return value in ('bypass', 'refresh') or 'no-cache' in cache_control or 'no-store' in cache_control
+
+
+def cached_chapter_result(params, bypass=False):
+    """
+    查找章节结果缓存
+
+    Returns:
+        (请求指纹, 结果, 状态)；状态为 HIT / MISS / BYPASS，未开启缓存时结果与状态为 None
+    """
+    key = chapter_cache_key(
+        params['chapter_id'], params['conversation_history'], params['doc_type'], params['research_depth']
+    )
+    if CHAPTER_CACHE is None:
+        return key, None, None
+    if bypass:
+        return key, None, 'BYPASS'
+    cached = CHAPTER_CACHE.get(key)
+    if cached is None:
+        return key, None, 'MISS'
+    logger.info(f"章节结果命中缓存: {params['chapter_id']}")
+    return key, json.loads(cached), 'HIT'
+
+
+def store_chapter_result(key, result):
+    """缓存完整生成的章节结果（检索提供商不可用时的降级结果不缓存）"""
+    if CHAPTER_CACHE is None or (uses_retrieval_provider() and result.get('provider') == 'openrouter'):
+        return
+    CHAPTER_CACHE.set(key, json.dumps(result, ensure_ascii=False).encode('utf-8'))
+
+
+def generate_chapter_once(key, params):
+    """
+    按请求指纹合并执行章节生成（结果写入章节结果缓存）
+
+    Returns:
+        (结果, 是否为共享的其它请求的结果)
+    """
+    def generate():
+        result = generate_chapter_content(**params)
+        store_chapter_result(key, result)
+        return result
+
+    if SINGLE_FLIGHT is None:
+        return generate(), False
+    return SINGLE_FLIGHT.do(key, generate)
+
+
+def summary_request(conversation_history, chapter_id):
+    """构建检索摘要请求参数"""
+    summary_prompt = build_search_summary(conversation_history, chapter_id)
+    return {
+        'model': MODEL_NAME,
+        'messages': [
+            {
+                "role": "system",
+                "content": "你是一个信息抽取助手，擅长将对话压缩成检索摘要。"
+            },
+            {
+                "role": "user",
+                "content": summary_prompt
+            }
+        ],
+        'temperature': 0.2,
+        'max_tokens': 300,
+        'top_p': 0.9
+    }
+
+
+def clip_summary(summary_response):
+    summary_text = summary_response.choices[0].message.content.strip()
+    if len(summary_text) > 350:
+        summary_text = summary_text[:350]
+    return summary_text
+
+
+def generate_search_summary(conversation_history, chapter_id):
+    """先生成检索摘要，减少query过长导致搜索失败；失败时返回 None"""
+    if not OPENROUTER_API_KEY:
+        return None
+    cache_key = summary_cache_key(conversation_history, chapter_id)
+    cached = SUMMARY_CACHE.get(cache_key)
+    if cached is not None:
+        logger.info(f"检索摘要命中缓存: {chapter_id}")
+        return cached
+    try:
+        with deadlines.stage(max_share=SUMMARY_MAX_SHARE):
+            summary_text = clip_summary(create_completion(
+                'summary',
+                summary_request(conversation_history, chapter_id),
+                hedge=True,
+                max_retries=SUMMARY_MAX_RETRIES
+            ))
+        if summary_text:
+            SUMMARY_CACHE.set(cache_key, summary_text)
+        return summary_text
+    except Exception as summary_error:
+        logger.warning(f"检索摘要生成失败，使用默认query: {summary_error}")
+        return None
+
+
+def create_completion(name, params, hedge=False, max_retries=None):
+    """
+    在 OpenRouter 熔断器保护下按 UPSTREAM_POLICY 调用 chat.completions.create
+
+    非流式调用按 name 记录阶段耗时与 tokens；流式调用由消费方在流结束后记录。
+    """
+    if params.get('stream'):
+        return _call_openrouter(name, params, hedge, max_retries)
+    with metrics.stage_timer(name):
+        response = _call_openrouter(name, params, hedge, max_retries)
+    metrics.record_usage(name, params.get('model', MODEL_NAME), response.usage)
+    return response
+
+
+def _call_openrouter(name, params, hedge, max_retries):
+    # 每次尝试的超时取请求剩余时间
+    return BREAKERS.get('openrouter').call(lambda: UPSTREAM_POLICY.call(
+        lambda: client.chat.completions.create(**params, timeout=deadlines.timeout(REQUEST_TIMEOUT)),
+        name=f'openrouter.{name}',
+        hedge=hedge,
+        max_retries=max_retries
+    ), is_abort=is_interruption, slow_call_seconds=breaker_slow_call(name))
+
+
+def research_chain():
+    """检索提供商故障转移链 [(提供商, 客户端)]，主提供商在前"""
+    chain = []
+    if DEEPRESEARCH_PROVIDER in RETRIEVAL_PROVIDERS:
+        chain.append((DEEPRESEARCH_PROVIDER, research_client))
+    chain.extend(item for item in FALLBACK_RESEARCH_CLIENTS if item[0] != DEEPRESEARCH_PROVIDER)
+    return chain
+
+
+def uses_retrieval_provider():
+    return bool(research_chain())
+
+
+def synthesis_request(chapter_id, conversation_history, sources, config):
+    """
+    构建基于来源的二次合成请求参数
+
+    Returns:
+        (请求参数, 提示词中实际使用的来源, BudgetReport)
+    """
+    with metrics.stage_timer('prompt'):
+        synthesis_prompt, sources, budget_report = assemble_synthesis_prompt(
+            chapter_id,
+            conversation_history,
+            sources,
+            input_budget=synthesis_input_budget(config)
+        )
+    params = {
+        'model': MODEL_NAME,
+        'messages': [
+            {
+                "role": "system",
+                "content": "你是一位专业的商业分析师和研究专家。请基于来源进行严谨总结并标注引用。"
+            },
+            {
+                "role": "user",
+                "content": synthesis_prompt
+            }
+        ],
+        'temperature': config['synthesis_temperature'],
+        'max_tokens': config['max_tokens'],
+        'top_p': 0.95,
+        'presence_penalty': 1.1
+    }
+    return params, sources, budget_report
+
+
+def single_shot_request(chapter_id, conversation_history, config):
+    """构建 OpenRouter 单次生成请求参数"""
+    with metrics.stage_timer('prompt'):
+        prompt = build_research_prompt(chapter_id, conversation_history)
+    return {
+        'model': MODEL_NAME,
+        'messages': [
+            {
+                "role": "system",
+                "content": "你是一位专业的商业分析师和研究专家。请基于用户提供的信息，进行深入的研究和分析，提供专业、详实的报告内容。"
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        'temperature': config['temperature'],
+        'max_tokens': config['max_tokens'],
+        'top_p': 0.95,
+        'presence_penalty': 1.1
+    }
+
+
+def _noop_progress(stage, progress, message=''):
+    pass
+
+
+def _require_provider_key():
+    if DEEPRESEARCH_PROVIDER in RETRIEVAL_PROVIDERS and DEEPRESEARCH_PROVIDER not in KEYLESS_PROVIDERS \
+            and not DEEPRESEARCH_API_KEY:
+        raise Exception('DeepResearch服务配置错误：未设置 DEEPRESEARCH_API_KEY')
+
+
+def collect_chapter_sources(
+    chapter_id,
+    conversation_history,
+    doc_type,
+    research_depth,
+    config,
+    summary_text=None,
+    summarize=True,
+    progress_callback=None
+):
+    """
+    检索摘要 -> 检索 -> 来源重排，返回 (research_result, sources)
+
+    检索按故障转移链依次尝试各提供商，research_result['provider'] 为实际使用的提供商；
+    全部失败或熔断时抛出 ProvidersUnavailable。
+    """
+    _require_provider_key()
+    report = progress_callback or _noop_progress
+
+    if summary_text is None and summarize:
+        report('summary', 0.05, '生成检索摘要')
+        summary_text = generate_search_summary(conversation_history, chapter_id)
+
+    report('search', 0.2, '检索外部来源')
+    # retrieval 为检索整体耗时（含故障转移），search 为各条 query 耗时之和；检索为合成预留时间
+    with metrics.stage_timer('retrieval'), deadlines.stage(reserve=SYNTHESIS_RESERVE, min_share=RETRIEVAL_MIN_SHARE):
+        provider, research_result = FAILOVER.run(research_chain(), lambda research: research.generate_chapter(
+            chapter_id=chapter_id,
+            conversation_history=conversation_history,
+            doc_type=doc_type,
+            depth=research_depth,
+            iterations=config['iterations'],
+            summary_text=summary_text,
+            progress_callback=lambda i, total, message: report('search', 0.2 + 0.4 * i / max(1, total), message)
+        ))
+    research_result = dict(research_result, provider=provider)
+    report('ranking', 0.6, '来源重排')
+    raw_sources = research_result.get('sources', [])
+    sources = rank_and_filter_sources(
+        raw_sources,
+        conversation_history,
+        chapter_id,
+        max_items=SOURCE_MAX_ITEMS
+    )
+    return research_result, sources
+
+
+def retrieval_cut_short(error):
+    """检索超出阶段时间预算、但请求整体仍有剩余时间（可回退到单次生成）"""
+    deadline = deadlines.current()
+    return (
+        find_error(error, DeadlineExceeded) is not None
+        and deadline is not None and not deadline.expired() and not deadline.cancelled
+    )
+
+
+def fall_back_to_single_shot(unavailable):
+    """检索提供商全部不可用或检索超出时间预算：配置了 OpenRouter 时回退到单次生成，否则继续抛出"""
+    if not OPENROUTER_API_KEY:
+        raise unavailable
+    logger.warning(f"{unavailable}，回退到 OpenRouter 单次生成")
+
+
+def finalize_chapter_content(content, sources):
+    """追加 canonical 来源清单并做引用校验"""
+    with metrics.stage_timer('post-processing'):
+        return _finalize_content(content, sources)
+
+
+def _finalize_content(content, sources):
+    # 始终以后端 canonical 来源清单为准，避免模型返回无关来源
+    content = append_canonical_source_list(content, sources)
+
+    # 引用校验：检查是否存在无效编号
+    if sources:
+        citations = [int(n) for n in re.findall(r'\[(\d+)\]', content)]
+        invalid = sorted({n for n in citations if n < 1 or n > len(sources)})
+        if invalid:
+            content += "\n\n## 质量校验\n"
+            content += f"- 检测到无效引用编号：{', '.join(map(str, invalid))}\n"
+            content += "- 建议重新生成或补充来源以确保引用一致性\n"
+    return content
+
+
+def generate_chapter_content(
+    chapter_id,
+    conversation_history,
+    doc_type='business',
+    research_depth='medium',
+    summary_text=None,
+    summarize=True,
+    progress_callback=None
+):
+    """
+    执行单章节生成流水线（检索摘要 -> 检索 -> 来源重排 -> 合成 -> 来源清单/引用校验）
+
+    Args:
+        summary_text: 预先计算好的检索摘要（整文档生成时共享）
+        summarize: summary_text 为空时是否单独生成检索摘要
+        progress_callback: 进度回调 (stage, progress, message)，progress 取值 0~1
+
+    Returns:
+        章节结果字典（即 /research/business-plan-chapter 的响应体），timings 为各阶段耗时（秒）
+    """
+    with metrics.collect_timings() as timings:
+        result = _run_chapter_pipeline(
+            chapter_id,
+            conversation_history,
+            doc_type,
+            research_depth,
+            summary_text,
+            summarize,
+            progress_callback
+        )
+    # 检索摘要调用的 tokens 计入章节总量
+    result['tokens'] += timings.tokens('summary')
+    result['timings'] = timings.to_dict()
+    return result
+
+
+def _run_chapter_pipeline(
+    chapter_id,
+    conversation_history,
+    doc_type,
+    research_depth,
+    summary_text,
+    summarize,
+    progress_callback
+):
+    logger.info(f"开始生成章节: {chapter_id}, 深度: {research_depth}")
+
+    config = DEPTH_CONFIG.get(research_depth, DEPTH_CONFIG['medium'])
+    # 对话只预处理一次，各阶段共享
+    conversation_history = RequestContext.of(conversation_history)
+
+    report = progress_callback or _noop_progress
+    start_time = time.time()
+    content = None
+    sources = []
+    total_tokens = 0
+    budget_report = None
+    research_result = None
+    provider = 'openrouter'
+
+    # 优先使用检索/迭代提供商（按故障转移链）
+    if uses_retrieval_provider():
+        try:
+            research_result, sources = collect_chapter_sources(
+                chapter_id,
+                conversation_history,
+                doc_type,
+                research_depth,
+                config,
+                summary_text=summary_text,
+                summarize=summarize,
+                progress_callback=progress_callback
+            )
+        except ProvidersUnavailable as unavailable:
+            fall_back_to_single_shot(unavailable)
+        except Exception as retrieval_error:
+            if not retrieval_cut_short(retrieval_error):
+                raise
+            fall_back_to_single_shot(retrieval_error)
+
+    if research_result is not None:
+        provider = research_result.get('provider', DEEPRESEARCH_PROVIDER)
+        # 二次合成（可选），确保结构化输出与引用
+        if OPENROUTER_API_KEY:
+            params, sources, budget_report = synthesis_request(chapter_id, conversation_history, sources, config)
+            # 发出合成请求前最后一次检查任务是否已取消
+            report('synthesis', 0.7, '基于来源合成章节')
+            try:
+                synthesis_response = create_completion('synthesis', params)
+                content = synthesis_response.choices[0].message.content
+                usage = synthesis_response.usage
+                total_tokens = usage.total_tokens if usage else 0
+            except CircuitOpenError as open_error:
+                # OpenRouter 熔断时退回检索提供商自身生成的内容
+                if not research_result.get('content'):
+                    raise
+                logger.warning(f"{open_error}，使用检索提供商生成的内容: {chapter_id}")
+                content = research_result['content']
+                total_tokens = research_result.get('tokens', 0)
+        else:
+            content = research_result.get('content', '')
+            total_tokens = research_result.get('tokens', 0)
+    else:
+        # 回退到 OpenRouter 单次生成
+        report('synthesis', 0.1, '生成章节')
+        response = create_completion('single-shot', single_shot_request(chapter_id, conversation_history, config))
+        content = response.choices[0].message.content
+        usage = response.usage
+        total_tokens = usage.total_tokens if usage else 0
+
+    report('post-processing', 0.95, '来源清单与引用校验')
+    content = finalize_chapter_content(content, sources)
+
+    elapsed_time = time.time() - start_time
+
+    logger.info(f"章节生成成功: {chapter_id}, 耗时: {elapsed_time:.2f}s, tokens: {total_tokens}")
+
+    return {
+        'chapterId': chapter_id,
+        'content': content,
+        'sources': sources or [],  # 检索模式可返回 sources
+        'confidence': 0.85,  # 默认置信度
+        'tokens': total_tokens,
+        'mode': 'deep',
+        'depth': research_depth,
+        'elapsed_time': elapsed_time,
+        'provider': provider,
+        'prompt_budget': budget_report.to_dict() if budget_report else None
+    }
+
+
+def _sse_event(event, data):
+    """格式化单条 Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_chapter_events(chapter_id, conversation_history, doc_type='business', research_depth='medium', deadline=None):
+    """
+    流式章节生成：依次产出阶段事件、合成 token 与最终结果（SSE 文本）
+
+    事件：stage(summary/sources) -> token* -> done（含 timings）；出错时产出 error 并结束。
+    客户端断开（生成器被关闭）时取消 deadline，正在等待的检索与上游流随之停止。
+    """
+    with metrics.collect_timings() as timings, deadlines.scope(deadline):
+        try:
+            yield from _chapter_events(chapter_id, conversation_history, doc_type, research_depth, timings)
+        except GeneratorExit:
+            if deadline is not None:
+                deadline.cancel()
+            raise
+
+
+def _chapter_events(chapter_id, conversation_history, doc_type, research_depth, timings):
+    config = DEPTH_CONFIG.get(research_depth, DEPTH_CONFIG['medium'])
+    conversation_history = RequestContext.of(conversation_history)
+    start_time = time.time()
+    sources = []
+    budget_report = None
+
+    try:
+        yield _sse_event('stage', {'stage': 'started', 'chapterId': chapter_id, 'depth': research_depth})
+
+        research_result = None
+        if uses_retrieval_provider():
+            _require_provider_key()
+            summary_text = generate_search_summary(conversation_history, chapter_id)
+            yield _sse_event('stage', {'stage': 'summary', 'summary': summary_text})
+
+            try:
+                research_result, sources = collect_chapter_sources(
+                    chapter_id,
+                    conversation_history,
+                    doc_type,
+                    research_depth,
+                    config,
+                    summary_text=summary_text,
+                    summarize=False
+                )
+            except Exception as unavailable:
+                if not isinstance(unavailable, ProvidersUnavailable) and not retrieval_cut_short(unavailable):
+                    raise
+                fall_back_to_single_shot(unavailable)
+                yield _sse_event('stage', {'stage': 'fallback', 'provider': 'openrouter', 'reason': str(unavailable)})
+
+        if research_result is not None:
+            yield _sse_event('stage', {'stage': 'sources', 'sources': sources})
+
+            if not OPENROUTER_API_KEY:
+                content = research_result.get('content', '')
+                yield _sse_event('token', {'content': content})
+                yield _sse_event('done', _stream_result(
+                    chapter_id, content, sources, research_result.get('tokens', 0), research_depth, start_time, timings
+                ))
+                return
+            params, sources, budget_report = synthesis_request(chapter_id, conversation_history, sources, config)
+        else:
+            params = single_shot_request(chapter_id, conversation_history, config)
+
+        yield _sse_event('stage', {'stage': 'synthesis'})
+        stage = 'synthesis' if research_result is not None else 'single-shot'
+        stream_started = time.perf_counter()
+        # 只重试建立流之前的失败，已输出 token 后不再重试
+        stream = create_completion('stream', dict(params, stream=True, stream_options={'include_usage': True}))
+        parts = []
+        total_tokens = 0
+        try:
+            for chunk in stream:
+                if chunk.usage:
+                    total_tokens = metrics.record_usage(stage, params.get('model', MODEL_NAME), chunk.usage)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield _sse_event('token', {'content': delta})
+                # 截止时间已到时截断合成，不再等待剩余 token
+                deadlines.check('synthesis')
+        finally:
+            # 客户端断开时关闭上游流，停止继续消耗 token
+            stream.close()
+            metrics.observe_stage(stage, time.perf_counter() - stream_started)
+
+        result = _stream_result(
+            chapter_id, ''.join(parts), sources, total_tokens, research_depth, start_time, timings
+        )
+        result['prompt_budget'] = budget_report.to_dict() if budget_report else None
+        logger.info(f"流式章节生成成功: {chapter_id}, 耗时: {result['elapsed_time']:.2f}s, tokens: {total_tokens}")
+        yield _sse_event('done', result)
+
+    except Exception as e:
+        logger.error(f"流式生成章节失败: {str(e)}", exc_info=True)
+        yield _sse_event('error', {'error': f'DeepResearch服务错误: {str(e)}'})
+
+
+def _stream_result(chapter_id, content, sources, total_tokens, research_depth, start_time, timings):
+    content = finalize_chapter_content(content, sources)
+    total_tokens += timings.tokens('summary')
+    return {
+        'chapterId': chapter_id,
+        'content': content,
+        'sources': sources or [],
+        'confidence': 0.85,
+        'tokens': total_tokens,
+        'mode': 'deep',
+        'depth': research_depth,
+        'elapsed_time': time.time() - start_time,
+        'timings': timings.to_dict()
+    }
+
+
+def parse_chapter_request(data):
+    """解析并校验章节请求体，返回 (参数字典, 错误信息)"""
+    data = data or {}
+    chapter_id = data.get('chapterId')
+    conversation_history = data.get('conversationHistory')
+    doc_type = data.get('type', 'business')
+    research_depth = data.get('researchDepth', 'medium')
+
+    # 参数验证
+    if not chapter_id:
+        return None, '缺少必要参数: chapterId'
+
+    if not conversation_history:
+        return None, '缺少必要参数: conversationHistory'
+
+    chapter_error = validate_chapter(doc_type, chapter_id)
+    if chapter_error:
+        return None, chapter_error
+
+    return {
+        'chapter_id': chapter_id,
+        'conversation_history': conversation_history,
+        'doc_type': doc_type,
+        'research_depth': research_depth
+    }, None
+
+
+def parse_document_request(data):
+    """解析并校验整文档请求体，返回 (参数字典, 错误信息)"""
+    data = data or {}
+    conversation_history = data.get('conversationHistory')
+    doc_type = data.get('type', 'business')
+    research_depth = data.get('researchDepth', 'medium')
+
+    if not conversation_history:
+        return None, '缺少必要参数: conversationHistory'
+    if doc_type not in DOCUMENT_CHAPTERS:
+        return None, f'不支持的文档类型: {doc_type}'
+
+    chapter_ids = data.get('chapterIds') or list(DOCUMENT_CHAPTERS[doc_type])
+    for chapter_id in chapter_ids:
+        chapter_error = validate_chapter(doc_type, chapter_id)
+        if chapter_error:
+            return None, chapter_error
+
+    return {
+        'conversation_history': conversation_history,
+        'doc_type': doc_type,
+        'research_depth': research_depth,
+        'chapter_ids': list(dict.fromkeys(chapter_ids))
+    }, None
+
+
+def document_payload(doc_type, research_depth, outcomes, start_time, shared_tokens=0):
+    """
+    汇总整文档各章节结果
+
+    Args:
+        outcomes: [(chapter_id, 章节结果字典或异常)]，按文档章节顺序
+        shared_tokens: 各章节共享的调用（文档级检索摘要）消耗的 tokens，计入文档总量
+
+    Returns:
+        (响应体, HTTP 状态码)；全部章节失败时为 500
+    """
+    chapters = []
+    failures = []
+    for chapter_id, outcome in outcomes:
+        if isinstance(outcome, BaseException):
+            logger.error(f"整文档章节生成失败: {chapter_id}: {outcome}", exc_info=outcome)
+            failures.append({'chapterId': chapter_id, 'error': f'DeepResearch服务错误: {outcome}'})
+        else:
+            chapters.append(outcome)
+
+    elapsed_time = time.time() - start_time
+    logger.info(
+        f"整文档生成完成: {doc_type}, 成功: {len(chapters)}, 失败: {len(failures)}, 耗时: {elapsed_time:.2f}s"
+    )
+    body = {
+        'type': doc_type,
+        'depth': research_depth,
+        'chapters': chapters,
+        'failures': failures,
+        'tokens': shared_tokens + sum(item.get('tokens', 0) for item in chapters),
+        'elapsed_time': elapsed_time
+    }
+    if not chapters:
+        body['error'] = 'DeepResearch服务错误: 所有章节生成失败'
+        return body, 500
+    return body, 200
+
+
+def error_payload(e):
+    """将生成异常转换为 (错误响应体, HTTP 状态码)"""
+    leader_failed = find_error(e, LeaderFailed)
+    if leader_failed is not None and leader_failed.status is not None:
+        # 其它进程中的相同请求失败：沿用 leader 的错误分类
+        return dict(leader_failed.body or {'error': f'DeepResearch服务错误: {leader_failed}'}), leader_failed.status
+
+    # 检查是否为认证错误
+    error_msg = str(e)
+    if '401' in error_msg or 'authentication' in error_msg.lower() or 'api key' in error_msg.lower():
+        return {
+            'error': 'DeepResearch服务配置错误：API密钥无效或已过期。请访问 https://openrouter.ai/keys 获取有效的API密钥，并更新 .env 文件中的 OPENROUTER_API_KEY 配置。'
+        }, 401
+
+    open_error = find_error(e, CircuitOpenError)
+    if open_error is not None:
+        return {
+            'error': f'DeepResearch上游服务熔断中: {str(open_error)}',
+            'retryable': False,
+            'retryAfter': round(open_error.retry_in)
+        }, 503
+
+    unavailable = find_error(e, ProvidersUnavailable)
+    if unavailable is not None:
+        return {
+            'error': f'DeepResearch服务错误: {str(unavailable)}',
+            'retryable': False
+        }, 503
+
+    cancelled = find_error(e, RequestCancelled)
+    if cancelled is not None:
+        # 客户端已断开，响应仅用于日志
+        return {'error': f'DeepResearch请求已取消: {str(cancelled)}', 'retryable': False}, 499
+
+    expired = find_error(e, DeadlineExceeded)
+    if expired is not None:
+        # 调用方给定的时间已用完，原样重试同样会超时
+        return {
+            'error': f'DeepResearch请求超时: {str(expired)}',
+            'retryable': False,
+            'stage': expired.stage
+        }, 504
+
+    if find_error(e, FlightTimeout) is not None:
+        return {
+            'error': f'DeepResearch服务繁忙: {str(e)}',
+            'retryable': True
+        }, 504
+
+    exhausted = find_error(e, RetriesExhausted)
+    if exhausted is not None:
+        # 服务内部已按策略重试，告知调用方不要再整体重试流水线
+        return {
+            'error': f'DeepResearch上游服务暂不可用: {str(exhausted)}',
+            'retryable': False,
+            'attempts': exhausted.attempts + 1
+        }, 502
+
+    return {
+        'error': f'DeepResearch服务错误: {str(e)}'
+    }, 500
+
+
+def _error_response(e):
+    """将生成异常转换为 HTTP 错误响应"""
+    body, status = error_payload(e)
+    return jsonify(body), status
+
+
 @app.route('/research/business-plan-chapter', methods=['POST'])
 def research_chapter():
     """
@@ -513,186 +1369,182 @@ def research_chapter():
         "type": "business",
         "researchDepth": "medium"
     }
+
+    开启 DEEPRESEARCH_CHAPTER_CACHE 时相同请求返回缓存结果，响应头 X-DeepResearch-Cache 为 HIT/MISS/BYPASS；
+    与正在执行的相同请求合并时响应头 X-DeepResearch-Coalesced: true；
+    请求头 X-DeepResearch-Timeout（或 ?timeout=）为本次请求的截止时间（秒），超时返回 504
     """
     try:
-        data = request.json
-        chapter_id = data.get('chapterId')
-        conversation_history = data.get('conversationHistory')
-        doc_type = data.get('type', 'business')
-        research_depth = data.get('researchDepth', 'medium')
-        
-        # 参数验证
-        if not chapter_id:
-            return jsonify({'error': '缺少必要参数: chapterId'}), 400
-        
-        if not conversation_history:
-            return jsonify({'error': '缺少必要参数: conversationHistory'}), 400
-
-        if doc_type == 'business' and chapter_id not in BUSINESS_PLAN_NINE_CHAPTERS:
-            return jsonify({'error': f'商业计划书仅支持固定九章，收到无效章节: {chapter_id}'}), 400
-
-        if doc_type == 'proposal' and chapter_id not in PROPOSAL_SIX_CHAPTERS:
-            return jsonify({'error': f'产品立项材料仅支持固定六章，收到无效章节: {chapter_id}'}), 400
-        
-        logger.info(f"开始生成章节: {chapter_id}, 深度: {research_depth}")
-        
-        # 构建研究提示词
-        prompt = build_research_prompt(chapter_id, conversation_history)
+        params, error = parse_chapter_request(request.json)
+        if error:
+            return jsonify({'error': error}), 400
 
-        # 根据研究深度设置参数
-        depth_config = {
-            'shallow': {'temperature': 0.7, 'synthesis_temperature': 0.4, 'max_tokens': 2000, 'iterations': 2},
-            'medium': {'temperature': 0.85, 'synthesis_temperature': 0.5, 'max_tokens': 4000, 'iterations': 3},
-            'deep': {'temperature': 0.9, 'synthesis_temperature': 0.6, 'max_tokens': 6000, 'iterations': 5}
-        }
-        config = depth_config.get(research_depth, depth_config['medium'])
+        with deadlines.scope(request_deadline(request.headers, request.args)):
+            return _research_chapter(params)
 
-        start_time = time.time()
-        content = None
-        sources = []
-        total_tokens = 0
+    except Exception as e:
+        logger.error(f"生成章节失败: {str(e)}", exc_info=True)
+        return _error_response(e)
 
-        # 优先使用检索/迭代提供商
-        if DEEPRESEARCH_PROVIDER in ['tavily', 'perplexity', 'openai']:
-            if not DEEPRESEARCH_API_KEY:
-                raise Exception('DeepResearch服务配置错误：未设置 DEEPRESEARCH_API_KEY')
-
-            summary_text = None
-            # 先生成检索摘要，减少query过长导致搜索失败
-            if OPENROUTER_API_KEY:
-                try:
-                    summary_prompt = build_search_summary(conversation_history, chapter_id)
-                    summary_response = client.chat.completions.create(
-                        model=MODEL_NAME,
-                        messages=[
-                            {
-                                "role": "system",
-                                "content": "你是一个信息抽取助手，擅长将对话压缩成检索摘要。"
-                            },
-                            {
-                                "role": "user",
-                                "content": summary_prompt
-                            }
-                        ],
-                        temperature=0.2,
-                        max_tokens=300,
-                        top_p=0.9
-                    )
-                    summary_text = summary_response.choices[0].message.content.strip()
-                    if len(summary_text) > 350:
-                        summary_text = summary_text[:350]
-                except Exception as summary_error:
-                    logger.warning(f"检索摘要生成失败，使用默认query: {summary_error}")
-
-            research_result = research_client.generate_chapter(
-                chapter_id=chapter_id,
-                conversation_history=conversation_history,
-                doc_type=doc_type,
-                depth=research_depth,
-                iterations=config['iterations'],
-                summary_text=summary_text
-            )
-            raw_sources = research_result.get('sources', [])
-            sources = rank_and_filter_sources(
-                raw_sources,
-                conversation_history,
+
+def _research_chapter(params):
+    """执行章节生成（缓存、剖析、合并相同请求），在请求截止时间范围内调用"""
+    requested = PROFILER.requested(request.headers, request.args)
+    # 剖析请求总是单独重新生成
+    request_key, result, cache_status = cached_chapter_result(
+        params, bypass=requested or chapter_cache_bypassed(request.headers)
+    )
+    shared = False
+    if requested:
+        with PROFILER.profile(params['chapter_id']) as profile:
+            result = generate_chapter_content(**params)
+        store_chapter_result(request_key, result)
+        result['profile'] = profile.to_dict()
+    elif result is None:
+        result, shared = generate_chapter_once(request_key, params)
+    response = jsonify(result)
+    if cache_status:
+        response.headers[CHAPTER_CACHE_HEADER] = cache_status
+    if shared:
+        response.headers[COALESCED_HEADER] = 'true'
+    return response
+
+
+@app.route('/research/business-plan-chapter/stream', methods=['POST'])
+def research_chapter_stream():
+    """
+    流式生成章节（Server-Sent Events）
+
+    请求体同 /research/business-plan-chapter；响应为 text/event-stream：
+    stage（started/summary/sources/synthesis）-> token -> done（含来源清单与引用校验后的全文）
+    """
+    params, error = parse_chapter_request(request.json)
+    if error:
+        return jsonify({'error': error}), 400
+
+    logger.info(f"开始流式生成章节: {params['chapter_id']}, 深度: {params['research_depth']}")
+    deadline = request_deadline(request.headers, request.args)
+    return Response(
+        stream_with_context(stream_chapter_events(**params, deadline=deadline)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def run_chapter_job(job, params):
+    """
+    执行章节任务
+
+    任务的取消事件作为无时间上限的请求截止时间：取消后检索不再等待，
+    后续的上游调用（含合成请求）在发出前中断，任务状态为 cancelled。
+    """
+    with deadlines.scope(deadlines.Deadline.unbounded(job.cancel_event)):
+        return generate_chapter_content(**params, progress_callback=job.report)
+
+
+@app.route('/research/jobs', methods=['POST'])
+def submit_research_job():
+    """
+    提交异步章节生成任务，立即返回 job id
+
+    请求体同 /research/business-plan-chapter；响应 202：
+    {"jobId": "...", "status": "queued", "statusUrl": "/research/jobs/<jobId>"}
+    """
+    params, error = parse_chapter_request(request.json)
+    if error:
+        return jsonify({'error': error}), 400
+
+    job = JOB_MANAGER.submit('business-plan-chapter', params, lambda job: run_chapter_job(job, params))
+    logger.info(f"已提交章节任务: {job.id}, 章节: {params['chapter_id']}")
+    return jsonify({
+        'jobId': job.id,
+        'status': job.status,
+        'statusUrl': f'/research/jobs/{job.id}'
+    }), 202
+
+
+@app.route('/research/jobs/<job_id>', methods=['GET'])
+def get_research_job(job_id):
+    """查询任务状态、阶段、进度；完成后包含 result"""
+    job = JOB_MANAGER.get(job_id)
+    if not job:
+        return jsonify({'error': f'任务不存在: {job_id}'}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/research/jobs/<job_id>', methods=['DELETE'])
+def cancel_research_job(job_id):
+    """取消任务；运行中的任务在当前阶段结束后中断"""
+    job = JOB_MANAGER.cancel(job_id)
+    if not job:
+        return jsonify({'error': f'任务不存在: {job_id}'}), 404
+    logger.info(f"取消章节任务: {job_id}, 当前状态: {job.status}")
+    return jsonify(job.to_dict())
+
+
+@app.route('/research/document', methods=['POST'])
+def research_document():
+    """
+    整文档生成：对话只传一次，共享检索摘要，各章节检索与合成并发执行
+
+    请求体：
+    {
+        "type": "business",
+        "conversationHistory": [...],
+        "researchDepth": "medium",
+        "chapterIds": ["market-analysis", ...]   // 可选，默认该类型全部章节
+    }
+    """
+    try:
+        params, error = parse_document_request(request.json)
+        if error:
+            return jsonify({'error': error}), 400
+        conversation_history = RequestContext.of(params['conversation_history'])
+        doc_type = params['doc_type']
+        research_depth = params['research_depth']
+        chapter_ids = params['chapter_ids']
+
+        logger.info(f"开始生成整文档: {doc_type}, 章节数: {len(chapter_ids)}, 深度: {research_depth}")
+        start_time = time.time()
+        deadline = request_deadline(request.headers, request.args)
+
+        # 共享工作：检索摘要按文档只生成一次
+        summary_text = None
+        with metrics.collect_timings() as shared:
+            if uses_retrieval_provider():
+                with deadlines.scope(deadline):
+                    summary_text = generate_search_summary(conversation_history, document_summary_scope(chapter_ids))
+
+        # 各章节在线程池中执行，复制上下文以共享请求截止时间
+        with deadlines.scope(deadline):
+            context = contextvars.copy_context()
+        futures = {
+            chapter_id: submit_document_chapter(
+                context.copy().run,
+                generate_chapter_content,
                 chapter_id,
-                max_items=SOURCE_MAX_ITEMS
+                conversation_history,
+                doc_type=doc_type,
+                research_depth=research_depth,
+                summary_text=summary_text,
+                summarize=False
             )
+            for chapter_id in chapter_ids
+        }
 
-            # 二次合成（可选），确保结构化输出与引用
-            if OPENROUTER_API_KEY:
-                synthesis_prompt = build_synthesis_prompt(
-                    chapter_id=chapter_id,
-                    conversation_history=conversation_history,
-                    sources=sources
-                )
-                synthesis_response = client.chat.completions.create(
-                    model=MODEL_NAME,
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "你是一位专业的商业分析师和研究专家。请基于来源进行严谨总结并标注引用。"
-                        },
-                        {
-                            "role": "user",
-                            "content": synthesis_prompt
-                        }
-                    ],
-                    temperature=config['synthesis_temperature'],
-                    max_tokens=config['max_tokens'],
-                    top_p=0.95,
-                    presence_penalty=1.1
-                )
-                content = synthesis_response.choices[0].message.content
-                usage = synthesis_response.usage
-                total_tokens = usage.total_tokens if usage else 0
-            else:
-                content = research_result.get('content', '')
-                total_tokens = research_result.get('tokens', 0)
-        else:
-            # 回退到 OpenRouter 单次生成
-            response = client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "你是一位专业的商业分析师和研究专家。请基于用户提供的信息，进行深入的研究和分析，提供专业、详实的报告内容。"
-                    },
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                temperature=config['temperature'],
-                max_tokens=config['max_tokens'],
-                top_p=0.95,
-                presence_penalty=1.1
-            )
-            content = response.choices[0].message.content
-            usage = response.usage
-            total_tokens = usage.total_tokens if usage else 0
-
-        # 始终以后端 canonical 来源清单为准，避免模型返回无关来源
-        content = append_canonical_source_list(content, sources)
-
-        elapsed_time = time.time() - start_time
-        
-        logger.info(f"章节生成成功: {chapter_id}, 耗时: {elapsed_time:.2f}s, tokens: {total_tokens}")
-        
-        # 引用校验：检查是否存在无效编号
-        if sources:
-            import re
-            citations = [int(n) for n in re.findall(r'\[(\d+)\]', content)]
-            invalid = sorted({n for n in citations if n < 1 or n > len(sources)})
-            if invalid:
-                content += "\n\n## 质量校验\n"
-                content += f"- 检测到无效引用编号：{', '.join(map(str, invalid))}\n"
-                content += "- 建议重新生成或补充来源以确保引用一致性\n"
-        return jsonify({
-            'chapterId': chapter_id,
-            'content': content,
-            'sources': sources or [],  # 检索模式可返回 sources
-            'confidence': 0.85,  # 默认置信度
-            'tokens': total_tokens,
-            'mode': 'deep',
-            'depth': research_depth,
-            'elapsed_time': elapsed_time
-        })
-        
-    except Exception as e:
-        logger.error(f"生成章节失败: {str(e)}", exc_info=True)
+        outcomes = []
+        for chapter_id in chapter_ids:
+            try:
+                outcomes.append((chapter_id, futures[chapter_id].result()))
+            except Exception as chapter_error:
+                outcomes.append((chapter_id, chapter_error))
 
-        # 检查是否为认证错误
-        error_msg = str(e)
-        if '401' in error_msg or 'authentication' in error_msg.lower() or 'api key' in error_msg.lower():
-            return jsonify({
-                'error': 'DeepResearch服务配置错误：API密钥无效或已过期。请访问 https://openrouter.ai/keys 获取有效的API密钥，并更新 .env 文件中的 OPENROUTER_API_KEY 配置。'
-            }), 401
+        body, status = document_payload(doc_type, research_depth, outcomes, start_time, shared.tokens('summary'))
+        return jsonify(body), status
 
-        return jsonify({
-            'error': f'DeepResearch服务错误: {str(e)}'
-        }), 500
+    except Exception as e:
+        logger.error(f"生成整文档失败: {str(e)}", exc_info=True)
+        return _error_response(e)
 
 if __name__ == '__main__':
     # 检查 API Key
@@ -706,5 +1558,6 @@ if __name__ == '__main__':
     host = os.getenv('DEEPRESEARCH_HOST', '127.0.0.1')
     port = int(os.getenv('DEEPRESEARCH_PORT', 5001))
     logger.info(f"监听地址: {host}:{port}")
+    prewarm_upstreams()
     
     app.run(host=host, port=port, debug=False)
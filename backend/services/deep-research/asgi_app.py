@@ -0,0 +1,482 @@
+"""
+DeepResearch asyncio 服务模式（ASGI）
+
+与 app.py 的 Flask 路由共享提示词构建、来源重排与缓存，
+OpenRouter 调用与检索提供商调用均为可等待对象，单进程即可承载大量并发的长耗时请求。
+每个请求按截止时间执行（超时返回 504），客户端断开时取消处理协程及其上游调用。
+
+启动：
+    uvicorn asgi_app:app --host 0.0.0.0 --port 5001
+"""
+import asyncio
+import json
+import logging
+import time
+import weakref
+from urllib.parse import parse_qsl
+
+from openai import AsyncOpenAI
+
+import app as service
+import deadlines
+import metrics
+from circuit_breaker import CircuitOpenError, ProvidersUnavailable
+from request_context import RequestContext
+
+logger = logging.getLogger(__name__)
+
+# 非 None 时所有请求使用该客户端（测试或嵌入方替换）；默认按事件循环创建，见 openrouter_client()
+async_client = None
+_loop_clients = weakref.WeakKeyDictionary()
+
+
+def openrouter_client() -> AsyncOpenAI:
+    """
+    当前事件循环的 OpenRouter 异步客户端
+
+    连接来自 service.HTTP_TRANSPORT 的共享连接池（与同步客户端相同的按 host 连接池配置与统计），
+    需在事件循环内调用。
+    """
+    if async_client is not None:
+        return async_client
+    loop = asyncio.get_running_loop()
+    client = _loop_clients.get(loop)
+    if client is None:
+        client = _loop_clients[loop] = AsyncOpenAI(
+            api_key=service.OPENROUTER_API_KEY,
+            base_url=service.OPENROUTER_BASE_URL,
+            timeout=service.REQUEST_TIMEOUT,
+            max_retries=0,
+            http_client=service.HTTP_TRANSPORT.aclient_for(service.OPENROUTER_BASE_URL)
+        )
+    return client
+
+
+_document_semaphore = None
+
+
+async def acreate_completion(name, params, hedge=False, max_retries=None):
+    """create_completion 的异步版本，共享同一重试策略、延迟统计、熔断器与指标"""
+    client = openrouter_client()
+    with metrics.stage_timer(name):
+        response = await service.BREAKERS.get('openrouter').acall(lambda: service.UPSTREAM_POLICY.acall(
+            lambda: client.chat.completions.create(**params, timeout=deadlines.timeout(service.REQUEST_TIMEOUT)),
+            name=f'openrouter.{name}',
+            hedge=hedge,
+            max_retries=max_retries
+        ), is_abort=service.is_interruption, slow_call_seconds=service.breaker_slow_call(name))
+    metrics.record_usage(name, params.get('model', service.MODEL_NAME), response.usage)
+    return response
+
+
+def _chapter_slots() -> asyncio.Semaphore:
+    """整文档章节并发上限（所有请求共享），在事件循环内惰性创建"""
+    global _document_semaphore
+    if _document_semaphore is None:
+        _document_semaphore = asyncio.Semaphore(max(1, service.DOCUMENT_CHAPTER_CONCURRENCY))
+    return _document_semaphore
+
+
+async def agenerate_search_summary(conversation_history, chapter_id):
+    """generate_search_summary 的异步版本，共享同一摘要缓存"""
+    if not service.OPENROUTER_API_KEY:
+        return None
+    cache_key = service.summary_cache_key(conversation_history, chapter_id)
+    cached = service.SUMMARY_CACHE.get(cache_key)
+    if cached is not None:
+        logger.info(f"检索摘要命中缓存: {chapter_id}")
+        return cached
+    try:
+        with deadlines.stage(max_share=service.SUMMARY_MAX_SHARE):
+            summary_text = service.clip_summary(await acreate_completion(
+                'summary',
+                service.summary_request(conversation_history, chapter_id),
+                hedge=True,
+                max_retries=service.SUMMARY_MAX_RETRIES
+            ))
+        if summary_text:
+            service.SUMMARY_CACHE.set(cache_key, summary_text)
+        return summary_text
+    except Exception as summary_error:
+        logger.warning(f"检索摘要生成失败，使用默认query: {summary_error}")
+        return None
+
+
+async def acollect_chapter_sources(
+    chapter_id,
+    conversation_history,
+    doc_type,
+    research_depth,
+    config,
+    summary_text=None,
+    summarize=True
+):
+    """collect_chapter_sources 的异步版本"""
+    service._require_provider_key()
+
+    if summary_text is None and summarize:
+        summary_text = await agenerate_search_summary(conversation_history, chapter_id)
+
+    with metrics.stage_timer('retrieval'), \
+            deadlines.stage(reserve=service.SYNTHESIS_RESERVE, min_share=service.RETRIEVAL_MIN_SHARE):
+        provider, research_result = await service.FAILOVER.arun(
+            service.research_chain(),
+            lambda research: research.agenerate_chapter(
+                chapter_id=chapter_id,
+                conversation_history=conversation_history,
+                doc_type=doc_type,
+                depth=research_depth,
+                iterations=config['iterations'],
+                summary_text=summary_text
+            )
+        )
+    research_result = dict(research_result, provider=provider)
+    # 重排（SimHash、关键词匹配）为 CPU 计算，放到线程中执行，不阻塞事件循环
+    sources = await asyncio.to_thread(
+        service.rank_and_filter_sources,
+        research_result.get('sources', []),
+        conversation_history,
+        chapter_id,
+        max_items=service.SOURCE_MAX_ITEMS
+    )
+    return research_result, sources
+
+
+async def agenerate_chapter_content(
+    chapter_id,
+    conversation_history,
+    doc_type='business',
+    research_depth='medium',
+    summary_text=None,
+    summarize=True
+):
+    """generate_chapter_content 的异步版本，返回相同结构的章节结果"""
+    with metrics.collect_timings() as timings:
+        result = await _arun_chapter_pipeline(
+            chapter_id, conversation_history, doc_type, research_depth, summary_text, summarize
+        )
+    result['tokens'] += timings.tokens('summary')
+    result['timings'] = timings.to_dict()
+    return result
+
+
+async def _arun_chapter_pipeline(chapter_id, conversation_history, doc_type, research_depth, summary_text, summarize):
+    logger.info(f"开始生成章节(async): {chapter_id}, 深度: {research_depth}")
+
+    config = service.DEPTH_CONFIG.get(research_depth, service.DEPTH_CONFIG['medium'])
+    conversation_history = RequestContext.of(conversation_history)
+    start_time = time.time()
+    sources = []
+    budget_report = None
+    research_result = None
+    provider = 'openrouter'
+
+    if service.uses_retrieval_provider():
+        try:
+            research_result, sources = await acollect_chapter_sources(
+                chapter_id,
+                conversation_history,
+                doc_type,
+                research_depth,
+                config,
+                summary_text=summary_text,
+                summarize=summarize
+            )
+        except ProvidersUnavailable as unavailable:
+            service.fall_back_to_single_shot(unavailable)
+        except Exception as retrieval_error:
+            if not service.retrieval_cut_short(retrieval_error):
+                raise
+            service.fall_back_to_single_shot(retrieval_error)
+
+    if research_result is not None:
+        provider = research_result.get('provider', service.DEEPRESEARCH_PROVIDER)
+        if service.OPENROUTER_API_KEY:
+            # prompt 渲染与 token 估算同样在线程中执行
+            params, sources, budget_report = await asyncio.to_thread(
+                service.synthesis_request, chapter_id, conversation_history, sources, config
+            )
+            try:
+                response = await acreate_completion('synthesis', params)
+                content = response.choices[0].message.content
+                total_tokens = response.usage.total_tokens if response.usage else 0
+            except CircuitOpenError as open_error:
+                if not research_result.get('content'):
+                    raise
+                logger.warning(f"{open_error}，使用检索提供商生成的内容: {chapter_id}")
+                content = research_result['content']
+                total_tokens = research_result.get('tokens', 0)
+        else:
+            content = research_result.get('content', '')
+            total_tokens = research_result.get('tokens', 0)
+    else:
+        params = await asyncio.to_thread(service.single_shot_request, chapter_id, conversation_history, config)
+        response = await acreate_completion('single-shot', params)
+        content = response.choices[0].message.content
+        total_tokens = response.usage.total_tokens if response.usage else 0
+
+    content = await asyncio.to_thread(service.finalize_chapter_content, content, sources)
+    elapsed_time = time.time() - start_time
+    logger.info(f"章节生成成功(async): {chapter_id}, 耗时: {elapsed_time:.2f}s, tokens: {total_tokens}")
+
+    return {
+        'chapterId': chapter_id,
+        'content': content,
+        'sources': sources or [],
+        'confidence': 0.85,
+        'tokens': total_tokens,
+        'mode': 'deep',
+        'depth': research_depth,
+        'elapsed_time': elapsed_time,
+        'provider': provider,
+        'prompt_budget': budget_report.to_dict() if budget_report else None
+    }
+
+
+async def agenerate_chapter_once(key, params):
+    """service.generate_chapter_once 的异步版本"""
+    async def generate():
+        result = await agenerate_chapter_content(**params)
+        service.store_chapter_result(key, result)
+        return result
+
+    if service.SINGLE_FLIGHT is None:
+        return await generate(), False
+    return await service.SINGLE_FLIGHT.ado(key, generate)
+
+
+async def agenerate_document(conversation_history, doc_type, research_depth, chapter_ids):
+    """整文档生成：共享检索摘要，章节在全局并发上限内并发执行"""
+    logger.info(f"开始生成整文档(async): {doc_type}, 章节数: {len(chapter_ids)}, 深度: {research_depth}")
+    start_time = time.time()
+    conversation_history = RequestContext.of(conversation_history)
+
+    summary_text = None
+    with metrics.collect_timings() as shared:
+        if service.uses_retrieval_provider():
+            summary_text = await agenerate_search_summary(
+                conversation_history, service.document_summary_scope(chapter_ids)
+            )
+
+    slots = _chapter_slots()
+
+    async def run(chapter_id):
+        # 与同步版本共享排队/执行中章节计数
+        metrics.DOCUMENT_QUEUED.inc()
+        try:
+            await slots.acquire()
+        finally:
+            metrics.DOCUMENT_QUEUED.dec()
+        try:
+            with metrics.DOCUMENT_ACTIVE.track():
+                return await agenerate_chapter_content(
+                    chapter_id,
+                    conversation_history,
+                    doc_type=doc_type,
+                    research_depth=research_depth,
+                    summary_text=summary_text,
+                    summarize=False
+                )
+        finally:
+            slots.release()
+
+    results = await asyncio.gather(*(run(c) for c in chapter_ids), return_exceptions=True)
+    return service.document_payload(
+        doc_type, research_depth, list(zip(chapter_ids, results)), start_time, shared.tokens('summary')
+    )
+
+
+# ---------------------------------------------------------------------------
+# ASGI 路由
+# ---------------------------------------------------------------------------
+
+async def _read_json(receive):
+    chunks = []
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        chunks.append(message.get('body', b''))
+        if not message.get('more_body'):
+            break
+    raw = b''.join(chunks)
+    return json.loads(raw) if raw else {}
+
+
+async def _send_json(send, body, status=200, headers=None):
+    payload = json.dumps(body, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json; charset=utf-8'),
+            (b'content-length', str(len(payload)).encode()),
+            (b'access-control-allow-origin', b'*')
+        ] + [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in (headers or {}).items()]
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def _wait_disconnect(receive):
+    """等待客户端断开（请求体已读完后 receive 只会返回 http.disconnect）"""
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def _query_args(scope):
+    return dict(parse_qsl(scope.get('query_string', b'').decode('latin-1')))
+
+
+async def _run_handler(handler, body, headers, deadline, receive):
+    """
+    在请求截止时间内执行 handler，同时监听客户端断开
+
+    Returns:
+        handler 的返回值；截止时间已到时为 504 错误响应；客户端已断开时为 None
+    """
+    with deadlines.scope(deadline):
+        # 任务复制当前上下文，handler 内的各阶段读取同一截止时间
+        task = asyncio.ensure_future(handler(body, headers))
+    disconnected = asyncio.ensure_future(_wait_disconnect(receive))
+    try:
+        done, _ = await asyncio.wait(
+            {task, disconnected}, timeout=deadline.remaining(), return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        disconnected.cancel()
+    if task in done:
+        return task.result()
+
+    task.cancel()
+    if disconnected in done:
+        # 取消正在等待的上游请求与检索，不再发送响应
+        deadline.cancel()
+        logger.info(f'客户端已断开，取消请求: {handler.__name__}')
+        result = None
+    else:
+        result = service.error_payload(deadlines.DeadlineExceeded(handler.__name__, deadline.budget))
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+    return result
+
+
+async def _send_text(send, text, status=200, content_type=metrics.CONTENT_TYPE):
+    payload = text.encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', content_type.encode()),
+            (b'content-length', str(len(payload)).encode())
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def health(body, headers):
+    return {
+        'status': 'ok',
+        'service': 'deep-research',
+        'mode': 'asyncio',
+        'model': service.MODEL_NAME,
+        'timestamp': time.time()
+    }, 200
+
+
+async def research_chapter(body, headers):
+    params, error = service.parse_chapter_request(body)
+    if error:
+        return {'error': error}, 400
+    try:
+        request_key, result, cache_status = service.cached_chapter_result(
+            params, bypass=service.chapter_cache_bypassed(headers)
+        )
+        shared = False
+        if result is None:
+            result, shared = await agenerate_chapter_once(request_key, params)
+        response_headers = {}
+        if cache_status:
+            response_headers[service.CHAPTER_CACHE_HEADER] = cache_status
+        if shared:
+            response_headers[service.COALESCED_HEADER] = 'true'
+        return result, 200, response_headers
+    except Exception as e:
+        logger.error(f"生成章节失败: {str(e)}", exc_info=True)
+        return service.error_payload(e)
+
+
+async def research_document(body, headers):
+    params, error = service.parse_document_request(body)
+    if error:
+        return {'error': error}, 400
+    try:
+        return await agenerate_document(**params)
+    except Exception as e:
+        logger.error(f"生成整文档失败: {str(e)}", exc_info=True)
+        return service.error_payload(e)
+
+
+async def metrics_endpoint(body, headers):
+    return metrics.REGISTRY.render(), 200
+
+
+ROUTES = {
+    ('GET', '/health'): health,
+    ('GET', '/metrics'): metrics_endpoint,
+    ('POST', '/research/business-plan-chapter'): research_chapter,
+    ('POST', '/research/document'): research_document
+}
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # 预热在后台线程中进行（同步连接池），不阻塞启动
+            service.prewarm_upstreams()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            # OpenRouter 客户端的连接属于共享连接池，随之关闭
+            _loop_clients.pop(asyncio.get_running_loop(), None)
+            await service.HTTP_TRANSPORT.aclose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI 入口"""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    handler = ROUTES.get((scope['method'], scope['path']))
+    if handler is None:
+        await _send_json(send, {'error': f"未找到路由: {scope['method']} {scope['path']}"}, 404)
+        return
+
+    try:
+        body = await _read_json(receive) if scope['method'] == 'POST' else {}
+    except ValueError:
+        await _send_json(send, {'error': '请求体不是合法的 JSON'}, 400)
+        return
+    if body is None:
+        return
+
+    # 请求头名统一为小写
+    headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+    deadline = service.request_deadline(headers, _query_args(scope))
+    with metrics.IN_FLIGHT.labels(endpoint=handler.__name__).track():
+        outcome = await _run_handler(handler, body, headers, deadline, receive)
+    if outcome is None:
+        return
+    result, status, *extra = outcome
+    if isinstance(result, str):
+        await _send_text(send, result, status)
+    else:
+        await _send_json(send, result, status, *extra)
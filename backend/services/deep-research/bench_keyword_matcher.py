@@ -0,0 +1,61 @@
+"""
+关键词匹配微基准
+
+对比来源词法打分（_lexical_relevance）与改造前逐个关键词 `keyword in text` 的实现：
+    python bench_keyword_matcher.py --sizes 500 2000 10000 --repeat 5
+
+基线为改造前的 _lexical_relevance 原样保留，两者在同一批来源文本上运行并校验结果一致。
+"""
+import argparse
+import os
+
+os.environ.setdefault('OPENROUTER_API_KEY', 'bench')
+
+import app  # noqa: E402
+from bench_source_ranking import CONVERSATION, best_of, make_sources  # noqa: E402
+
+
+def baseline_lexical_relevance(source, intent_keywords):
+    """改造前的实现（逐个关键词子串查找）"""
+    if not intent_keywords:
+        return 0.0
+    text = app._source_text(source)
+    if not text:
+        return 0.0
+
+    weighted_hits = 0.0
+    matched = 0
+    for idx, keyword in enumerate(intent_keywords):
+        if not keyword:
+            continue
+        if keyword in text:
+            matched += 1
+            weighted_hits += 1.2 if idx < 6 else 1.0
+    coverage = matched / max(1, min(len(intent_keywords), 12))
+    return min(1.0, (weighted_hits / 10.0) + coverage * 0.6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[500, 2000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    keywords = app._extract_intent_keywords(CONVERSATION, 'market-analysis')
+    matcher = app._intent_matcher(keywords)
+    print(f'关键词 {len(keywords)} 个')
+    print(f"{'texts':>8} {'baseline(ms)':>14} {'matcher(ms)':>12} {'speedup':>8}")
+    for size in args.sizes:
+        sources = make_sources(size)
+        expected = [baseline_lexical_relevance(source, keywords) for source in sources]
+        actual = [app._lexical_relevance(source, keywords, matcher=matcher) for source in sources]
+        if expected != actual:
+            raise SystemExit('匹配结果与基线不一致')
+
+        base = best_of(args.repeat, lambda: [baseline_lexical_relevance(s, keywords) for s in sources])
+        fast = best_of(args.repeat, lambda: [app._lexical_relevance(s, keywords, matcher=matcher) for s in sources])
+        print(f'{size:>8} {base * 1000:>14.2f} {fast * 1000:>12.2f} {base / fast:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""
+章节接口离线基准
+
+启动本地 OpenRouter / Tavily 替身服务（stub_upstreams.py，可配置延迟分布与错误率），
+在子进程中以真实配置启动 DeepResearch 服务，按递增并发压测 /research/business-plan-chapter，
+对 DEPTH_CONFIG 中的每个深度输出 p50/p95/p99 延迟、吞吐、服务进程 CPU 与 RSS：
+
+    python bench_service.py --depths shallow medium deep --concurrency 1 4 16 --requests 48 \\
+        --openrouter-latency lognormal:0.8:0.4 --tavily-latency uniform:0.2:0.6 --error-rate 0.01 \\
+        --output bench-results.json
+
+--mode asgi 时使用 uvicorn 启动 asgi_app。默认每个请求的对话不同（检索与摘要缓存不命中），--warm-cache 时复用同一对话。
+结果文件为 JSON，可提交到评审中对比回归。
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from stub_upstreams import start_openrouter_stub, start_tavily_stub
+
+SERVICE_DIR = Path(__file__).resolve().parent
+CHAPTERS = ['market-analysis', 'competitive-landscape', 'executive-summary', 'business-model']
+IDEAS = ['宠物健身APP', '社区团购小程序', 'AI 写作助手', '露营装备租赁平台', '老年人智能药盒']
+
+
+def _load_depths() -> List[str]:
+    # 只读取深度配置，不让父进程连接真实上游
+    os.environ.setdefault('OPENROUTER_API_KEY', 'bench')
+    os.environ.setdefault('DEEPRESEARCH_HTTP_PREWARM', '0')
+    os.environ.setdefault('DEEPRESEARCH_PROMPT_POLL_INTERVAL', '0')
+    from app import DEPTH_CONFIG
+    # app 导入时会配置 INFO 级日志，压测请求日志只写入服务子进程日志
+    logging.getLogger('httpx').setLevel(logging.WARNING)
+    return list(DEPTH_CONFIG)
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """最近秩分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, int(-(-pct * len(ordered) // 100)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def process_sample(pid: int) -> Optional[Dict[str, float]]:
+    """读取 /proc 中进程累计 CPU 时间与内存（非 Linux 返回 None）"""
+    try:
+        with open(f'/proc/{pid}/stat') as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status') as status_file:
+            status = dict(line.split(':', 1) for line in status_file if ':' in line)
+    except (OSError, IndexError):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    return {
+        'cpu': (int(fields[11]) + int(fields[12])) / ticks,
+        'rss_mb': int(status.get('VmRSS', '0 kB').split()[0]) / 1024,
+        'peak_rss_mb': int(status.get('VmHWM', '0 kB').split()[0]) / 1024
+    }
+
+
+def service_env(openrouter_url: str, tavily_url: str, warm_cache: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        'OPENROUTER_API_KEY': 'bench',
+        'OPENROUTER_BASE_URL': f'{openrouter_url}/api/v1',
+        'DEEPRESEARCH_PROVIDER': 'tavily',
+        'DEEPRESEARCH_API_KEY': 'bench',
+        'DEEPRESEARCH_API_URL': tavily_url,
+        'DEEPRESEARCH_FALLBACK_PROVIDERS': '',
+        'DEEPRESEARCH_PROMPT_POLL_INTERVAL': '0',
+        'DEEPRESEARCH_SEARCH_CACHE': 'true' if warm_cache else 'false',
+        'PYTHONUNBUFFERED': '1'
+    })
+    # 替身服务的 429 带 Retry-After: 0，退避基数调小以免重试等待主导延迟
+    env.setdefault('DEEPRESEARCH_RETRY_DELAY', '50')
+    return env
+
+
+def start_service(mode: str, port: int, env: Dict[str, str], log_path: Path) -> subprocess.Popen:
+    if mode == 'asgi':
+        command = [
+            sys.executable, '-m', 'uvicorn', 'asgi_app:app',
+            '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning'
+        ]
+    else:
+        command = [sys.executable, str(Path(__file__).resolve()), '--serve', '--port', str(port)]
+    with open(log_path, 'w') as log_file:
+        return subprocess.Popen(command, cwd=SERVICE_DIR, env=env, stdout=log_file, stderr=subprocess.STDOUT)
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f'服务进程已退出（退出码 {process.returncode}），请查看日志')
+        try:
+            if httpx.get(f'{base_url}/health', timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit('服务启动超时')
+
+
+def chapter_payload(index: int, depth: str, warm_cache: bool) -> Dict[str, Any]:
+    idea = IDEAS[index % len(IDEAS)]
+    content = idea if warm_cache else f'{idea}，目标城市编号 {index}，关注用户痛点、市场规模与竞品格局'
+    return {
+        'chapterId': CHAPTERS[index % len(CHAPTERS)],
+        'type': 'business',
+        'researchDepth': depth,
+        'conversationHistory': [{'role': 'user', 'content': content}]
+    }
+
+
+def run_level(base_url: str, pid: int, depth: str, concurrency: int, total: int, warm_cache: bool, offset: int):
+    """以固定并发发送 total 个章节请求，返回该档位的统计"""
+    latencies = []
+    errors = 0
+    before = process_sample(pid)
+
+    def send(client: httpx.Client, index: int):
+        started = time.perf_counter()
+        response = client.post(
+            f'{base_url}/research/business-plan-chapter',
+            json=chapter_payload(offset + index, depth, warm_cache)
+        )
+        return response.status_code, time.perf_counter() - started
+
+    started = time.perf_counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    with httpx.Client(timeout=900, limits=limits) as client, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(send, client, index) for index in range(total)]
+        for future in futures:
+            try:
+                status, elapsed = future.result()
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors += 1
+    wall = time.perf_counter() - started
+    after = process_sample(pid)
+
+    result = {
+        'depth': depth,
+        'concurrency': concurrency,
+        'requests': total,
+        'errors': errors,
+        'p50': percentile(latencies, 50),
+        'p95': percentile(latencies, 95),
+        'p99': percentile(latencies, 99),
+        'mean': sum(latencies) / len(latencies) if latencies else None,
+        'rps': len(latencies) / wall if wall else 0.0,
+        'wallSeconds': wall,
+        'cpuSeconds': None,
+        'cpuPercent': None,
+        'rssMb': None,
+        'peakRssMb': None
+    }
+    if before and after:
+        cpu = after['cpu'] - before['cpu']
+        result.update({
+            'cpuSeconds': cpu,
+            'cpuPercent': 100.0 * cpu / wall if wall else 0.0,
+            'rssMb': after['rss_mb'],
+            'peakRssMb': after['peak_rss_mb']
+        })
+    return result
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=SERVICE_DIR, stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _fmt(value: Optional[float], scale: float = 1.0, digits: int = 2) -> str:
+    return '-' if value is None else f'{value * scale:.{digits}f}'
+
+
+def serve(port: int) -> None:
+    """子进程入口：以多线程 WSGI 服务运行 app（环境变量由父进程设置）"""
+    from werkzeug.serving import make_server
+
+    import app as service
+    server = make_server('127.0.0.1', port, service.app, threaded=True)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--depths', nargs='+', default=None, help='默认 DEPTH_CONFIG 中的全部深度')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--requests', type=int, default=0, help='每个并发档位的请求数，默认 max(8, 并发*3)')
+    parser.add_argument('--openrouter-latency', default='lognormal:0.8:0.4')
+    parser.add_argument('--tavily-latency', default='uniform:0.2:0.6')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--mode', choices=['flask', 'asgi'], default='flask')
+    parser.add_argument('--port', type=int, default=5099)
+    parser.add_argument('--warm-cache', action='store_true')
+    parser.add_argument('--output', default='bench-results.json')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port)
+        return
+
+    available = _load_depths()
+    depths = args.depths or available
+    unknown = sorted(set(depths) - set(available))
+    if unknown:
+        raise SystemExit(f'未知深度: {", ".join(unknown)}（可选: {", ".join(available)}）')
+
+    openrouter = start_openrouter_stub(args.openrouter_latency, args.error_rate, args.seed)
+    tavily = start_tavily_stub(args.tavily_latency, args.error_rate, args.seed + 1)
+    base_url = f'http://127.0.0.1:{args.port}'
+    log_path = Path(args.output).with_suffix('.service.log')
+    process = start_service(args.mode, args.port, service_env(openrouter.url, tavily.url, args.warm_cache), log_path)
+
+    results = []
+    try:
+        wait_ready(base_url, process)
+        offset = 0
+        print(f"{'depth':>8} {'conc':>5} {'reqs':>5} {'err':>4} {'p50(s)':>8} {'p95(s)':>8} {'p99(s)':>8} "
+              f"{'req/s':>7} {'cpu%':>6} {'rss(MB)':>8}")
+        for depth in depths:
+            for concurrency in args.concurrency:
+                total = args.requests or max(8, concurrency * 3)
+                level = run_level(base_url, process.pid, depth, concurrency, total, args.warm_cache, offset)
+                offset += total
+                results.append(level)
+                print(f"{depth:>8} {concurrency:>5} {total:>5} {level['errors']:>4} {_fmt(level['p50']):>8} "
+                      f"{_fmt(level['p95']):>8} {_fmt(level['p99']):>8} {level['rps']:>7.2f} "
+                      f"{_fmt(level['cpuPercent'], digits=1):>6} {_fmt(level['rssMb'], digits=1):>8}")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        openrouter.stop()
+        tavily.stop()
+
+    report = {
+        'benchmark': 'deep-research-chapter',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': _git_revision(),
+        'mode': args.mode,
+        'python': platform.python_version(),
+        'cpuCount': os.cpu_count(),
+        'warmCache': args.warm_cache,
+        'upstreams': {'openrouter': openrouter.config.stats(), 'tavily': tavily.config.stats()},
+        'results': results
+    }
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f'结果已写入 {args.output}（服务日志: {log_path}）')
+
+
+if __name__ == '__main__':
+    main()
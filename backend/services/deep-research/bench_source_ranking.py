@@ -0,0 +1,75 @@
+"""
+来源重排微基准
+
+在数千条候选来源上对比 rank_and_filter_sources 的逐条打分路径（基线）与批量打分路径：
+    python bench_source_ranking.py --sizes 1000 5000 20000 --repeat 5
+
+两者调用的都是 app.rank_and_filter_sources 本身，仅通过 BATCH_RANKING_MIN_SOURCES 切换路径，
+计时覆盖归一化、特征构建、打分、阈值/TopN 与去重全流程，并校验两条路径的结果一致。
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault('OPENROUTER_API_KEY', 'bench')
+
+import app  # noqa: E402
+import batch_ranking  # noqa: E402
+
+CONVERSATION = [{'role': 'user', 'content': '做一个面向宠物主的智能健身APP，关注用户痛点、市场规模和竞品格局'}]
+WORDS = ['宠物', '健身', 'app', '用户', '痛点', '市场', '规模', '竞品', '增长', '渠道', 'random', 'noise', 'thread']
+HOSTS = ['www.statista.com', 'www.reuters.com', 'forum.example.com', 'news.example.org', 'zhuanlan.zhihu.com']
+
+
+def make_sources(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        {
+            'title': ' '.join(rng.choice(WORDS) for _ in range(6)),
+            'url': f'https://{rng.choice(HOSTS)}/item-{i}',
+            'snippet': ' '.join(rng.choice(WORDS) for _ in range(40)),
+            'relevance': rng.random()
+        }
+        for i in range(count)
+    ]
+
+
+def best_of(repeat, fn):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if not batch_ranking.available():
+        raise SystemExit('NumPy 未安装，无法运行批量打分基准')
+
+    print(f"{'sources':>8} {'baseline(ms)':>14} {'batch(ms)':>10} {'speedup':>8}")
+    for size in args.sizes:
+        sources = make_sources(size)
+
+        def run(threshold):
+            app.BATCH_RANKING_MIN_SOURCES = threshold
+            return app.rank_and_filter_sources(sources, CONVERSATION, 'market-analysis')
+
+        expected = [(item['url'], item['relevance']) for item in run(float('inf'))]
+        actual = [(item['url'], item['relevance']) for item in run(0)]
+        if expected != actual:
+            raise SystemExit('批量打分结果与逐条打分不一致')
+
+        base = best_of(args.repeat, lambda: run(float('inf')))
+        batch = best_of(args.repeat, lambda: run(0))
+        print(f'{size:>8} {base * 1000:>14.2f} {batch * 1000:>10.2f} {base / batch:>7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+进程内缓存工具
+
+提供带 TTL 与 LRU 容量上限的线程安全缓存，并统计命中/未命中次数；
+SizedTTLCache 额外按条目字节数限制总占用。
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+
+def fingerprint(*parts) -> str:
+    """对任意片段生成稳定的 sha256 指纹"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+class TTLCache:
+    """LRU + TTL 缓存"""
+
+    def __init__(self, maxsize: int = 256, ttl: float = 3600, name: str = 'cache'):
+        self.maxsize = max(1, int(maxsize))
+        self.ttl = float(ttl)
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else float(ttl))
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._evict()
+
+    def _remove(self, key: str) -> None:
+        del self._data[key]
+
+    def _evict(self) -> None:
+        """按 LRU 顺序淘汰超出容量的条目（调用方持有锁）"""
+        while len(self._data) > self.maxsize:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class SizedTTLCache(TTLCache):
+    """LRU + TTL 缓存，总字节数不超过 max_bytes（值为 bytes，超过上限的单个值不缓存）"""
+
+    def __init__(self, max_bytes: int, ttl: float = 3600, maxsize: int = 100000, name: str = 'cache'):
+        super().__init__(maxsize=maxsize, ttl=ttl, name=name)
+        self.max_bytes = max(1, int(max_bytes))
+        self.bytes = 0
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        if len(value) > self.max_bytes:
+            return
+        expires_at = time.monotonic() + (self.ttl if ttl is None else float(ttl))
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (expires_at, value)
+            self.bytes += len(value)
+            self._evict()
+
+    def _remove(self, key: str) -> None:
+        _, value = self._data.pop(key)
+        self.bytes -= len(value)
+
+    def _evict(self) -> None:
+        super()._evict()
+        while self.bytes > self.max_bytes and self._data:
+            self._remove(next(iter(self._data)))
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats.update({'bytes': self.bytes, 'max_bytes': self.max_bytes})
+        return stats
@@ -0,0 +1,436 @@
+"""
+章节注册表
+
+每个章节的元数据集中定义一次：所属文档类型、来源重排关键词、检索 query 侧重词、
+研究查询模板与兜底提示词。注册表在导入时构建且不可变，模板预编译，
+调用方只渲染当前章节需要的那一个模板。
+"""
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping, NamedTuple, Optional, Tuple
+
+from prompt_templates import CompiledTemplate, compile_template
+
+# 文档类型 -> 固定章节（按文档顺序）
+_DOCUMENT_ORDER = {
+    'business': (
+        'executive-summary',
+        'market-analysis',
+        'solution',
+        'business-model',
+        'competitive-landscape',
+        'marketing-strategy',
+        'team-structure',
+        'financial-projection',
+        'risk-assessment'
+    ),
+    'proposal': (
+        'project-summary',
+        'problem-insight',
+        'product-solution',
+        'implementation-path',
+        'budget-planning',
+        'risk-control'
+    )
+}
+
+# 来源重排使用的章节关键词
+_RANKING_KEYWORDS = {
+    'project-summary': ['立项', '机会', '场景', '痛点', '需求', '市场'],
+    'problem-insight': ['用户', '问题', '痛点', '价值主张', '画像'],
+    'product-solution': ['产品', '功能', '方案', '架构', 'MVP'],
+    'implementation-path': ['路线图', '里程碑', '实施', '资源', '计划'],
+    'budget-planning': ['预算', '成本', '收益', 'ROI', '投入产出'],
+    'risk-control': ['风险', '合规', '控制', '预案', '决策'],
+    'market-analysis': ['市场', '规模', '增长', '用户', '趋势'],
+    'competitive-landscape': ['竞品', '竞争', '差异化', '市场份额'],
+    'business-model': ['商业模式', '收入', '成本', '定价'],
+    'financial-projection': ['财务', '收入', '利润', '成本', '预测'],
+    'marketing-strategy': ['营销', '渠道', '获客', '品牌', '转化'],
+    'team-structure': ['团队', '组织', '人才', '岗位']
+}
+
+# 拆分检索 query 时追加的章节侧重词
+_SEARCH_FOCUS = {
+    'executive-summary': '执行摘要 价值主张 目标市场 商业模式',
+    'market-analysis': '市场规模 增长趋势 TAM SAM SOM 用户画像',
+    'competitive-landscape': '竞品 分析 竞争优势 市场份额',
+    'solution': '解决方案 功能 特性 技术架构',
+    'business-model': '商业模式 收入来源 定价 成本结构',
+    'financial-projection': '财务预测 收入 成本 盈亏平衡',
+    'marketing-strategy': '营销策略 渠道 品牌 获客成本',
+    'team-structure': '团队架构 人才 组织',
+    'risk-assessment': '风险评估 风险控制',
+    'project-summary': '立项背景 机会论证 用户场景 核心痛点',
+    'problem-insight': '产品定义 价值主张 用户画像 产品边界',
+    'product-solution': '产品方案 功能规格 MVP 交互流程 技术架构',
+    'implementation-path': '实施路线图 里程碑 资源计划 人力预算',
+    'budget-planning': '投入产出 ROI 成本估算 收益预测 成功指标',
+    'risk-control': '风险评估 决策建议 风险矩阵'
+}
+
+# 检索/迭代提供商使用的研究查询模板
+_RESEARCH_QUERIES = {
+    'market-analysis': """
+请对以下产品进行深度市场分析：
+
+{conversation}
+
+分析要点：
+1. 目标市场规模（TAM/SAM/SOM）和增长趋势
+2. 用户画像、需求痛点和行为特征
+3. 市场驱动因素和发展机会
+4. 行业标准和最佳实践
+
+请提供数据支持和可靠来源。
+""",
+    'competitive-landscape': """
+请分析以下产品的竞争格局：
+
+{conversation}
+
+分析要点：
+1. 主要竞品列表和核心特点
+2. 竞争优势对比矩阵
+3. 市场定位和差异化策略
+4. 竞争壁垒和护城河
+
+请提供具体的竞品数据和市场份额信息。
+""",
+    'financial-projection': """
+请对以下产品进行财务预测分析：
+
+{conversation}
+
+分析要点：
+1. 收入模型和定价策略
+2. 成本结构和盈亏平衡点
+3. 3-5年财务预测
+4. 行业财务基准和估值参考
+
+请提供行业数据和财务模型参考。
+""",
+    'business-model': """
+请设计以下产品的商业模式：
+
+{conversation}
+
+设计要点：
+1. 收入来源和盈利模式
+2. 成本结构和关键资源
+3. 客户关系和渠道策略
+4. 价值主张和合作伙伴
+
+请提供商业模式画布和案例参考。
+""",
+    'executive-summary': """
+请为以下产品撰写执行摘要：
+
+{conversation}
+
+摘要要点：
+1. 核心价值主张和解决的问题
+2. 目标市场和商业机会
+3. 竞争优势和差异化
+4. 财务预测和融资需求
+
+请提供简洁有力的总结。
+""",
+    'marketing-strategy': """
+请为以下产品制定营销策略：
+
+{conversation}
+
+策略要点：
+1. 目标客户和市场定位
+2. 营销渠道和推广策略
+3. 品牌建设和传播计划
+4. 预算分配和效果评估
+
+请提供营销案例和最佳实践。
+""",
+    'risk-assessment': """
+请对以下产品进行风险评估：
+
+{conversation}
+
+分析要点：
+1. 市场风险和应对策略
+2. 技术风险和解决方案
+3. 运营风险和预防措施
+4. 财务风险和控制手段
+
+请提供可执行的风险缓解措施和参考案例。
+""",
+    'project-summary': """
+请基于以下内容进行立项背景与机会论证：
+
+{conversation}
+
+分析要点：
+1. 目标用户与典型场景
+2. 核心痛点与证据
+3. 市场/业务机会窗口
+4. 现有方案缺口与不做代价
+""",
+    'problem-insight': """
+请基于以下内容定义产品与价值主张：
+
+{conversation}
+
+分析要点：
+1. 产品愿景陈述
+2. 目标用户画像
+3. 核心价值主张
+4. 产品边界与范围
+""",
+    'product-solution': """
+请基于以下内容输出产品方案与功能规格：
+
+{conversation}
+
+分析要点：
+1. 核心功能清单
+2. MVP范围界定
+3. 关键交互流程
+4. 技术架构概要
+""",
+    'implementation-path': """
+请基于以下内容制定实施路线图与资源计划：
+
+{conversation}
+
+分析要点：
+1. 关键里程碑与时间表
+2. 角色与人力需求
+3. 预算与资源计划
+4. 依赖项与风险触发条件
+""",
+    'budget-planning': """
+请基于以下内容进行投入产出与成功度量分析：
+
+{conversation}
+
+分析要点：
+1. 成本估算（人天/资金）
+2. 收益预测模型
+3. 关键成功指标
+4. ROI或盈亏平衡分析
+""",
+    'risk-control': """
+请基于以下内容输出风险评估与决策建议：
+
+{conversation}
+
+分析要点：
+1. 关键风险清单与分级
+2. 风险矩阵（概率/影响）
+3. 应对预案与触发信号
+4. 决策建议（立项/试点/延后）
+""",
+    'solution': """
+请设计以下产品的解决方案：
+
+{conversation}
+
+设计要点：
+1. 核心功能和技术架构
+2. 用户体验和交互设计
+3. 技术实现路径和难点
+4. 行业最佳实践参考
+
+请提供技术方案和案例参考。
+"""
+}
+
+
+# 单次生成的兜底提示词（prompts/.../chapters/<id>.md 不存在时使用）
+_FALLBACK_PROMPTS = {
+    'executive-summary': """
+基于以下产品创意，生成商业计划书的执行摘要：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 项目概述（2-3句话）
+2. 核心价值主张
+3. 目标市场和用户
+4. 商业模式简述
+5. 关键里程碑
+
+要求：简洁专业，突出亮点，字数控制在500字以内。
+""",
+    'market-analysis': """
+基于以下产品创意，进行深度市场分析：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 目标市场规模（TAM/SAM/SOM）和增长趋势
+2. 用户画像、需求痛点和行为特征
+3. 市场驱动因素和发展机会
+4. 行业标准和最佳实践
+
+要求：提供数据支持和可靠来源，进行多轮网络搜索验证。
+""",
+    'competitive-landscape': """
+分析以下产品的竞争格局：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 主要竞品列表和核心特点
+2. 竞争优势对比矩阵
+3. 市场定位和差异化策略
+4. 竞争壁垒和护城河
+
+要求：提供具体的竞品数据和市场份额信息。
+""",
+    'solution': """
+基于以下产品创意，详细描述解决方案：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 产品功能和特性
+2. 技术架构和实现方案
+3. 用户体验设计
+4. 创新点和差异化
+
+要求：技术可行，逻辑清晰。
+""",
+    'business-model': """
+基于以下产品创意，设计商业模式：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 收入模式和定价策略
+2. 成本结构分析
+3. 盈利能力预测
+4. 规模化路径
+
+要求：数据合理，逻辑严密。
+""",
+    'financial-projection': """
+基于以下产品创意，进行财务预测分析：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 收入模型和定价策略
+2. 成本结构和盈亏平衡点
+3. 3-5年财务预测
+4. 行业财务基准和估值参考
+
+要求：提供行业数据和财务模型参考。
+""",
+    'marketing-strategy': """
+基于以下产品创意，制定营销策略：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 目标客户定位
+2. 营销渠道和推广策略
+3. 品牌建设和传播
+4. 获客成本和转化率预估
+
+要求：策略可行，数据支持。
+""",
+    'team-structure': """
+基于以下产品创意，设计团队架构：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 核心团队成员和职责
+2. 组织架构设计
+3. 人才招聘计划
+4. 团队文化和价值观
+
+要求：结构合理，职责清晰。
+""",
+    'risk-assessment': """
+基于以下产品创意，进行风险分析：
+
+产品创意：
+{conversation}
+
+请提供：
+1. 市场风险和应对策略
+2. 技术风险和解决方案
+3. 运营风险和预防措施
+4. 财务风险和控制手段
+
+要求：全面客观，措施具体。
+"""
+}
+
+DEFAULT_RESEARCH_QUERY = "请基于以下内容生成{chapter_id}章节：\n{conversation}"
+
+DEFAULT_FALLBACK_PROMPT = """
+基于以下产品创意，生成{chapter_id}章节内容：
+
+产品创意：
+{conversation}
+
+请提供专业、详细的分析和建议。
+"""
+
+
+class Chapter(NamedTuple):
+    """单个章节的元数据（不可变）"""
+    id: str
+    doc_type: Optional[str]
+    keywords: Tuple[str, ...]
+    focus: str
+    query_template: CompiledTemplate
+    fallback_prompt: CompiledTemplate
+
+    @property
+    def prompt_path(self) -> str:
+        """相对 prompt 根目录的章节提示词路径"""
+        return f'chapters/{self.id}.md'
+
+    def render_query(self, conversation_text: str) -> str:
+        return self.query_template.render(conversation=conversation_text, chapter_id=self.id)
+
+
+def _build_chapter(chapter_id: str, doc_type: Optional[str]) -> Chapter:
+    return Chapter(
+        id=chapter_id,
+        doc_type=doc_type,
+        keywords=tuple(k.lower() for k in _RANKING_KEYWORDS.get(chapter_id, [chapter_id.replace('-', ' ')])),
+        focus=_SEARCH_FOCUS.get(chapter_id, chapter_id.replace('-', ' ')),
+        query_template=compile_template(_RESEARCH_QUERIES.get(chapter_id, DEFAULT_RESEARCH_QUERY)),
+        fallback_prompt=compile_template(_FALLBACK_PROMPTS.get(chapter_id, DEFAULT_FALLBACK_PROMPT))
+    )
+
+
+CHAPTERS: Mapping[str, Chapter] = MappingProxyType({
+    chapter_id: _build_chapter(chapter_id, doc_type)
+    for doc_type, chapter_ids in _DOCUMENT_ORDER.items()
+    for chapter_id in chapter_ids
+})
+
+DOCUMENT_CHAPTERS: Mapping[str, Tuple[str, ...]] = MappingProxyType(dict(_DOCUMENT_ORDER))
+
+
+@lru_cache(maxsize=64)
+def _unregistered_chapter(chapter_id: str) -> Chapter:
+    return _build_chapter(chapter_id, None)
+
+
+def get_chapter(chapter_id: str) -> Chapter:
+    """返回章节元数据；未注册的章节使用通用模板与按 id 推导的关键词"""
+    chapter = CHAPTERS.get(chapter_id)
+    return chapter if chapter is not None else _unregistered_chapter(chapter_id)
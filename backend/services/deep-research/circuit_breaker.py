@@ -0,0 +1,303 @@
+"""
+熔断器与提供商故障转移链
+
+每个上游（检索提供商、OpenRouter）一个熔断器，按滚动时间窗口统计失败率与慢调用率：
+- closed：正常放行；窗口内调用数达到下限且（失败 + 慢调用）占比超过阈值时打开；
+- open：直接拒绝，open_seconds 后进入 half_open；
+- half_open：只放行少量探测请求，成功则关闭并清空窗口，失败则重新打开。
+
+FailoverChain 按顺序尝试各提供商，跳过熔断中的提供商，全部不可用时抛出 ProvidersUnavailable，
+由调用方回退到 OpenRouter 单次生成。
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+STATE_CLOSED = 'closed'
+STATE_OPEN = 'open'
+STATE_HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开，调用被直接拒绝"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f'{name} 熔断中，约 {retry_in:.0f}s 后探测恢复')
+        self.name = name
+        self.retry_in = retry_in
+
+
+class ProvidersUnavailable(Exception):
+    """故障转移链上的提供商全部失败或熔断"""
+
+    def __init__(self, errors: List[str]):
+        super().__init__('检索提供商均不可用: ' + '; '.join(errors) if errors else '未配置检索提供商')
+        self.errors = errors
+
+
+class CircuitBreaker:
+    """基于滚动窗口的熔断器（线程安全）"""
+
+    def __init__(
+        self,
+        name: str,
+        window_seconds: float = 60.0,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_seconds: float = 120.0,
+        open_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            window_seconds: 滚动统计窗口（秒）
+            min_calls: 窗口内调用数低于该值时不打开
+            failure_rate: （失败 + 慢调用）占比阈值
+            slow_call_seconds: 超过该耗时的成功调用计为慢调用，<=0 表示不统计
+            open_seconds: 打开后多久进入半开探测
+            half_open_max_calls: 半开状态下同时放行的探测请求数
+        """
+        self.name = name
+        self.window_seconds = float(window_seconds)
+        self.min_calls = max(1, int(min_calls))
+        self.failure_rate = float(failure_rate)
+        self.slow_call_seconds = float(slow_call_seconds)
+        self.open_seconds = float(open_seconds)
+        self.half_open_max_calls = max(1, int(half_open_max_calls))
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._calls = deque()  # (时间, 是否失败, 是否慢调用)
+        self._state = STATE_CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == STATE_OPEN and self._clock() - self._opened_at >= self.open_seconds:
+            self._state = STATE_HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def _trim(self, now: float) -> None:
+        while self._calls and now - self._calls[0][0] > self.window_seconds:
+            self._calls.popleft()
+
+    def _open(self, now: float) -> None:
+        self._state = STATE_OPEN
+        self._opened_at = now
+        self._probes = 0
+        self.opened += 1
+        logger.warning(f'熔断器打开: {self.name}')
+
+    def allow(self) -> bool:
+        """是否放行本次调用；放行后必须调用 record_success / record_failure / release 之一"""
+        with self._lock:
+            state = self._current_state()
+            if state == STATE_CLOSED:
+                return True
+            if state == STATE_HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(0.0, self.open_seconds - (self._clock() - self._opened_at))
+
+    def record_success(self, elapsed: float, slow_call_seconds: float = None) -> None:
+        """slow_call_seconds 覆盖本次调用的慢调用阈值（如长文本生成），None 时使用熔断器默认值"""
+        threshold = self.slow_call_seconds if slow_call_seconds is None else float(slow_call_seconds)
+        slow = threshold > 0 and elapsed >= threshold
+        with self._lock:
+            now = self._clock()
+            if self._state == STATE_HALF_OPEN:
+                if slow:
+                    self._open(now)
+                    return
+                self._state = STATE_CLOSED
+                self._calls.clear()
+                logger.info(f'熔断器恢复: {self.name}')
+                return
+            self._record(now, False, slow)
+
+    def record_failure(self, elapsed: float = 0.0) -> None:
+        with self._lock:
+            now = self._clock()
+            if self._state == STATE_HALF_OPEN:
+                self._open(now)
+                return
+            self._record(now, True, False)
+
+    def release(self) -> None:
+        """调用未产生有效结果（如任务被取消）：只归还半开探测名额，不计入统计"""
+        with self._lock:
+            if self._state == STATE_HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def _record(self, now: float, failed: bool, slow: bool) -> None:
+        self._calls.append((now, failed, slow))
+        self._trim(now)
+        if self._state != STATE_CLOSED or len(self._calls) < self.min_calls:
+            return
+        bad = sum(1 for _, f, s in self._calls if f or s)
+        if bad / len(self._calls) >= self.failure_rate:
+            self._open(now)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            state = self._current_state()
+            self._trim(self._clock())
+            calls = len(self._calls)
+            return {
+                'state': state,
+                'calls': calls,
+                'failures': sum(1 for _, f, _ in self._calls if f),
+                'slowCalls': sum(1 for _, _, s in self._calls if s),
+                'opened': self.opened,
+                'rejected': self.rejected
+            }
+
+    def call(
+        self,
+        fn: Callable[[], Any],
+        is_abort: Callable[[BaseException], bool] = None,
+        slow_call_seconds: float = None
+    ) -> Any:
+        """在熔断器保护下执行 fn；打开时抛出 CircuitOpenError"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        started = time.monotonic()
+        try:
+            result = fn()
+        except BaseException as error:
+            # 取消/中断（含 asyncio.CancelledError）不计入失败
+            if not isinstance(error, Exception) or (is_abort and is_abort(error)):
+                self.release()
+            else:
+                self.record_failure(time.monotonic() - started)
+            raise
+        self.record_success(time.monotonic() - started, slow_call_seconds)
+        return result
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        is_abort: Callable[[BaseException], bool] = None,
+        slow_call_seconds: float = None
+    ) -> Any:
+        """call 的异步版本"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_in())
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except BaseException as error:
+            # 取消/中断（含 asyncio.CancelledError）不计入失败
+            if not isinstance(error, Exception) or (is_abort and is_abort(error)):
+                self.release()
+            else:
+                self.record_failure(time.monotonic() - started)
+            raise
+        self.record_success(time.monotonic() - started, slow_call_seconds)
+        return result
+
+
+class BreakerRegistry:
+    """按上游名称共享熔断器"""
+
+    def __init__(self, **defaults):
+        self.defaults = defaults
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    @classmethod
+    def from_env(cls) -> 'BreakerRegistry':
+        return cls(
+            window_seconds=float(os.getenv('DEEPRESEARCH_BREAKER_WINDOW', 60)),
+            min_calls=int(os.getenv('DEEPRESEARCH_BREAKER_MIN_CALLS', 5)),
+            failure_rate=float(os.getenv('DEEPRESEARCH_BREAKER_FAILURE_RATE', 0.5)),
+            slow_call_seconds=float(os.getenv('DEEPRESEARCH_BREAKER_SLOW_CALL', 120)),
+            open_seconds=float(os.getenv('DEEPRESEARCH_BREAKER_OPEN_SECONDS', 30))
+        )
+
+    def get(self, name: str) -> CircuitBreaker:
+        breaker = self._breakers.get(name)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(name)
+                if breaker is None:
+                    breaker = self._breakers[name] = CircuitBreaker(name, **self.defaults)
+        return breaker
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: breaker.stats() for name, breaker in list(self._breakers.items())}
+
+
+class FailoverChain:
+    """按顺序尝试各提供商，跳过熔断中的提供商"""
+
+    def __init__(
+        self,
+        breakers: BreakerRegistry,
+        is_abort: Optional[Callable[[BaseException], bool]] = None
+    ):
+        """
+        Args:
+            is_abort: 判断异常是否为主动中断（如任务取消），中断时直接抛出，不尝试后续提供商
+        """
+        self.breakers = breakers
+        self.is_abort = is_abort or (lambda error: False)
+
+    def run(self, members: Sequence[Tuple[str, Any]], call: Callable[[Any], Any]) -> Tuple[str, Any]:
+        """
+        Args:
+            members: [(提供商名称, 客户端)]，按优先级排列
+            call: 客户端 -> 结果
+
+        Returns:
+            (实际使用的提供商, 结果)
+        """
+        errors = []
+        for name, target in members:
+            try:
+                return name, self.breakers.get(name).call(lambda: call(target), self.is_abort)
+            except CircuitOpenError as open_error:
+                errors.append(str(open_error))
+            except Exception as error:
+                if self.is_abort(error):
+                    raise
+                errors.append(f'{name}: {error}')
+                logger.warning(f'检索提供商失败，尝试下一个: {name}, {error}')
+        raise ProvidersUnavailable(errors)
+
+    async def arun(
+        self,
+        members: Sequence[Tuple[str, Any]],
+        call: Callable[[Any], Awaitable[Any]]
+    ) -> Tuple[str, Any]:
+        """run 的异步版本"""
+        errors = []
+        for name, target in members:
+            try:
+                return name, await self.breakers.get(name).acall(lambda: call(target), self.is_abort)
+            except CircuitOpenError as open_error:
+                errors.append(str(open_error))
+            except Exception as error:
+                if self.is_abort(error):
+                    raise
+                errors.append(f'{name}: {error}')
+                logger.warning(f'检索提供商失败，尝试下一个: {name}, {error}')
+        raise ProvidersUnavailable(errors)
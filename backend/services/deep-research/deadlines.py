@@ -0,0 +1,184 @@
+"""
+请求级截止时间与取消
+
+每个请求携带一个 Deadline（请求头 X-DeepResearch-Timeout 或查询参数 timeout，单位秒，
+默认 DEEPRESEARCH_REQUEST_DEADLINE），在请求上下文（及复制了上下文的检索线程/协程）中传递：
+- 各阶段的上游超时取「阶段自身上限」与「剩余时间」中的较小值；
+- 检索阶段为合成预留时间（reserve），超出检索预算时检索被截断并回退到单次生成；
+- 剩余时间耗尽时后续阶段不再执行，抛出 DeadlineExceeded（504）；
+- 客户端断开时 cancel()，正在等待的检索与后续阶段以 RequestCancelled 中断；
+- 检索批次使用 detach() 派生的子截止时间，批次被放弃时单独取消，后台仍在执行的检索随之停止重试。
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Mapping, Optional
+
+DEADLINE_HEADER = 'X-DeepResearch-Timeout'
+DEADLINE_PARAM = 'timeout'
+
+
+class DeadlineExceeded(Exception):
+    """请求剩余时间已耗尽"""
+
+    def __init__(self, stage: str, budget: float):
+        super().__init__(f'请求截止时间已到（{budget:.0f}s），{stage} 阶段未执行完')
+        self.stage = stage
+        self.budget = budget
+
+
+class RequestCancelled(Exception):
+    """客户端已断开，请求被取消"""
+
+
+class Deadline:
+    """请求截止时间（单调时钟），子截止时间共享取消状态"""
+
+    def __init__(self, seconds: float, cancel_event: Optional[threading.Event] = None, clock=time.monotonic):
+        self.budget = max(0.0, float(seconds))
+        self._clock = clock
+        self.expires_at = clock() + self.budget
+        self.cancel_event = cancel_event or threading.Event()
+        self.parent: Optional['Deadline'] = None
+
+    @classmethod
+    def from_request(
+        cls,
+        headers: Mapping[str, str],
+        args: Mapping[str, str],
+        default: float,
+        maximum: Optional[float] = None
+    ) -> 'Deadline':
+        """按请求头/查询参数创建，非法值使用 default，并不超过 maximum"""
+        value = headers.get(DEADLINE_HEADER.lower()) or args.get(DEADLINE_PARAM)
+        try:
+            seconds = float(value) if value not in (None, '') else float(default)
+        except (TypeError, ValueError):
+            seconds = float(default)
+        if seconds <= 0:
+            seconds = float(default)
+        if maximum is not None:
+            seconds = min(seconds, float(maximum))
+        return cls(seconds)
+
+    @classmethod
+    def unbounded(cls, cancel_event: threading.Event) -> 'Deadline':
+        """没有时间上限、只能被取消的截止时间（异步任务使用任务自身的取消事件）"""
+        return cls(math.inf, cancel_event=cancel_event)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - self._clock())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set() or (self.parent is not None and self.parent.cancelled)
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    def check(self, stage: str) -> None:
+        """阶段开始前检查：已取消抛出 RequestCancelled，已超时抛出 DeadlineExceeded"""
+        if self.cancelled:
+            raise RequestCancelled(f'客户端已断开，{stage} 阶段不再执行')
+        if self.expired():
+            raise DeadlineExceeded(stage, self.budget)
+
+    def timeout(self, cap: Optional[float] = None) -> float:
+        """本次上游调用的超时：cap 与剩余时间的较小值"""
+        remaining = self.remaining()
+        return remaining if cap is None else min(float(cap), remaining)
+
+    def sleep(self, seconds: float) -> None:
+        """等待 seconds，本截止时间被取消时提前返回"""
+        self.cancel_event.wait(max(0.0, seconds))
+
+    def detach(self, seconds: float) -> 'Deadline':
+        """
+        最多 seconds 的子截止时间，拥有独立的取消事件
+
+        子截止时间 cancel() 不影响父截止时间；父截止时间取消时子截止时间也视为已取消。
+        """
+        child = Deadline(0, clock=self._clock)
+        child.budget = self.budget
+        child.expires_at = min(self.expires_at, self._clock() + max(0.0, float(seconds)))
+        child.parent = self
+        return child
+
+    def reserve(self, seconds: float) -> 'Deadline':
+        """提前 seconds 到期的子截止时间（为后续阶段预留时间）"""
+        child = Deadline(0, cancel_event=self.cancel_event, clock=self._clock)
+        child.budget = self.budget
+        child.expires_at = self.expires_at - max(0.0, float(seconds))
+        child.parent = self.parent
+        return child
+
+
+_CURRENT_DEADLINE: ContextVar[Optional[Deadline]] = ContextVar('deepresearch_deadline', default=None)
+
+
+@contextmanager
+def scope(deadline: Optional[Deadline]):
+    """在当前上下文（及其派生的线程/协程上下文）内生效的截止时间"""
+    token = _CURRENT_DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _CURRENT_DEADLINE.reset(token)
+
+
+@contextmanager
+def stage(reserve: float = 0.0, min_share: float = 0.0, max_share: float = 1.0):
+    """
+    为当前阶段设置子截止时间
+
+    阶段可用时间为「剩余时间 - reserve」，并限制在剩余时间的 [min_share, max_share] 比例内；
+    未设置截止时间时不做任何事。
+    """
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is None:
+        yield None
+        return
+    remaining = deadline.remaining()
+    if math.isinf(remaining):
+        yield deadline
+        return
+    allowed = min(max(remaining - reserve, remaining * min_share), remaining * max_share)
+    with scope(deadline.reserve(remaining - allowed)) as child:
+        yield child
+
+
+def current() -> Optional[Deadline]:
+    return _CURRENT_DEADLINE.get()
+
+
+def detach(seconds: float) -> Deadline:
+    """当前截止时间的独立可取消子截止时间；未设置截止时间时为 seconds 后到期的新截止时间"""
+    deadline = _CURRENT_DEADLINE.get()
+    return Deadline(seconds) if deadline is None else deadline.detach(seconds)
+
+
+def sleep(seconds: float) -> None:
+    """可被当前请求取消打断的等待；未设置截止时间时等同 time.sleep"""
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is None:
+        time.sleep(seconds)
+    else:
+        deadline.sleep(seconds)
+
+
+def check(stage: str) -> None:
+    """当前请求未设置截止时间时不做任何事"""
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is not None:
+        deadline.check(stage)
+
+
+def timeout(cap: Optional[float]) -> Optional[float]:
+    """cap 与当前请求剩余时间的较小值；未设置截止时间时返回 cap"""
+    deadline = _CURRENT_DEADLINE.get()
+    return cap if deadline is None else deadline.timeout(cap)
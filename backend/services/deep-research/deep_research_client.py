@@ -4,26 +4,71 @@ DeepResearch客户端 - 通用实现
 由于Alibaba-NLP/DeepResearch仓库当前为空，本实现提供了一个通用的深度研究框架，
 可以轻松集成多种研究API（Perplexity、Tavily、GPT-Researcher等）
 """
+import asyncio
+import contextvars
+import threading
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import List, Dict, Any, Optional
 import os
 
+from keyword_matcher import compile_keywords
+from domain_reputation import get_domain_reputation
+from source_dedup import canonicalize_url
+from request_context import RequestContext
+from chapters import get_chapter
+from http_transport import get_default_transport
+from retry_policy import RetryPolicy, UpstreamError
+from metrics import stage_timer
+import deadlines
+from mock_provider import MockSearchBackend
+
 
 class DeepResearchClient:
     """通用深度研究客户端"""
 
-    def __init__(self, api_key: str = None, api_url: str = None, provider: str = 'perplexity'):
+    # 并发检索时检查请求是否已取消的间隔（秒）
+    CANCEL_POLL_INTERVAL = 0.2
+
+    def __init__(
+        self,
+        api_key: str = None,
+        api_url: str = None,
+        provider: str = 'perplexity',
+        search_concurrency: int = None,
+        search_timeout: float = None,
+        search_cache=None,
+        transport=None,
+        retry_policy=None,
+        mock_backend=None
+    ):
         """
         初始化客户端
 
         Args:
             api_key: API密钥
             api_url: API基础URL
-            provider: 研究服务提供商 (perplexity/tavily/openai)
+            provider: 研究服务提供商 (perplexity/tavily/openai/mock)
+            search_concurrency: 单次请求内并发检索的最大query数
+            search_timeout: 单条检索query的超时时间（秒）
+            search_cache: 检索结果缓存（SearchResultCache），为空时不缓存
+            transport: 共享 HTTP 连接池（PooledTransport），为空时使用进程内默认实例
+            retry_policy: 提供商调用的重试/对冲策略（RetryPolicy），为空时不重试
+            mock_backend: mock 提供商使用的模拟检索后端（MockSearchBackend），为空时按环境变量创建
         """
         self.api_key = api_key or os.getenv('DEEPRESEARCH_API_KEY')
         self.provider = provider
+        self.search_concurrency = max(1, int(
+            search_concurrency or os.getenv('DEEPRESEARCH_SEARCH_CONCURRENCY', 3)
+        ))
+        self.search_timeout = float(
+            search_timeout or os.getenv('DEEPRESEARCH_SEARCH_TIMEOUT', 60)
+        )
+        self.search_cache = search_cache
+        self.retry_policy = retry_policy or RetryPolicy(max_retries=0)
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+        self.mock_backend = mock_backend
 
         # 根据提供商设置API URL
         if api_url:
@@ -35,14 +80,17 @@ class DeepResearchClient:
         elif provider == 'openai':
             self.api_url = 'https://api.openai.com/v1'
         else:
-            self.api_url = api_url or 'http://localhost:8080'
+            self.api_url = 'mock://local'
 
-        self.session = requests.Session()
+        # 连接池在进程内共享，鉴权头只绑定到本提供商的请求上
+        self.transport = transport or get_default_transport()
+        headers = {}
         if self.api_key:
-            self.session.headers.update({
+            headers = {
                 'Authorization': f'Bearer {self.api_key}',
                 'Content-Type': 'application/json'
-            })
+            }
+        self.session = self.transport.session(headers)
 
     def generate_chapter(
         self,
@@ -63,7 +111,8 @@ class DeepResearchClient:
             doc_type: 文档类型
             depth: 研究深度
             iterations: 迭代次数
-            progress_callback: 进度回调
+            progress_callback: 进度回调 (已完成数, 总数, 说明)，每条检索 query 完成时调用；
+                抛出的异常（如任务取消）中断检索
 
         Returns:
             生成结果字典
@@ -93,8 +142,67 @@ class DeepResearchClient:
             elif self.provider == 'openai':
                 return self._generate_with_openai(query, depth, iterations, progress_callback)
             else:
-                # 默认使用模拟实现
-                return self._generate_mock(chapter_id, query, depth, iterations, progress_callback)
+                # 默认使用模拟检索（不访问外部 API），后续处理与 Tavily 相同
+                return self._generate_with_mock(
+                    self._build_search_queries(
+                        chapter_id,
+                        conversation_history,
+                        doc_type,
+                        query,
+                        summary_text=summary_text
+                    ),
+                    depth,
+                    progress_callback
+                )
+
+        except Exception as e:
+            print(f'[DeepResearch] 生成失败: {str(e)}')
+            raise Exception(f'DeepResearch生成失败: {str(e)}')
+
+    async def agenerate_chapter(
+        self,
+        chapter_id: str,
+        conversation_history: List[Dict[str, str]],
+        doc_type: str = 'business',
+        depth: str = 'medium',
+        iterations: int = 3,
+        summary_text: Optional[str] = None,
+        progress_callback: Optional[callable] = None
+    ) -> Dict[str, Any]:
+        """generate_chapter 的异步版本，供 asyncio 服务模式使用"""
+        query = self._build_research_query(chapter_id, conversation_history, doc_type)
+
+        print(f'[DeepResearch] 开始异步生成章节: {chapter_id}, 提供商: {self.provider}, 深度: {depth}')
+
+        try:
+            if self.provider == 'perplexity':
+                return await self._agenerate_with_perplexity(query, depth, iterations, progress_callback)
+            elif self.provider == 'tavily':
+                return await self._agenerate_with_tavily(
+                    self._build_search_queries(
+                        chapter_id,
+                        conversation_history,
+                        doc_type,
+                        query,
+                        summary_text=summary_text
+                    ),
+                    depth,
+                    iterations,
+                    progress_callback
+                )
+            elif self.provider == 'openai':
+                return await self._agenerate_with_openai(query, depth, iterations, progress_callback)
+            else:
+                return await self._agenerate_with_mock(
+                    self._build_search_queries(
+                        chapter_id,
+                        conversation_history,
+                        doc_type,
+                        query,
+                        summary_text=summary_text
+                    ),
+                    depth
+                )
 
         except Exception as e:
             print(f'[DeepResearch] 生成失败: {str(e)}')
@@ -110,34 +218,66 @@ class DeepResearchClient:
         """使用Perplexity API生成"""
         print('[DeepResearch] 使用Perplexity API')
 
-        # Perplexity API调用
-        response = self.session.post(
-            f'{self.api_url}/chat/completions',
-            json={
-                'model': 'sonar-pro',  # 或 'sonar-reasoning'
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': '你是一个专业的商业分析师，擅长进行深度市场研究和商业分析。请基于最新的数据和信息提供专业的分析报告。'
-                    },
-                    {
-                        'role': 'user',
-                        'content': query
-                    }
-                ],
-                'temperature': 0.7,
-                'max_tokens': 4000,
-                'search_domain_filter': ['news', 'academic'],  # 搜索过滤
-                'return_citations': True,  # 返回引用
-                'return_images': False
-            },
-            timeout=300
-        )
+        # Perplexity API调用（单次研究请求，开始与完成时各报告一次进度）
+        self._report(progress_callback, 0, 1, 'Perplexity 研究中')
+
+        def fetch():
+            response = self.session.post(
+                f'{self.api_url}/chat/completions',
+                json=self._perplexity_payload(query),
+                timeout=deadlines.timeout(300)
+            )
+
+            response.raise_for_status()
+            return response.json()
+
+        # Perplexity 为整段 LLM 研究生成，成本高，不发对冲请求
+        result = self._cached_search('perplexity', query, 'sonar-pro', 10, fetch, hedge=False)
+        self._report(progress_callback, 1, 1, 'Perplexity 研究完成')
+        return self._parse_perplexity(result, query)
+
+    async def _agenerate_with_perplexity(
+        self,
+        query: str,
+        depth: str,
+        iterations: int,
+        progress_callback: Optional[callable]
+    ) -> Dict[str, Any]:
+        """使用Perplexity API生成（异步）"""
+        async def fetch():
+            response = await self.session.apost(
+                f'{self.api_url}/chat/completions',
+                json=self._perplexity_payload(query),
+                timeout=deadlines.timeout(300)
+            )
+            response.raise_for_status()
+            return response.json()
+
+        result = await self._acached_search('perplexity', query, 'sonar-pro', 10, fetch, hedge=False)
+        return self._parse_perplexity(result, query)
 
-        response.raise_for_status()
-        result = response.json()
+    def _perplexity_payload(self, query: str) -> Dict[str, Any]:
+        return {
+            'model': 'sonar-pro',  # 或 'sonar-reasoning'
+            'messages': [
+                {
+                    'role': 'system',
+                    'content': '你是一个专业的商业分析师，擅长进行深度市场研究和商业分析。请基于最新的数据和信息提供专业的分析报告。'
+                },
+                {
+                    'role': 'user',
+                    'content': query
+                }
+            ],
+            'temperature': 0.7,
+            'max_tokens': 4000,
+            'search_domain_filter': ['news', 'academic'],  # 搜索过滤
+            'return_citations': True,  # 返回引用
+            'return_images': False
+        }
 
-        # 解析响应
+    def _parse_perplexity(self, result: Dict[str, Any], query: str) -> Dict[str, Any]:
+        """解析 Perplexity 响应"""
         content = result['choices'][0]['message']['content']
         citations = result.get('citations', [])
 
@@ -181,43 +321,56 @@ class DeepResearchClient:
         print('[DeepResearch] 使用Tavily API')
 
         queries = query if isinstance(query, list) else [query]
+        return self._build_tavily_result(
+            queries, self._run_search_queries(queries, depth, progress_callback=progress_callback)
+        )
+
+    async def _agenerate_with_tavily(
+        self,
+        query: str,
+        depth: str,
+        iterations: int,
+        progress_callback: Optional[callable]
+    ) -> Dict[str, Any]:
+        """使用Tavily API生成（异步）"""
+        queries = query if isinstance(query, list) else [query]
+        return self._build_tavily_result(queries, await self._arun_search_queries(queries, depth))
+
+    def _generate_with_mock(
+        self,
+        queries: List[str],
+        depth: str,
+        progress_callback: Optional[callable] = None
+    ) -> Dict[str, Any]:
+        """使用模拟检索生成（结果为 Tavily 格式，去重/过滤/重排走真实路径）"""
+        print('[DeepResearch] 使用模拟检索')
+        return self._build_tavily_result(queries, self._run_search_queries(
+            queries, depth, search=self._search_mock, progress_callback=progress_callback
+        ))
+
+    async def _agenerate_with_mock(self, queries: List[str], depth: str) -> Dict[str, Any]:
+        """使用模拟检索生成（异步）"""
+        return self._build_tavily_result(
+            queries, await self._arun_search_queries(queries, depth, search=self._asearch_mock)
+        )
+
+    def _build_tavily_result(self, queries: List[str], search_results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """合并多条 query 的检索结果：去重、关键词过滤并组装来源"""
         answers = []
         results = []
         keyword_seed = ' '.join([q for q in queries if q])
         keywords = self._extract_keywords(keyword_seed)
 
-        for q in queries:
-            normalized_query = self._truncate_query(q, 400)
-            payload = {
-                'query': normalized_query,
-                'search_depth': 'advanced' if depth == 'deep' else 'basic',
-                'include_answer': True,
-                'max_results': 10
-            }
-            # Tavily 需要 api_key 字段，不接受 Bearer 头作为唯一认证
-            if self.api_key:
-                payload['api_key'] = self.api_key
-
-            search_response = self.session.post(
-                f'{self.api_url}/search',
-                json=payload,
-                timeout=60
-            )
-
-            if not search_response.ok:
-                raise Exception(
-                    f"Tavily请求失败: {search_response.status_code} {search_response.text[:500]}"
-                )
-
-            search_result = search_response.json()
+        for search_result in search_results:
             answers.append(search_result.get('answer', ''))
             results.extend(search_result.get('results', []))
 
-        # 去重结果（按URL）
+        # 去重结果（按规范化URL，保留检索得分更高者）
+        results = sorted(results, key=lambda r: r.get('score') or 0, reverse=True)
         deduped = []
         seen = set()
         for r in results:
-            url = r.get('url')
+            url = canonicalize_url(r.get('url'))
             if url and url in seen:
                 continue
             if url:
@@ -260,6 +413,301 @@ class DeepResearchClient:
             'tokens': len(final_content.split())
         }
 
+    def _tavily_payload(self, query: str, depth: str) -> Dict[str, Any]:
+        payload = {
+            'query': self._truncate_query(query, 400),
+            'search_depth': 'advanced' if depth == 'deep' else 'basic',
+            'include_answer': True,
+            'max_results': 10
+        }
+        # Tavily 需要 api_key 字段，不接受 Bearer 头作为唯一认证
+        if self.api_key:
+            payload['api_key'] = self.api_key
+        return payload
+
+    def _search_tavily(self, query: str, depth: str) -> Dict[str, Any]:
+        """执行单条 Tavily 检索"""
+        payload = self._tavily_payload(query, depth)
+
+        def fetch():
+            search_response = self.session.post(
+                f'{self.api_url}/search',
+                json=payload,
+                timeout=deadlines.timeout(self.search_timeout)
+            )
+
+            if not search_response.is_success:
+                raise UpstreamError(
+                    f"Tavily请求失败: {search_response.status_code} {search_response.text[:500]}",
+                    search_response.status_code
+                )
+
+            return search_response.json()
+
+        return self._cached_search(
+            'tavily', payload['query'], payload['search_depth'], payload['max_results'], fetch
+        )
+
+    async def _asearch_tavily(self, query: str, depth: str) -> Dict[str, Any]:
+        """执行单条 Tavily 检索（异步）"""
+        payload = self._tavily_payload(query, depth)
+
+        async def fetch():
+            search_response = await self.session.apost(
+                f'{self.api_url}/search',
+                json=payload,
+                timeout=deadlines.timeout(self.search_timeout)
+            )
+
+            if not search_response.is_success:
+                raise UpstreamError(
+                    f"Tavily请求失败: {search_response.status_code} {search_response.text[:500]}",
+                    search_response.status_code
+                )
+
+            return search_response.json()
+
+        return await self._acached_search(
+            'tavily', payload['query'], payload['search_depth'], payload['max_results'], fetch
+        )
+
+    def _mock(self) -> MockSearchBackend:
+        if self.mock_backend is None:
+            self.mock_backend = MockSearchBackend.from_env()
+        return self.mock_backend
+
+    def _search_mock(self, query: str, depth: str) -> Dict[str, Any]:
+        """执行单条模拟检索（与 Tavily 一样经过重试策略、检索缓存与指标）"""
+        payload = self._tavily_payload(query, depth)
+        return self._cached_search(
+            'mock', payload['query'], payload['search_depth'], payload['max_results'],
+            lambda: self._mock().search(payload['query'])
+        )
+
+    async def _asearch_mock(self, query: str, depth: str) -> Dict[str, Any]:
+        """执行单条模拟检索（异步）"""
+        payload = self._tavily_payload(query, depth)
+        return await self._acached_search(
+            'mock', payload['query'], payload['search_depth'], payload['max_results'],
+            lambda: self._mock().asearch(payload['query'])
+        )
+
+    async def _arun_search_queries(self, queries: List[str], depth: str, search=None) -> List[Dict[str, Any]]:
+        """_run_search_queries 的异步版本：信号量限制并发，单条 query 超时或失败时跳过"""
+        search = search or self._asearch_tavily
+        queries = [q for q in queries if q]
+        if not queries:
+            return []
+        semaphore = asyncio.Semaphore(self.search_concurrency)
+
+        async def run(q):
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(search(q, depth), timeout=deadlines.timeout(self.search_timeout))
+                except asyncio.TimeoutError:
+                    raise Exception(f'检索超时: {q[:50]}')
+
+        outcomes = await asyncio.gather(*(run(q) for q in queries), return_exceptions=True)
+        results = [item for item in outcomes if not isinstance(item, BaseException)]
+        errors = [str(item) for item in outcomes if isinstance(item, BaseException)]
+        for error in errors:
+            print(f'[DeepResearch] 检索query失败，已跳过: {error}')
+        if not results:
+            # 因请求截止时间或取消而全部未完成时，抛出对应异常而不是普通检索失败
+            deadlines.check('search')
+            raise Exception(errors[0] if errors else 'Tavily检索全部失败')
+        return results
+
+    def _cached_search(
+        self,
+        provider: str,
+        query: str,
+        search_depth: str,
+        max_results: int,
+        fetch,
+        hedge: bool = True
+    ):
+        """
+        通过检索结果缓存执行 fetch（按重试策略调用上游）
+
+        命中新鲜缓存直接返回；命中宽限期内的旧值时先返回旧值，并在后台刷新。
+        每条 query 的耗时（含缓存命中）计入 search 阶段指标。
+        hedge=False 用于成本高的上游调用（如 Perplexity 研究生成），慢时不再发第二份请求。
+        """
+        upstream = fetch
+
+        def fetch():
+            return self.retry_policy.call(upstream, name=f'{provider}.search', hedge=hedge)
+
+        with stage_timer('search'):
+            if not self.search_cache:
+                return fetch()
+
+            key = self.search_cache.make_key(provider, query, search_depth, max_results)
+            cached = self.search_cache.get(key)
+            if cached is not None:
+                value, stale = cached
+                if stale:
+                    self._refresh_in_background(key, fetch)
+                return value
+
+            value = fetch()
+            self.search_cache.set(key, value)
+            return value
+
+    def _refresh_in_background(self, key: str, fetch) -> None:
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def refresh():
+            try:
+                self.search_cache.set(key, fetch())
+            except Exception as e:
+                print(f'[DeepResearch] 检索缓存后台刷新失败: {str(e)}')
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=refresh, name='search-cache-refresh', daemon=True).start()
+
+    def _run_search_queries(
+        self,
+        queries: List[str],
+        depth: str,
+        search=None,
+        progress_callback: Optional[callable] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        并发执行多条检索 query，容忍部分失败
+
+        结果按 query 原始顺序返回；仅当全部 query 失败时抛出异常。
+        search 为单条检索函数 (query, depth)，默认 Tavily。
+        progress_callback 在调用线程中按已完成的 query 数调用，其异常（任务取消）中断等待。
+        """
+        search = search or self._search_tavily
+        queries = [q for q in queries if q]
+        if not queries:
+            return []
+        self._report(progress_callback, 0, len(queries), f'检索 {len(queries)} 条 query')
+        if len(queries) == 1:
+            result = search(queries[0], depth)
+            self._report(progress_callback, 1, 1, '检索完成 1/1')
+            return [result]
+
+        workers = min(self.search_concurrency, len(queries))
+        # 排队的 query 需要等待前序批次，整体等待上限按批次数放大，且不超过请求剩余时间
+        rounds = -(-len(queries) // workers)
+        limit = deadlines.timeout(self.search_timeout * rounds + 5)
+        # 本批检索共享一个可单独取消的子截止时间：停止等待后取消，仍在执行的检索不再重试
+        batch = deadlines.detach(limit)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='tavily-search')
+        try:
+            # 每条 query 在请求上下文的副本中执行，阶段耗时计入当前请求
+            with deadlines.scope(batch):
+                futures = [
+                    executor.submit(contextvars.copy_context().run, search, q, depth) for q in queries
+                ]
+            self._wait_searches(futures, limit, progress_callback)
+        finally:
+            batch.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        deadline = deadlines.current()
+        if deadline is not None and deadline.cancelled:
+            # 已取消的请求不再使用部分结果
+            deadline.check('search')
+
+        results = []
+        errors = []
+        for q, future in zip(queries, futures):
+            if not future.done():
+                errors.append(f'检索超时: {q[:50]}')
+                continue
+            error = future.exception()
+            if error:
+                errors.append(str(error))
+                continue
+            results.append(future.result())
+
+        for error in errors:
+            print(f'[DeepResearch] 检索query失败，已跳过: {error}')
+        if not results:
+            # 因请求截止时间或取消而全部未完成时，抛出对应异常而不是普通检索失败
+            deadlines.check('search')
+            raise Exception(errors[0] if errors else 'Tavily检索全部失败')
+        return results
+
+    def _wait_searches(self, futures, limit: float, progress_callback: Optional[callable] = None) -> None:
+        """分片等待检索完成并报告进度，请求被取消（客户端断开、任务取消）时立即停止等待"""
+        deadline = deadlines.current()
+        until = time.monotonic() + limit
+        pending = futures
+        reported = 0
+        while pending:
+            remaining = until - time.monotonic()
+            if remaining <= 0 or (deadline is not None and deadline.cancelled):
+                return
+            _, pending = wait(pending, timeout=min(remaining, self.CANCEL_POLL_INTERVAL))
+            finished = len(futures) - len(pending)
+            if finished > reported:
+                reported = finished
+                self._report(progress_callback, finished, len(futures), f'检索完成 {finished}/{len(futures)}')
+
+    @staticmethod
+    def _report(progress_callback: Optional[callable], finished: int, total: int, message: str) -> None:
+        if progress_callback:
+            progress_callback(finished, total, message)
+
+    async def _acached_search(
+        self,
+        provider: str,
+        query: str,
+        search_depth: str,
+        max_results: int,
+        fetch,
+        hedge: bool = True
+    ):
+        """_cached_search 的异步版本，fetch 为协程函数；SQLite 缓存读写在线程池中执行，不阻塞事件循环"""
+        upstream = fetch
+
+        def fetch():
+            return self.retry_policy.acall(upstream, name=f'{provider}.search', hedge=hedge)
+
+        with stage_timer('search'):
+            if not self.search_cache:
+                return await fetch()
+
+            key = self.search_cache.make_key(provider, query, search_depth, max_results)
+            cached = await asyncio.to_thread(self.search_cache.get, key)
+            if cached is not None:
+                value, stale = cached
+                if stale:
+                    self._arefresh_in_background(key, fetch)
+                return value
+
+            value = await fetch()
+            await asyncio.to_thread(self.search_cache.set, key, value)
+            return value
+
+    def _arefresh_in_background(self, key: str, fetch) -> None:
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        async def refresh():
+            try:
+                await asyncio.to_thread(self.search_cache.set, key, await fetch())
+            except Exception as e:
+                print(f'[DeepResearch] 检索缓存后台刷新失败: {str(e)}')
+            finally:
+                with self._refresh_lock:
+                    self._refreshing.discard(key)
+
+        asyncio.get_running_loop().create_task(refresh())
+
     def _truncate_query(self, query: str, max_len: int = 400) -> str:
         """截断 query 以满足外部搜索接口限制"""
         normalized = ' '.join((query or '').split())
@@ -297,10 +745,11 @@ class DeepResearchClient:
         if not keywords:
             return []
 
+        matcher = compile_keywords(tuple(keywords))
         scored = []
         for r in results:
             text = f"{r.get('title','')} {r.get('content','')}".lower()
-            hits = sum(1 for k in keywords if k in text)
+            hits = matcher.count(text)
             domain_score = self._score_domain(r.get('url', ''))
             score = hits + domain_score
             scored.append((score, hits, r))
@@ -314,25 +763,9 @@ class DeepResearchClient:
 
     def _score_domain(self, url: str) -> float:
         """根据域名给予质量加减分"""
-        domain = (url or '').lower()
-        if not domain:
+        if not url:
             return 0.0
-        preferred = [
-            'who.int', 'worldbank.org', 'oecd.org', 'un.org', 'imf.org',
-            'statista.com', 'reuters.com', 'bloomberg.com', 'gov', 'edu',
-            'nature.com', 'science.org', 'sciencedirect.com', 'ieee.org'
-        ]
-        deprioritized = [
-            'zhihu.com', 'baike.baidu.com', 'blog', 'medium.com',
-            'sohu.com', 'csdn.net', 'bbs', 'forum'
-        ]
-        for p in preferred:
-            if p in domain:
-                return 1.2
-        for d in deprioritized:
-            if d in domain:
-                return -0.8
-        return 0.0
+        return get_domain_reputation().score(url, 'filter')
 
     def _build_search_queries(
         self,
@@ -347,27 +780,14 @@ class DeepResearchClient:
             return [base_query]
 
         # 提取最近的用户输入作为核心意图
-        user_messages = [m.get('content', '') for m in (conversation_history or []) if m.get('role') == 'user']
+        if isinstance(conversation_history, RequestContext):
+            user_messages = conversation_history.user_messages
+        else:
+            user_messages = [m.get('content', '') for m in (conversation_history or []) if m.get('role') == 'user']
         idea = summary_text or (user_messages[-1] if user_messages else '') or ''
         idea = self._truncate_query(idea, 200)
 
-        chapter_focus = {
-            'executive-summary': '执行摘要 价值主张 目标市场 商业模式',
-            'market-analysis': '市场规模 增长趋势 TAM SAM SOM 用户画像',
-            'competitive-landscape': '竞品 分析 竞争优势 市场份额',
-            'solution': '解决方案 功能 特性 技术架构',
-            'business-model': '商业模式 收入来源 定价 成本结构',
-            'financial-projection': '财务预测 收入 成本 盈亏平衡',
-            'marketing-strategy': '营销策略 渠道 品牌 获客成本',
-            'team-structure': '团队架构 人才 组织',
-            'risk-assessment': '风险评估 风险控制',
-            'project-summary': '立项背景 机会论证 用户场景 核心痛点',
-            'problem-insight': '产品定义 价值主张 用户画像 产品边界',
-            'product-solution': '产品方案 功能规格 MVP 交互流程 技术架构',
-            'implementation-path': '实施路线图 里程碑 资源计划 人力预算',
-            'budget-planning': '投入产出 ROI 成本估算 收益预测 成功指标',
-            'risk-control': '风险评估 决策建议 风险矩阵'
-        }.get(chapter_id, chapter_id.replace('-', ' '))
+        chapter_focus = get_chapter(chapter_id).focus
 
         queries = [
             f"{idea} {chapter_focus} 关键数据 统计 报告",
@@ -388,77 +808,65 @@ class DeepResearchClient:
 
         # 注意：OpenAI本身不提供搜索功能，这里只是示例
         # 实际使用时需要配合Bing Search API或其他搜索服务
+        self._report(progress_callback, 0, 1, 'OpenAI 研究中')
 
-        response = self.session.post(
-            f'{self.api_url}/chat/completions',
-            json={
-                'model': 'gpt-4-turbo-preview',
-                'messages': [
-                    {
-                        'role': 'system',
-                        'content': '你是一个专业的商业分析师。'
-                    },
-                    {
-                        'role': 'user',
-                        'content': query
-                    }
-                ],
-                'temperature': 0.7,
-                'max_tokens': 4000
-            },
-            timeout=120
-        )
-
-        response.raise_for_status()
-        result = response.json()
-
-        content = result['choices'][0]['message']['content']
+        def fetch():
+            response = self.session.post(
+                f'{self.api_url}/chat/completions',
+                json=self._openai_payload(query),
+                timeout=deadlines.timeout(120)
+            )
+            response.raise_for_status()
+            return response.json()
 
-        return {
-            'content': content,
-            'sources': [],  # OpenAI不提供来源
-            'confidence': 0.75,
-            'tokens': result.get('usage', {}).get('total_tokens', 0)
-        }
+        result = self.retry_policy.call(fetch, name='openai.research')
+        self._report(progress_callback, 1, 1, 'OpenAI 研究完成')
+        return self._parse_openai(result)
 
-    def _generate_mock(
+    async def _agenerate_with_openai(
         self,
-        chapter_id: str,
         query: str,
         depth: str,
         iterations: int,
         progress_callback: Optional[callable]
     ) -> Dict[str, Any]:
-        """模拟实现（当没有配置真实API时使用）"""
-        print('[DeepResearch] 使用模拟实现')
+        """使用OpenAI API生成（异步）"""
+        async def fetch():
+            response = await self.session.apost(
+                f'{self.api_url}/chat/completions',
+                json=self._openai_payload(query),
+                timeout=deadlines.timeout(120)
+            )
+            response.raise_for_status()
+            return response.json()
 
-        # 模拟多轮迭代
-        for i in range(1, iterations + 1):
-            if progress_callback:
-                progress_callback(i, iterations, f'正在进行第{i}轮研究...')
-            time.sleep(1)  # 模拟处理时间
+        return self._parse_openai(await self.retry_policy.acall(fetch, name='openai.research'))
 
-        # 返回模拟内容
+    def _openai_payload(self, query: str) -> Dict[str, Any]:
         return {
-            'content': f"""# {chapter_id} 章节内容（深度研究模式）
-
-## 概述
-这是使用DeepResearch深度研究模式生成的内容。实际部署时，这里会显示基于多轮迭代和网络搜索的专业分析结果。
-
-## 研究发现
-1. **关键洞察**：基于对话历史和网络搜索，我们发现...
-2. **数据支持**：根据最新的行业报告...
-3. **专业建议**：结合最佳实践，建议...
+            'model': 'gpt-4-turbo-preview',
+            'messages': [
+                {
+                    'role': 'system',
+                    'content': '你是一个专业的商业分析师。'
+                },
+                {
+                    'role': 'user',
+                    'content': query
+                }
+            ],
+            'temperature': 0.7,
+            'max_tokens': 4000
+        }
 
-## 详细分析
-（这里会包含详细的分析内容，包括数据、图表、引用等）
+    def _parse_openai(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        content = result['choices'][0]['message']['content']
 
----
-*注意：当前为模拟内容，实际使用时需要配置真实的研究API（Perplexity/Tavily/OpenAI）*
-""",
-            'sources': self._generate_mock_sources(chapter_id),
-            'confidence': 0.85,
-            'tokens': 1200
+        return {
+            'content': content,
+            'sources': [],  # OpenAI不提供来源
+            'confidence': 0.75,
+            'tokens': result.get('usage', {}).get('total_tokens', 0)
         }
 
     def _build_research_query(
@@ -468,186 +876,12 @@ class DeepResearchClient:
         doc_type: str
     ) -> str:
         """构建研究查询"""
-        conversation_text = self._format_conversation(conversation_history)
-
-        # 章节特定的查询模板
-        queries = {
-            'market-analysis': f"""
-请对以下产品进行深度市场分析：
-
-{conversation_text}
-
-分析要点：
-1. 目标市场规模（TAM/SAM/SOM）和增长趋势
-2. 用户画像、需求痛点和行为特征
-3. 市场驱动因素和发展机会
-4. 行业标准和最佳实践
-
-请提供数据支持和可靠来源。
-""",
-            'competitive-landscape': f"""
-请分析以下产品的竞争格局：
-
-{conversation_text}
-
-分析要点：
-1. 主要竞品列表和核心特点
-2. 竞争优势对比矩阵
-3. 市场定位和差异化策略
-4. 竞争壁垒和护城河
-
-请提供具体的竞品数据和市场份额信息。
-""",
-            'financial-projection': f"""
-请对以下产品进行财务预测分析：
-
-{conversation_text}
-
-分析要点：
-1. 收入模型和定价策略
-2. 成本结构和盈亏平衡点
-3. 3-5年财务预测
-4. 行业财务基准和估值参考
-
-请提供行业数据和财务模型参考。
-""",
-            'solution-design': f"""
-请设计以下产品的解决方案：
-
-{conversation_text}
-
-设计要点：
-1. 核心功能和技术架构
-2. 用户体验和交互设计
-3. 技术实现路径和难点
-4. 行业最佳实践参考
-
-请提供技术方案和案例参考。
-""",
-            'business-model': f"""
-请设计以下产品的商业模式：
-
-{conversation_text}
-
-设计要点：
-1. 收入来源和盈利模式
-2. 成本结构和关键资源
-3. 客户关系和渠道策略
-4. 价值主张和合作伙伴
-
-请提供商业模式画布和案例参考。
-""",
-            'executive-summary': f"""
-请为以下产品撰写执行摘要：
-
-{conversation_text}
-
-摘要要点：
-1. 核心价值主张和解决的问题
-2. 目标市场和商业机会
-3. 竞争优势和差异化
-4. 财务预测和融资需求
-
-请提供简洁有力的总结。
-""",
-            'marketing-strategy': f"""
-请为以下产品制定营销策略：
-
-{conversation_text}
-
-策略要点：
-1. 目标客户和市场定位
-2. 营销渠道和推广策略
-3. 品牌建设和传播计划
-4. 预算分配和效果评估
-
-请提供营销案例和最佳实践。
-""",
-            'risk-assessment': f"""
-请对以下产品进行风险评估：
-
-{conversation_text}
-
-分析要点：
-1. 市场风险和应对策略
-2. 技术风险和解决方案
-3. 运营风险和预防措施
-4. 财务风险和控制手段
-
-请提供可执行的风险缓解措施和参考案例。
-""",
-            'project-summary': f"""
-请基于以下内容进行立项背景与机会论证：
-
-{conversation_text}
-
-分析要点：
-1. 目标用户与典型场景
-2. 核心痛点与证据
-3. 市场/业务机会窗口
-4. 现有方案缺口与不做代价
-""",
-            'problem-insight': f"""
-请基于以下内容定义产品与价值主张：
-
-{conversation_text}
-
-分析要点：
-1. 产品愿景陈述
-2. 目标用户画像
-3. 核心价值主张
-4. 产品边界与范围
-""",
-            'product-solution': f"""
-请基于以下内容输出产品方案与功能规格：
-
-{conversation_text}
-
-分析要点：
-1. 核心功能清单
-2. MVP范围界定
-3. 关键交互流程
-4. 技术架构概要
-""",
-            'implementation-path': f"""
-请基于以下内容制定实施路线图与资源计划：
-
-{conversation_text}
-
-分析要点：
-1. 关键里程碑与时间表
-2. 角色与人力需求
-3. 预算与资源计划
-4. 依赖项与风险触发条件
-""",
-            'budget-planning': f"""
-请基于以下内容进行投入产出与成功度量分析：
-
-{conversation_text}
-
-分析要点：
-1. 成本估算（人天/资金）
-2. 收益预测模型
-3. 关键成功指标
-4. ROI或盈亏平衡分析
-""",
-            'risk-control': f"""
-请基于以下内容输出风险评估与决策建议：
-
-{conversation_text}
-
-分析要点：
-1. 关键风险清单与分级
-2. 风险矩阵（概率/影响）
-3. 应对预案与触发信号
-4. 决策建议（立项/试点/延后）
-"""
-        }
-
-        return queries.get(chapter_id, f"请基于以下内容生成{chapter_id}章节：\n{conversation_text}")
+        return get_chapter(chapter_id).render_query(self._format_conversation(conversation_history))
 
     def _format_conversation(self, conversation_history: List[Dict[str, str]]) -> str:
         """格式化对话历史"""
+        if isinstance(conversation_history, RequestContext):
+            return conversation_history.text
         if not conversation_history:
             return ''
 
@@ -658,26 +892,3 @@ class DeepResearchClient:
             lines.append(f"{role}: {content}")
 
         return '\n'.join(lines)
-
-    def _generate_mock_sources(self, chapter_id: str) -> List[Dict[str, Any]]:
-        """生成模拟数据来源"""
-        return [
-            {
-                'title': '2024年中国AI市场研究报告',
-                'url': 'https://example.com/report-2024',
-                'snippet': '市场规模达到1000亿元，年增长率30%...',
-                'relevance': 0.95
-            },
-            {
-                'title': '行业白皮书：人工智能应用趋势',
-                'url': 'https://example.com/whitepaper',
-                'snippet': '企业级AI应用正在快速普及...',
-                'relevance': 0.88
-            },
-            {
-                'title': '竞品分析：主要玩家对比',
-                'url': 'https://example.com/competitor-analysis',
-                'snippet': '市场前三名占据70%份额...',
-                'relevance': 0.82
-            }
-        ]
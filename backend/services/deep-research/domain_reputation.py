@@ -0,0 +1,156 @@
+"""
+域名信誉索引
+
+从 domain-reputation.json 加载分级配置，按解析后的 host 及其各级后缀查表，
+单个来源的评分代价为 O(host 标签数)；结果按 host 缓存，配置文件变更后自动重新加载。
+
+配置格式：
+    tiers:   分级 -> 各评分场景的分值（ranking: 来源重排，filter: 检索结果过滤）
+    domains: 域名或后缀 -> 分级，按标签边界匹配（"gov" 匹配 *.gov，"statista.com" 匹配 www.statista.com）
+    second_level: 国家顶级域下的二级域标签 -> 分级（"gov" 匹配 *.gov.uk、*.gov.sg，"ac" 匹配 *.ac.uk）
+    labels:  子域标签 -> 分级（"bbs" 匹配 bbs.example.com），域名规则优先
+"""
+import json
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Optional
+from urllib.parse import urlparse
+
+DEFAULT_CONFIG_PATH = Path(__file__).resolve().parent / 'domain-reputation.json'
+
+
+def parse_host(url: str) -> str:
+    """提取小写 host（去除端口与末尾的点），无法解析时返回空串"""
+    url = (url or '').strip()
+    if not url:
+        return ''
+    parsed = urlparse(url if '//' in url else f'//{url}')
+    return (parsed.hostname or '').rstrip('.').lower()
+
+
+# 常见形态的 http(s) URL：host 仅含字母数字、点与连字符，可带数字端口；其余形态交给 urlparse
+_SIMPLE_URL = re.compile(r'https?://([A-Za-z0-9.-]+)(?::[0-9]*)?(?:[/?#]|$)')
+
+
+def parse_hosts(urls: Iterable[str]) -> List[str]:
+    """批量提取 host，结果与逐个调用 parse_host 一致；常见 URL 只做一次正则匹配"""
+    match = _SIMPLE_URL.match
+    hosts = []
+    for url in urls:
+        simple = match(url) if url else None
+        hosts.append(simple.group(1).rstrip('.').lower() if simple else parse_host(url))
+    return hosts
+
+
+class DomainReputationIndex:
+    """域名信誉索引"""
+
+    def __init__(self, path: str, check_interval: float = 5.0):
+        """
+        Args:
+            path: 配置文件路径
+            check_interval: 检查配置文件是否变更的最小间隔（秒）
+        """
+        self.path = Path(path)
+        self.check_interval = float(check_interval)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._tiers = {}
+        self._domains = {}
+        self._second_level = {}
+        self._labels = {}
+        self._tier_for_host = lru_cache(maxsize=4096)(self._lookup)
+        self.reload()
+
+    @classmethod
+    def from_env(cls) -> 'DomainReputationIndex':
+        return cls(
+            os.getenv('DEEPRESEARCH_DOMAIN_REPUTATION_PATH', str(DEFAULT_CONFIG_PATH)),
+            check_interval=float(os.getenv('DEEPRESEARCH_DOMAIN_REPUTATION_CHECK_INTERVAL', 5))
+        )
+
+    def reload(self) -> bool:
+        """重新加载配置；文件缺失或格式错误时保留当前配置并返回 False"""
+        with self._lock:
+            try:
+                mtime = self.path.stat().st_mtime
+                config = json.loads(self.path.read_text(encoding='utf-8'))
+                tiers = dict(config.get('tiers') or {})
+                domains = {str(k).lower().strip('.'): v for k, v in (config.get('domains') or {}).items()}
+                second_level = {str(k).lower(): v for k, v in (config.get('second_level') or {}).items()}
+                labels = {str(k).lower(): v for k, v in (config.get('labels') or {}).items()}
+            except (OSError, ValueError) as e:
+                print(f'[DomainReputation] 配置加载失败，沿用当前配置: {e}')
+                return False
+            self._tiers, self._domains, self._labels = tiers, domains, labels
+            self._second_level = second_level
+            self._mtime = mtime
+            self._checked_at = time.monotonic()
+            self._tier_for_host.cache_clear()
+            return True
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            mtime = self.path.stat().st_mtime
+        except OSError:
+            return
+        if mtime != self._mtime:
+            self.reload()
+
+    def _lookup(self, host: str) -> Optional[str]:
+        labels = host.split('.')
+        for start in range(len(labels)):
+            tier = self._domains.get('.'.join(labels[start:]))
+            if tier:
+                return tier
+        # 国家顶级域（两个字母）下的 gov/edu/ac 等二级域
+        if len(labels) >= 2 and len(labels[-1]) == 2:
+            tier = self._second_level.get(labels[-2])
+            if tier:
+                return tier
+        for label in labels[:-1]:
+            tier = self._labels.get(label)
+            if tier:
+                return tier
+        return None
+
+    def tier(self, url: str) -> Optional[str]:
+        """返回 URL 所属分级，未命中时返回 None"""
+        self._maybe_reload()
+        host = parse_host(url)
+        return self._tier_for_host(host) if host else None
+
+    def score(self, url: str, profile: str) -> float:
+        """按评分场景返回分值，未命中任何分级时为 0"""
+        return self.score_host(parse_host(url), profile)
+
+    def score_host(self, host: str, profile: str) -> float:
+        """按已解析的 host 评分（调用方批量解析时避免重复 urlparse）"""
+        self._maybe_reload()
+        tier = self._tier_for_host(host) if host else None
+        if not tier:
+            return 0.0
+        return float((self._tiers.get(tier) or {}).get(profile, 0.0))
+
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+
+def get_domain_reputation() -> DomainReputationIndex:
+    """进程内共享的域名信誉索引"""
+    global _INDEX
+    if _INDEX is None:
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = DomainReputationIndex.from_env()
+    return _INDEX
@@ -0,0 +1,366 @@
+"""
+上游 HTTP 连接池
+
+检索提供商（Tavily/Perplexity/OpenAI）与 OpenRouter 共享同一组连接池：
+- 每个上游 origin 一个线程安全的 httpx.Client，连接池大小可按 host 配置，保持长连接；
+- asyncio 服务模式按事件循环为每个 origin 创建 httpx.AsyncClient，与同步连接池共用统计；
+- 鉴权头按请求传入，不同提供商互不影响；
+- 服务启动时可预热连接（warm），首个请求无需等待 TCP/TLS 握手；
+- 统计并发占用（池饱和）与连接复用情况，见 stats()；流式响应在关闭时才释放占用。
+"""
+import logging
+import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import urlsplit
+
+import asyncio
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 32
+DEFAULT_KEEPALIVE_EXPIRY = 60.0
+DEFAULT_TIMEOUT = 600.0
+
+
+def _origin(url: str) -> str:
+    parts = urlsplit(url)
+    return f'{parts.scheme}://{parts.netloc}'.lower()
+
+
+def parse_pool_sizes(spec: str) -> Dict[str, int]:
+    """解析 "api.tavily.com=16,openrouter.ai=64" 形式的按 host 连接池配置"""
+    sizes = {}
+    for item in (spec or '').split(','):
+        host, sep, size = item.strip().partition('=')
+        if sep and host.strip() and size.strip().isdigit():
+            sizes[host.strip().lower()] = max(1, int(size))
+    return sizes
+
+
+class _HostStats:
+    __slots__ = (
+        'pool_size', 'in_flight', 'peak_in_flight', 'requests', 'saturated', 'new_connections', 'errors', 'lock'
+    )
+
+    def __init__(self, pool_size: int):
+        self.lock = threading.Lock()
+        self.pool_size = pool_size
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.saturated = 0
+        self.new_connections = 0
+        self.errors = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        reused = max(0, self.requests - self.new_connections)
+        return {
+            'poolSize': self.pool_size,
+            'inFlight': self.in_flight,
+            'peakInFlight': self.peak_in_flight,
+            'requests': self.requests,
+            'saturatedRequests': self.saturated,
+            'newConnections': self.new_connections,
+            'reusedConnections': reused,
+            'reuseRate': reused / self.requests if self.requests else 0.0,
+            'errors': self.errors
+        }
+
+    def start(self) -> None:
+        with self.lock:
+            self.requests += 1
+            if self.in_flight >= self.pool_size:
+                self.saturated += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def connected(self, event_name: str) -> None:
+        if event_name == 'connection.connect_tcp.complete':
+            with self.lock:
+                self.new_connections += 1
+
+    def failed(self) -> None:
+        with self.lock:
+            self.errors += 1
+            self.in_flight -= 1
+
+    def release(self) -> None:
+        with self.lock:
+            self.in_flight -= 1
+
+
+class _ReleasingStream(httpx.SyncByteStream, httpx.AsyncByteStream):
+    """响应体关闭（读完或调用方关闭流式响应）时释放并发占用，只释放一次"""
+
+    def __init__(self, stream, stats: _HostStats):
+        self._stream = stream
+        self._stats = stats
+        self._released = False
+
+    def __iter__(self):
+        yield from self._stream
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    def _release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._stats.release()
+
+    def close(self) -> None:
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _tracked(response: httpx.Response, stats: _HostStats) -> httpx.Response:
+    return httpx.Response(
+        response.status_code,
+        headers=response.headers,
+        stream=_ReleasingStream(response.stream, stats),
+        extensions=response.extensions
+    )
+
+
+class _InstrumentedTransport(httpx.HTTPTransport):
+    """在 httpx 传输层统计并发占用与新建连接数"""
+
+    def __init__(self, stats: _HostStats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._stats
+        upstream_trace = request.extensions.get('trace')
+
+        def trace(event_name, info):
+            stats.connected(event_name)
+            if upstream_trace is not None:
+                upstream_trace(event_name, info)
+
+        request.extensions['trace'] = trace
+        stats.start()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            stats.failed()
+            raise
+        return _tracked(response, stats)
+
+
+class _InstrumentedAsyncTransport(httpx.AsyncHTTPTransport):
+    """_InstrumentedTransport 的异步版本"""
+
+    def __init__(self, stats: _HostStats, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        stats = self._stats
+        upstream_trace = request.extensions.get('trace')
+
+        async def trace(event_name, info):
+            stats.connected(event_name)
+            if upstream_trace is not None:
+                await upstream_trace(event_name, info)
+
+        request.extensions['trace'] = trace
+        stats.start()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            stats.failed()
+            raise
+        return _tracked(response, stats)
+
+
+class ProviderSession:
+    """绑定某个提供商鉴权头的轻量视图，接口与 requests.Session.post 保持一致"""
+
+    def __init__(self, transport: 'PooledTransport', headers: Optional[Dict[str, str]] = None):
+        self.transport = transport
+        self.headers = dict(headers or {})
+
+    def post(self, url: str, json: Any = None, timeout: Optional[float] = None, headers=None) -> httpx.Response:
+        merged = dict(self.headers)
+        merged.update(headers or {})
+        return self.transport.request('POST', url, json=json, timeout=timeout, headers=merged)
+
+    async def apost(self, url: str, json: Any = None, timeout: Optional[float] = None, headers=None) -> httpx.Response:
+        """post 的异步版本，使用当前事件循环的共享连接池"""
+        merged = dict(self.headers)
+        merged.update(headers or {})
+        return await self.transport.arequest('POST', url, json=json, timeout=timeout, headers=merged)
+
+
+class PooledTransport:
+    """按上游 origin 分池的线程安全 HTTP 传输层"""
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        pool_sizes: Optional[Dict[str, int]] = None,
+        keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+        timeout: float = DEFAULT_TIMEOUT
+    ):
+        """
+        Args:
+            pool_size: 默认每个 host 的最大连接数
+            pool_sizes: host -> 最大连接数，覆盖默认值
+            keepalive_expiry: 空闲长连接保留时间（秒）
+            timeout: 默认请求超时（秒），单次请求可覆盖
+        """
+        self.pool_size = max(1, int(pool_size))
+        self.pool_sizes = dict(pool_sizes or {})
+        self.keepalive_expiry = float(keepalive_expiry)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._clients: Dict[str, httpx.Client] = {}
+        # 事件循环 -> {origin: AsyncClient}；AsyncClient 的连接绑定创建它的事件循环
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._stats: Dict[str, _HostStats] = {}
+
+    @classmethod
+    def from_env(cls) -> 'PooledTransport':
+        return cls(
+            pool_size=int(os.getenv('DEEPRESEARCH_HTTP_POOL_SIZE', DEFAULT_POOL_SIZE)),
+            pool_sizes=parse_pool_sizes(os.getenv('DEEPRESEARCH_HTTP_POOL_SIZES', '')),
+            keepalive_expiry=float(os.getenv('DEEPRESEARCH_HTTP_KEEPALIVE_EXPIRY', DEFAULT_KEEPALIVE_EXPIRY))
+        )
+
+    def pool_size_for(self, url: str) -> int:
+        host = (urlsplit(url).hostname or '').lower()
+        return self.pool_sizes.get(host, self.pool_size)
+
+    def client_for(self, url: str) -> httpx.Client:
+        """返回该 URL 所属 origin 的共享 httpx.Client（首次使用时创建）"""
+        origin = _origin(url)
+        client = self._clients.get(origin)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(origin)
+            if client is None:
+                client = httpx.Client(
+                    transport=_InstrumentedTransport(self._stats_for(origin), limits=self._limits(url)),
+                    timeout=self.timeout
+                )
+                self._clients[origin] = client
+        return client
+
+    def aclient_for(self, url: str) -> httpx.AsyncClient:
+        """返回当前事件循环中该 origin 的共享 httpx.AsyncClient（需在事件循环内调用）"""
+        loop = asyncio.get_running_loop()
+        origin = _origin(url)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(origin)
+            if client is None:
+                client = clients[origin] = httpx.AsyncClient(
+                    transport=_InstrumentedAsyncTransport(self._stats_for(origin), limits=self._limits(url)),
+                    timeout=self.timeout
+                )
+        return client
+
+    def _stats_for(self, origin: str) -> _HostStats:
+        # 调用方持有 self._lock
+        stats = self._stats.get(origin)
+        if stats is None:
+            stats = self._stats[origin] = _HostStats(self.pool_size_for(origin))
+        return stats
+
+    def _limits(self, url: str) -> httpx.Limits:
+        size = self.pool_size_for(url)
+        return httpx.Limits(
+            max_connections=size,
+            max_keepalive_connections=size,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if kwargs.get('timeout') is None:
+            kwargs.pop('timeout', None)
+        return self.client_for(url).request(method, url, **kwargs)
+
+    async def arequest(self, method: str, url: str, **kwargs) -> httpx.Response:
+        if kwargs.get('timeout') is None:
+            kwargs.pop('timeout', None)
+        return await self.aclient_for(url).request(method, url, **kwargs)
+
+    def session(self, headers: Optional[Dict[str, str]] = None) -> ProviderSession:
+        return ProviderSession(self, headers)
+
+    def warm(self, urls: Iterable[str], connections: int = 2, background: bool = True) -> Optional[threading.Thread]:
+        """
+        预热连接：对每个 origin 并发发起 connections 个 HEAD 请求，建立的连接留在池中复用
+
+        预热失败只记录日志，不影响服务启动。
+        """
+        origins = list(dict.fromkeys(_origin(url) for url in urls if url))
+        if not origins or connections <= 0:
+            return None
+
+        def run():
+            for origin in origins:
+                count = min(connections, self.pool_size_for(origin))
+                with ThreadPoolExecutor(max_workers=count) as executor:
+                    for future in [executor.submit(self._warm_one, origin) for _ in range(count)]:
+                        future.result()
+
+        if not background:
+            run()
+            return None
+        thread = threading.Thread(target=run, name='http-prewarm', daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_one(self, origin: str) -> None:
+        try:
+            self.client_for(origin).head(origin + '/', timeout=10)
+        except Exception as warm_error:
+            logger.info(f'连接预热失败: {origin}, {warm_error}')
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {origin: stats.to_dict() for origin, stats in list(self._stats.items())}
+
+    def close(self) -> None:
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    async def aclose(self) -> None:
+        """关闭当前事件循环中的异步连接池（asyncio 服务关闭时调用）"""
+        with self._lock:
+            clients = list(self._async_clients.pop(asyncio.get_running_loop(), {}).values())
+        for client in clients:
+            await client.aclose()
+
+
+_default_transport = None
+_default_lock = threading.Lock()
+
+
+def get_default_transport() -> PooledTransport:
+    """进程内共享的传输层（按环境变量配置）"""
+    global _default_transport
+    if _default_transport is None:
+        with _default_lock:
+            if _default_transport is None:
+                _default_transport = PooledTransport.from_env()
+    return _default_transport
@@ -0,0 +1,148 @@
+"""
+异步任务管理
+
+POST 提交后立即返回 job id，任务在进程内线程池中执行；
+通过 progress 回调上报阶段与进度，并支持协作式取消。
+"""
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+
+FINISHED_STATES = {JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED}
+
+
+class JobCancelled(Exception):
+    """任务已被取消，用于中断流水线"""
+
+
+class Job:
+    """单个异步任务"""
+
+    def __init__(self, kind: str, params: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.params = params
+        self.status = JOB_QUEUED
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.message = ''
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+
+    def report(self, stage: str, progress: float, message: str = '') -> None:
+        """进度回调：更新阶段与进度；任务被取消时抛出 JobCancelled"""
+        if self.cancel_event.is_set():
+            raise JobCancelled(f'任务已取消: {self.id}')
+        self.stage = stage
+        self.progress = round(max(self.progress, min(1.0, float(progress))), 3)
+        self.message = message
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            'jobId': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': self.progress,
+            'message': self.message,
+            'createdAt': self.created_at,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at
+        }
+        if self.status == JOB_SUCCEEDED:
+            data['result'] = self.result
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobManager:
+    """进程内任务池 + 本地任务存储"""
+
+    def __init__(self, max_workers: int = 4, ttl: float = 3600):
+        self.ttl = float(ttl)
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix='research-job')
+
+    def submit(self, kind: str, params: Dict[str, Any], runner: Callable[[Job], Any]) -> Job:
+        """
+        提交任务
+
+        Args:
+            runner: 接收 Job 的执行函数，返回值作为任务结果；应通过 job.report 上报进度
+        """
+        self._prune()
+        job = Job(kind, params)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, runner)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务：排队中的任务直接取消，运行中的任务在下一个阶段边界中断"""
+        job = self.get(job_id)
+        if not job or job.status in FINISHED_STATES:
+            return job
+        job.cancel_event.set()
+        if job.status == JOB_QUEUED:
+            self._finish(job, JOB_CANCELLED)
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return counts
+
+    def _run(self, job: Job, runner: Callable[[Job], Any]) -> None:
+        if job.cancel_event.is_set():
+            return
+        job.status = JOB_RUNNING
+        job.started_at = time.time()
+        try:
+            job.report('started', 0.0)
+            job.result = runner(job)
+            job.progress = 1.0
+            job.stage = 'done'
+            self._finish(job, JOB_SUCCEEDED)
+        except JobCancelled:
+            self._finish(job, JOB_CANCELLED)
+        except Exception as e:
+            if job.cancel_event.is_set():
+                self._finish(job, JOB_CANCELLED)
+                return
+            job.error = str(e)
+            self._finish(job, JOB_FAILED)
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = time.time()
+
+    def _prune(self) -> None:
+        """清理超过保留期的已结束任务"""
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [
+                job_id for job_id, job in self._jobs.items()
+                if job.status in FINISHED_STATES and (job.finished_at or 0) < cutoff
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
@@ -0,0 +1,414 @@
+"""
+服务指标（Prometheus 文本格式）
+
+进程内的轻量实现，不依赖 prometheus_client：
+- Counter / Gauge / Histogram 支持标签，线程安全；
+- 缓存命中率、任务队列、连接池占用等已有 stats() 的组件通过 collector 在抓取时采集；
+- render() 输出 text/plain; version=0.0.4 格式，供 GET /metrics 使用；
+- collect_timings() 在请求范围内按阶段累计耗时（响应中的 timings），未开启时只多一次 ContextVar 读取。
+
+多进程部署（gunicorn 多 worker）时每个进程各自计数，由 Prometheus 按实例聚合。
+"""
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 上游调用耗时从毫秒级（缓存命中、重排）到数分钟（深度合成）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if value == -math.inf:
+        return '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} 标签不匹配: {sorted(labels)} != {sorted(self.labelnames)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _child(self, key: Tuple[str, ...]):
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+        return child
+
+    def labels(self, **labels):
+        return self._child(self._key(labels))
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+    def _items(self):
+        with self._lock:
+            items = list(self._children.items())
+        for key, child in items:
+            yield dict(zip(self.labelnames, key)), child
+
+
+class _Value:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = float(value)
+
+    @contextmanager
+    def track(self):
+        """进入时 +1，退出时 -1（用于在途请求数）"""
+        self.inc()
+        try:
+            yield
+        finally:
+            self.dec()
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, **labels) -> _Value:
+        return super().labels(**labels)
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if amount < 0:
+            raise ValueError('Counter 只能递增')
+        self.labels(**labels).inc(amount)
+
+    def samples(self) -> List[Sample]:
+        return [(self.name + '_total', labels, child.value) for labels, child in self._items()]
+
+
+class Gauge(_Metric):
+    kind = 'gauge'
+
+    def _new_child(self):
+        return _Value()
+
+    def labels(self, **labels) -> _Value:
+        return super().labels(**labels)
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, labels, child.value) for labels, child in self._items()]
+
+
+class _HistogramValue:
+    __slots__ = ('upper_bounds', 'counts', 'sum', '_lock')
+
+    def __init__(self, upper_bounds: Tuple[float, ...]):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * len(upper_bounds)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        with self._lock:
+            self.sum += value
+            for index, bound in enumerate(self.upper_bounds):
+                if value <= bound:
+                    self.counts[index] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        bounds = sorted(float(bound) for bound in buckets)
+        if not bounds or bounds[-1] != math.inf:
+            bounds.append(math.inf)
+        self.upper_bounds = tuple(bounds)
+
+    def _new_child(self):
+        return _HistogramValue(self.upper_bounds)
+
+    def labels(self, **labels) -> _HistogramValue:
+        return super().labels(**labels)
+
+    def observe(self, value: float, **labels) -> None:
+        self.labels(**labels).observe(value)
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        for labels, child in self._items():
+            counts, total = child.snapshot()
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds, counts):
+                cumulative += count
+                samples.append((self.name + '_bucket', dict(labels, le=_format_value(bound)), cumulative))
+            samples.append((self.name + '_count', labels, cumulative))
+            samples.append((self.name + '_sum', labels, total))
+        return samples
+
+
+class CollectedMetric:
+    """collector 在抓取时产出的一组样本"""
+
+    __slots__ = ('name', 'kind', 'documentation', '_samples')
+
+    def __init__(self, name: str, kind: str, documentation: str, samples: Iterable[Tuple[Dict[str, str], float]]):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        suffix = '_total' if kind == 'counter' else ''
+        self._samples = [(name + suffix, labels, value) for labels, value in samples]
+
+    def samples(self) -> List[Sample]:
+        return self._samples
+
+
+class MetricsRegistry:
+    """指标注册表"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                if type(existing) is not type(metric) or existing.labelnames != metric.labelnames:
+                    raise ValueError(f'指标重复注册: {metric.name}')
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collector: Callable[[], Iterable[CollectedMetric]]) -> None:
+        """注册抓取时回调，用于从已有组件的 stats() 导出指标"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def collect(self) -> List[object]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        for collector in collectors:
+            metrics.extend(collector())
+        return metrics
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.collect():
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for sample_name, labels, value in metric.samples():
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+# 流水线各阶段耗时：summary / search（每条检索 query）/ ranking / synthesis / single-shot / post-processing
+STAGE_SECONDS = REGISTRY.histogram(
+    'deepresearch_stage_duration_seconds', '章节流水线各阶段耗时（秒）', ('stage',)
+)
+STAGE_ERRORS = REGISTRY.counter(
+    'deepresearch_stage_errors', '章节流水线各阶段失败次数', ('stage',)
+)
+TOKENS = REGISTRY.counter(
+    'deepresearch_tokens', 'OpenRouter 调用消耗的 tokens（按阶段与模型）', ('stage', 'model', 'kind')
+)
+IN_FLIGHT = REGISTRY.gauge(
+    'deepresearch_in_flight_requests', '正在处理的 HTTP 请求数', ('endpoint',)
+)
+# 整文档章节在提交/开始/结束时增减计数，不读取线程池内部队列
+DOCUMENT_QUEUED = REGISTRY.gauge(
+    'deepresearch_document_queue_depth', '整文档生成中等待执行的章节数'
+).labels()
+DOCUMENT_ACTIVE = REGISTRY.gauge(
+    'deepresearch_document_active_chapters', '整文档生成中正在执行的章节数'
+).labels()
+SOURCES = REGISTRY.counter(
+    'deepresearch_ranked_sources', 'rank_and_filter_sources 保留/丢弃的来源数', ('outcome',)
+)
+
+
+class RequestTimings:
+    """单个请求内各阶段的累计耗时（秒）与 OpenRouter tokens；并发执行的阶段（如多条检索 query）按各自耗时累加"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._seconds: Dict[str, float] = {}
+        self._tokens: Dict[str, int] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._seconds[stage] = self._seconds.get(stage, 0.0) + seconds
+
+    def add_tokens(self, stage: str, tokens: int) -> None:
+        with self._lock:
+            self._tokens[stage] = self._tokens.get(stage, 0) + tokens
+
+    def tokens(self, stage: str) -> int:
+        """该请求内某阶段（如 summary）累计消耗的 tokens"""
+        with self._lock:
+            return self._tokens.get(stage, 0)
+
+    def to_dict(self) -> Dict[str, float]:
+        with self._lock:
+            timings = {stage: round(seconds, 3) for stage, seconds in self._seconds.items()}
+        timings['total'] = round(time.perf_counter() - self.started, 3)
+        return timings
+
+
+_CURRENT_TIMINGS: ContextVar[Optional[RequestTimings]] = ContextVar('deepresearch_request_timings', default=None)
+
+
+@contextmanager
+def collect_timings():
+    """在当前上下文（及其派生的线程/协程上下文）内收集阶段耗时与 tokens"""
+    timings = RequestTimings()
+    token = _CURRENT_TIMINGS.set(timings)
+    try:
+        yield timings
+    finally:
+        _CURRENT_TIMINGS.reset(token)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _CURRENT_TIMINGS.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str):
+    """记录阶段耗时；异常时同时计入失败次数"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def _token_count(usage, field: str) -> int:
+    value = getattr(usage, field, None)
+    return value if isinstance(value, int) and value > 0 else 0
+
+
+def record_usage(stage: str, model: str, usage) -> int:
+    """按阶段与模型累计 tokens，返回本次 total_tokens（无 usage 时为 0）"""
+    if not usage:
+        return 0
+    prompt_tokens = _token_count(usage, 'prompt_tokens')
+    completion_tokens = _token_count(usage, 'completion_tokens')
+    total_tokens = _token_count(usage, 'total_tokens') or (prompt_tokens + completion_tokens)
+    if prompt_tokens:
+        TOKENS.inc(prompt_tokens, stage=stage, model=model, kind='prompt')
+    if completion_tokens:
+        TOKENS.inc(completion_tokens, stage=stage, model=model, kind='completion')
+    TOKENS.inc(total_tokens, stage=stage, model=model, kind='total')
+    timings = _CURRENT_TIMINGS.get()
+    if timings is not None:
+        timings.add_tokens(stage, total_tokens)
+    return total_tokens
+
+
+def cache_metrics(caches: Dict[str, Optional[dict]]) -> List[CollectedMetric]:
+    """把 {名称: cache.stats()} 转换为命中/未命中计数与命中率"""
+    present = {name: stats for name, stats in caches.items() if stats}
+    return [
+        CollectedMetric('deepresearch_cache_hits', 'counter', '缓存命中次数（含宽限期旧值）', [
+            ({'cache': name}, stats.get('hits', 0) + stats.get('stale_hits', 0)) for name, stats in present.items()
+        ]),
+        CollectedMetric('deepresearch_cache_misses', 'counter', '缓存未命中次数', [
+            ({'cache': name}, stats.get('misses', 0)) for name, stats in present.items()
+        ]),
+        CollectedMetric('deepresearch_cache_hit_ratio', 'gauge', '缓存命中率', [
+            ({'cache': name}, stats.get('hit_rate', 0.0)) for name, stats in present.items()
+        ])
+    ]
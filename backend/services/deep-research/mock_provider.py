@@ -0,0 +1,247 @@
+"""
+模拟检索提供商（容量测试）
+
+DEEPRESEARCH_PROVIDER=mock 时，检索不访问任何外部 API，而是由 MockSearchBackend 生成 Tavily 格式的结果，
+后续的去重、关键词过滤、来源重排与 OpenRouter 合成走真实路径：
+- 可复现：按种子生成延迟与结果；
+- 延迟分布：fixed / uniform / lognormal，同步模式在检索线程内等待，异步模式 await 不占用事件循环；
+- 结果真实：每条 query 返回数量可变的来源，标题/摘要长度接近真实检索结果，混合高/中/低质量域名，
+  并包含 utm 参数、尾斜杠、http/https 等形式的重复 URL；
+- 故障注入：超时、429 限流、JSON 解析失败，按比例随机触发。
+"""
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from retry_policy import UpstreamError
+
+PREFERRED_HOSTS = ['www.statista.com', 'www.reuters.com', 'www.mckinsey.com', 'www.stats.gov.cn', 'data.worldbank.org']
+NEUTRAL_HOSTS = ['www.36kr.com', 'www.caixin.com', 'techcrunch.com', 'www.ifanr.com', 'www.huxiu.com']
+DEPRIORITIZED_HOSTS = ['zhuanlan.zhihu.com', 'blog.csdn.net', 'www.sohu.com', 'medium.com', 'bbs.example.com']
+FILLER = [
+    '行业', '规模', '增长', '渠道', '用户', '需求', '竞争', '格局', '融资', '政策', '趋势', '成本', '供应链',
+    '渗透率', '复购', '客单价', '转化', '留存', '品牌', '下沉市场', '一线城市', '调研', '报告', '数据显示'
+]
+_TOKEN_RE = re.compile(r'[\w一-鿿]{2,}')
+
+
+class LatencyModel:
+    """延迟分布：fixed:<秒> | uniform:<最小>:<最大> | lognormal:<中位数>:<sigma>"""
+
+    def __init__(self, kind: str = 'fixed', first: float = 0.0, second: float = 0.0, seed: Optional[int] = None):
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f'未知的延迟分布: {kind}')
+        self.kind = kind
+        self.first = float(first)
+        self.second = float(second)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: Optional[int] = None) -> 'LatencyModel':
+        parts = (spec or 'fixed:0').split(':')
+        values = [float(value) for value in parts[1:]] + [0.0, 0.0]
+        return cls(parts[0], values[0], values[1], seed=seed)
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == 'uniform':
+                return self._rng.uniform(self.first, max(self.first, self.second))
+            if self.kind == 'lognormal':
+                return self._rng.lognormvariate(math.log(max(self.first, 1e-6)), self.second)
+            return self.first
+
+    def describe(self) -> str:
+        if self.kind == 'fixed':
+            return f'fixed:{self.first:g}'
+        return f'{self.kind}:{self.first:g}:{self.second:g}'
+
+
+def _parse_range(spec: str, default: Tuple[int, int]) -> Tuple[int, int]:
+    """解析 "5:15" 形式的数量范围"""
+    try:
+        low, _, high = (spec or '').partition(':')
+        low = max(0, int(low))
+        return low, max(low, int(high or low))
+    except ValueError:
+        return default
+
+
+class SyntheticSources:
+    """生成 Tavily 格式的合成检索结果"""
+
+    def __init__(
+        self,
+        rng: random.Random,
+        duplicate_rate: float = 0.15,
+        relevant_rate: float = 0.7,
+        title_chars: Tuple[int, int] = (12, 48),
+        snippet_chars: Tuple[int, int] = (150, 800)
+    ):
+        self.rng = rng
+        self.duplicate_rate = duplicate_rate
+        self.relevant_rate = relevant_rate
+        self.title_chars = title_chars
+        self.snippet_chars = snippet_chars
+
+    def _text(self, terms: List[str], length: int) -> str:
+        parts = []
+        size = 0
+        while size < length:
+            word = self.rng.choice(terms) if terms and self.rng.random() < 0.35 else self.rng.choice(FILLER)
+            parts.append(word)
+            size += len(word)
+            if self.rng.random() < 0.12:
+                parts.append('，' if self.rng.random() < 0.7 else '。')
+                size += 1
+        return ''.join(parts)[:length]
+
+    def _host(self) -> str:
+        roll = self.rng.random()
+        if roll < 0.4:
+            return self.rng.choice(PREFERRED_HOSTS)
+        if roll < 0.75:
+            return self.rng.choice(NEUTRAL_HOSTS)
+        return self.rng.choice(DEPRIORITIZED_HOSTS)
+
+    def _duplicate_url(self, url: str) -> str:
+        variant = self.rng.randrange(4)
+        if variant == 0:
+            return url + ('&' if '?' in url else '?') + 'utm_source=mock&utm_medium=search'
+        if variant == 1:
+            return url + '/'
+        if variant == 2:
+            return url.replace('https://', 'http://', 1)
+        return url.replace('://www.', '://', 1) if '://www.' in url else url + '#section'
+
+    def generate(self, query: str, count: int) -> List[Dict[str, Any]]:
+        terms = _TOKEN_RE.findall(query.lower())[:12]
+        results = []
+        for index in range(count):
+            if results and self.rng.random() < self.duplicate_rate:
+                original = self.rng.choice(results)
+                results.append(dict(
+                    original,
+                    url=self._duplicate_url(original['url']),
+                    score=round(max(0.0, original['score'] - self.rng.uniform(0, 0.1)), 3)
+                ))
+                continue
+            relevant = self.rng.random() < self.relevant_rate
+            topic_terms = terms if relevant else []
+            title = self._text(topic_terms, self.rng.randint(*self.title_chars))
+            snippet = self._text(topic_terms, self.rng.randint(*self.snippet_chars))
+            results.append({
+                'title': title,
+                'url': f'https://{self._host()}/article/{self.rng.randrange(10 ** 8):08d}',
+                'content': snippet,
+                'score': round(self.rng.uniform(0.55, 0.98) if relevant else self.rng.uniform(0.2, 0.6), 3)
+            })
+        return results
+
+
+class MockSearchBackend:
+    """可复现、可注入故障的模拟检索后端（线程安全）"""
+
+    def __init__(
+        self,
+        seed: Optional[int] = 42,
+        latency: Optional[LatencyModel] = None,
+        results: Tuple[int, int] = (5, 15),
+        duplicate_rate: float = 0.15,
+        timeout_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        malformed_rate: float = 0.0,
+        timeout_seconds: float = 10.0,
+        sleep: Callable[[float], None] = time.sleep
+    ):
+        """
+        Args:
+            seed: 随机种子，None 表示不固定
+            latency: 单条 query 的延迟分布
+            results: 每条 query 返回的结果数范围（含重复 URL）
+            duplicate_rate: 结果中重复 URL 的比例
+            timeout_rate / rate_limit_rate / malformed_rate: 超时、429、JSON 解析失败的触发概率
+            timeout_seconds: 注入超时前的等待时间
+        """
+        self.latency = latency or LatencyModel('fixed', 0.0, seed=seed)
+        self.results = results
+        self.timeout_rate = timeout_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.timeout_seconds = timeout_seconds
+        self._sleep = sleep
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._sources = SyntheticSources(self._rng, duplicate_rate=duplicate_rate)
+        self.calls = 0
+        self.faults = {'timeout': 0, 'rate_limit': 0, 'malformed': 0}
+
+    @classmethod
+    def from_env(cls) -> 'MockSearchBackend':
+        seed = os.getenv('DEEPRESEARCH_MOCK_SEED', '42')
+        seed = int(seed) if seed.strip().lstrip('-').isdigit() else None
+        return cls(
+            seed=seed,
+            latency=LatencyModel.parse(os.getenv('DEEPRESEARCH_MOCK_LATENCY', 'lognormal:0.6:0.5'), seed=seed),
+            results=_parse_range(os.getenv('DEEPRESEARCH_MOCK_RESULTS', '5:15'), (5, 15)),
+            duplicate_rate=float(os.getenv('DEEPRESEARCH_MOCK_DUPLICATE_RATE', 0.15)),
+            timeout_rate=float(os.getenv('DEEPRESEARCH_MOCK_TIMEOUT_RATE', 0)),
+            rate_limit_rate=float(os.getenv('DEEPRESEARCH_MOCK_RATE_LIMIT_RATE', 0)),
+            malformed_rate=float(os.getenv('DEEPRESEARCH_MOCK_MALFORMED_RATE', 0)),
+            timeout_seconds=float(os.getenv('DEEPRESEARCH_MOCK_TIMEOUT_SECONDS', 10))
+        )
+
+    def _plan(self, query: str) -> Tuple[Optional[str], float, str]:
+        """抽取本次调用的故障类型、延迟与响应体（在锁内完成，保证同一种子下顺序可复现）"""
+        with self._lock:
+            self.calls += 1
+            roll = self._rng.random()
+            fault = None
+            if roll < self.timeout_rate:
+                fault = 'timeout'
+            elif roll < self.timeout_rate + self.rate_limit_rate:
+                fault = 'rate_limit'
+            elif roll < self.timeout_rate + self.rate_limit_rate + self.malformed_rate:
+                fault = 'malformed'
+            if fault:
+                self.faults[fault] += 1
+            count = self._rng.randint(*self.results)
+            results = self._sources.generate(query, count)
+        payload = json.dumps({
+            'query': query,
+            'answer': f'{query[:60]} 的检索摘要（模拟数据）。',
+            'results': results,
+            'response_time': 0.0
+        }, ensure_ascii=False)
+        if fault == 'malformed':
+            payload = payload[:max(1, len(payload) // 2)]
+        return fault, self.latency.sample(), payload
+
+    @staticmethod
+    def _respond(fault: Optional[str], payload: str) -> Dict[str, Any]:
+        if fault == 'timeout':
+            raise TimeoutError('模拟检索超时')
+        if fault == 'rate_limit':
+            raise UpstreamError('模拟检索限流: 429 Too Many Requests', 429)
+        # 与真实提供商一样解析响应体，malformed 时抛出 JSONDecodeError
+        return json.loads(payload)
+
+    def search(self, query: str) -> Dict[str, Any]:
+        fault, delay, payload = self._plan(query)
+        self._sleep(self.timeout_seconds if fault == 'timeout' else delay)
+        return self._respond(fault, payload)
+
+    async def asearch(self, query: str) -> Dict[str, Any]:
+        fault, delay, payload = self._plan(query)
+        await asyncio.sleep(self.timeout_seconds if fault == 'timeout' else delay)
+        return self._respond(fault, payload)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'latency': self.latency.describe(), 'calls': self.calls, 'faults': dict(self.faults)}
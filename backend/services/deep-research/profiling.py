@@ -0,0 +1,161 @@
+"""
+按请求开启的性能剖析
+
+请求携带 X-DeepResearch-Profile: 1 请求头或 ?profile=1 参数时，用 cProfile 剖析该次请求，
+结果写入 DEEPRESEARCH_PROFILE_DIR（.prof，可用 snakeviz / pstats 查看），
+并可通过 GET /debug/profiles/<id> 查看按累计耗时排序的文本报告。
+
+默认关闭（DEEPRESEARCH_PROFILING=1 时才响应剖析请求）；未请求剖析时不做任何额外工作。
+cProfile 只记录处理请求的线程，并发检索 query 的耗时体现在等待结果的调用上，各阶段耗时见响应中的 timings。
+"""
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = 'X-DeepResearch-Profile'
+PROFILE_PARAM = 'profile'
+
+_TRUTHY = {'1', 'true', 'yes', 'on'}
+_PROFILE_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+
+class ProfileRecord:
+    """一次剖析的结果信息（写入响应的 profile 字段）"""
+
+    __slots__ = ('profile_id', 'label', 'path', 'elapsed', 'skipped')
+
+    def __init__(self, profile_id: str, label: str, path: Path):
+        self.profile_id = profile_id
+        self.label = label
+        self.path = path
+        self.elapsed = 0.0
+        self.skipped = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.skipped:
+            return {'skipped': self.skipped}
+        return {
+            'id': self.profile_id,
+            'label': self.label,
+            'path': str(self.path),
+            'url': f'/debug/profiles/{self.profile_id}',
+            'elapsed_time': round(self.elapsed, 3)
+        }
+
+
+class RequestProfiler:
+    """按请求开启的 cProfile 剖析器"""
+
+    def __init__(self, directory, enabled: bool = False, keep: int = 50):
+        """
+        Args:
+            directory: .prof 文件输出目录
+            enabled: 是否响应剖析请求
+            keep: 目录中最多保留的剖析文件数，超出时删除最旧的
+        """
+        self.directory = Path(directory)
+        self.enabled = bool(enabled)
+        self.keep = max(1, int(keep))
+        # 同一时刻只剖析一个请求：解释器级的 profile 钩子不支持多个剖析器同时开启
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> 'RequestProfiler':
+        return cls(
+            directory=os.getenv('DEEPRESEARCH_PROFILE_DIR') or Path(tempfile.gettempdir()) / 'deepresearch-profiles',
+            enabled=os.getenv('DEEPRESEARCH_PROFILING', '0').strip().lower() in _TRUTHY,
+            keep=int(os.getenv('DEEPRESEARCH_PROFILE_KEEP', 50))
+        )
+
+    def requested(self, headers: Mapping[str, str], args: Mapping[str, str]) -> bool:
+        """请求头或查询参数是否要求剖析（未开启时始终为 False）"""
+        if not self.enabled:
+            return False
+        value = headers.get(PROFILE_HEADER) or args.get(PROFILE_PARAM) or ''
+        return str(value).strip().lower() in _TRUTHY
+
+    @contextmanager
+    def profile(self, label: str, requested: bool = True):
+        """
+        剖析 with 块内的执行
+
+        Yields:
+            ProfileRecord；未请求剖析时为 None。已有请求在剖析时不剖析，record.skipped 说明原因
+        """
+        if not requested:
+            yield None
+            return
+
+        profile_id = uuid.uuid4().hex
+        record = ProfileRecord(profile_id, label, self.directory / f'{profile_id}.prof')
+        if not self._lock.acquire(blocking=False):
+            record.skipped = '已有请求正在剖析'
+            yield record
+            return
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            profiler.enable()
+            try:
+                yield record
+            finally:
+                profiler.disable()
+                record.elapsed = time.perf_counter() - started
+        finally:
+            self._lock.release()
+            self._save(profiler, record)
+
+    def _save(self, profiler: cProfile.Profile, record: ProfileRecord) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            profiler.dump_stats(str(record.path))
+            self._prune()
+            logger.info(f'请求剖析已保存: {record.label}, {record.path}')
+        except OSError as save_error:
+            record.skipped = f'剖析结果保存失败: {save_error}'
+            logger.warning(record.skipped)
+
+    def _prune(self) -> None:
+        files = sorted(self.directory.glob('*.prof'), key=lambda path: path.stat().st_mtime)
+        for path in files[:-self.keep]:
+            try:
+                path.unlink()
+            except OSError:
+                continue
+
+    def path_for(self, profile_id: str) -> Optional[Path]:
+        if not _PROFILE_ID_RE.match(profile_id or ''):
+            return None
+        path = self.directory / f'{profile_id}.prof'
+        return path if path.is_file() else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        if not self.directory.is_dir():
+            return []
+        files = sorted(self.directory.glob('*.prof'), key=lambda path: path.stat().st_mtime, reverse=True)
+        return [{'id': path.stem, 'created_at': path.stat().st_mtime} for path in files]
+
+    def report(self, profile_id: str, sort: str = 'cumulative', limit: int = 60) -> Optional[str]:
+        """按 sort 排序的 pstats 文本报告；剖析结果不存在时返回 None"""
+        path = self.path_for(profile_id)
+        if path is None:
+            return None
+        if sort not in ('cumulative', 'tottime', 'ncalls'):
+            sort = 'cumulative'
+        output = io.StringIO()
+        stats = pstats.Stats(str(path), stream=output)
+        stats.strip_dirs().sort_stats(sort).print_stats(max(1, int(limit)))
+        return output.getvalue()
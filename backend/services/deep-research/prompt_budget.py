@@ -0,0 +1,124 @@
+"""
+提示词 token 预算
+
+估算提示词 token 数，并在超出预算时按以下顺序裁剪：
+1. 对话占预算一半以上时，先移除最早的对话轮次；
+2. 移除相关度最低的来源（至少保留 min_sources 条）；
+3. 继续移除最早的对话轮次（至少保留最后一轮）；
+4. 截断最后一轮对话的中间部分。
+"""
+import re
+from typing import Any, Callable, Dict, List, Tuple
+
+_CJK_RE = re.compile(r'[　-〿㐀-䶿一-鿿＀-￯]')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符按 1 个 token，其余按 4 个字符 1 个 token"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+class BudgetReport:
+    """一次预算裁剪的结果统计"""
+
+    def __init__(self, budget: int, original_tokens: int):
+        self.budget = budget
+        self.original_tokens = original_tokens
+        self.final_tokens = original_tokens
+        self.dropped_sources = 0
+        self.dropped_turns = 0
+        self.truncated = False
+
+    @property
+    def saved_tokens(self) -> int:
+        return max(0, self.original_tokens - self.final_tokens)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'budget': self.budget,
+            'originalTokens': self.original_tokens,
+            'finalTokens': self.final_tokens,
+            'savedTokens': self.saved_tokens,
+            'droppedSources': self.dropped_sources,
+            'droppedTurns': self.dropped_turns,
+            'truncated': self.truncated
+        }
+
+
+def _truncate_middle(text: str, keep_chars: int) -> str:
+    if len(text) <= keep_chars:
+        return text
+    head = keep_chars * 2 // 3
+    tail = keep_chars - head
+    return f"{text[:head]}\n……（中间内容已省略）……\n{text[-tail:] if tail else ''}"
+
+
+def fit_to_budget(
+    render: Callable[[List[Dict[str, Any]], List[Dict[str, Any]]], str],
+    turns: List[Dict[str, Any]],
+    sources: List[Dict[str, Any]],
+    budget: int,
+    min_sources: int = 3,
+    full_tokens: int = None
+) -> Tuple[str, List[Dict[str, Any]], List[Dict[str, Any]], BudgetReport]:
+    """
+    在 token 预算内渲染提示词
+
+    Args:
+        render: (对话轮次, 来源) -> 提示词
+        turns: 对话轮次（按时间顺序）
+        sources: 来源（按相关度降序）
+        budget: 输入 token 上限，<=0 表示不限制
+        full_tokens: 未去除重复区块前的 token 数，用于统计节省量
+
+    Returns:
+        (提示词, 保留的对话轮次, 保留的来源, BudgetReport)
+    """
+    turns = list(turns)
+    sources = list(sources)
+    prompt = render(turns, sources)
+    tokens = estimate_tokens(prompt)
+    report = BudgetReport(budget, max(tokens, full_tokens or 0))
+    report.final_tokens = tokens
+    if budget <= 0 or tokens <= budget:
+        return prompt, turns, sources, report
+
+    def conversation_tokens():
+        return sum(estimate_tokens(str(turn.get('content', ''))) for turn in turns)
+
+    def rerender():
+        nonlocal prompt, tokens
+        prompt = render(turns, sources)
+        tokens = estimate_tokens(prompt)
+
+    while tokens > budget and len(turns) > 1 and conversation_tokens() > budget // 2:
+        turns.pop(0)
+        report.dropped_turns += 1
+        rerender()
+
+    while tokens > budget and len(sources) > min_sources:
+        sources.pop()
+        report.dropped_sources += 1
+        rerender()
+
+    while tokens > budget and len(turns) > 1:
+        turns.pop(0)
+        report.dropped_turns += 1
+        rerender()
+
+    if tokens > budget and turns:
+        last = dict(turns[-1])
+        content = str(last.get('content', ''))
+        overflow = tokens - budget
+        content_tokens = max(1, estimate_tokens(content))
+        keep_ratio = max(0.0, (content_tokens - overflow) / content_tokens)
+        last['content'] = _truncate_middle(content, int(len(content) * keep_ratio * 0.95))
+        turns[-1] = last
+        report.truncated = True
+        rerender()
+
+    report.final_tokens = tokens
+    return prompt, turns, sources, report
@@ -0,0 +1,192 @@
+"""
+提示词模板注册表
+
+启动时预加载 prompts/scene-1-dialogue/deep-research 下全部 .md 模板（去除 frontmatter），
+并编译为“字面量 + 占位符”片段，渲染时单次拼接，代入的对话文本不会被再次扫描。
+
+请求路径不做文件 I/O：模板变更由文件监听（watchdog 可用时）或后台限频轮询发现后重新编译。
+"""
+import logging
+import os
+import re
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover - 未安装 watchdog 时使用后台轮询
+    FileSystemEventHandler = object
+    Observer = None
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER_RE = re.compile(r'\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+
+def strip_frontmatter(content: str) -> str:
+    if content.startswith('---'):
+        parts = content.split('---', 2)
+        if len(parts) == 3:
+            return parts[2].strip()
+    return content.strip()
+
+
+class CompiledTemplate:
+    """编译后的模板：literals 与 names 交替排列，len(literals) == len(names) + 1"""
+
+    __slots__ = ('source', 'literals', 'names')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.literals: List[str] = []
+        self.names: List[str] = []
+        position = 0
+        for match in _PLACEHOLDER_RE.finditer(source):
+            self.literals.append(source[position:match.start()])
+            self.names.append(match.group(1))
+            position = match.end()
+        self.literals.append(source[position:])
+
+    @property
+    def placeholders(self) -> frozenset:
+        return frozenset(self.names)
+
+    def render(self, **values: str) -> str:
+        """单次渲染；未提供取值的占位符原样保留"""
+        parts = [self.literals[0]]
+        for name, literal in zip(self.names, self.literals[1:]):
+            value = values.get(name)
+            parts.append('{' + name + '}' if value is None else str(value))
+            parts.append(literal)
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=256)
+def compile_template(source: str) -> CompiledTemplate:
+    """按模板文本缓存编译结果（兜底模板与派生模板使用）"""
+    return CompiledTemplate(source)
+
+
+class _ChangeHandler(FileSystemEventHandler):
+    def __init__(self, registry: 'TemplateRegistry'):
+        super().__init__()
+        self.registry = registry
+
+    def on_any_event(self, event):
+        if not getattr(event, 'is_directory', False):
+            self.registry.refresh()
+
+
+class TemplateRegistry:
+    """提示词模板注册表"""
+
+    def __init__(self, root, poll_interval: float = 2.0):
+        """
+        Args:
+            root: 模板根目录
+            poll_interval: 后台轮询间隔（秒），<=0 时不监听变更
+        """
+        self.root = Path(root)
+        self.poll_interval = float(poll_interval)
+        self._lock = threading.Lock()
+        self._templates: Dict[str, Tuple[float, CompiledTemplate]] = {}
+        self._stop = threading.Event()
+        self._watcher = None
+        self.reloads = 0
+        self.refresh()
+
+    @classmethod
+    def from_env(cls, root) -> 'TemplateRegistry':
+        return cls(root, poll_interval=float(os.getenv('DEEPRESEARCH_PROMPT_POLL_INTERVAL', 2)))
+
+    def _scan(self) -> Dict[str, float]:
+        mtimes = {}
+        if not self.root.is_dir():
+            return mtimes
+        for path in self.root.rglob('*.md'):
+            try:
+                mtimes[path.relative_to(self.root).as_posix()] = path.stat().st_mtime
+            except OSError:
+                continue
+        return mtimes
+
+    def refresh(self) -> int:
+        """重新扫描模板目录，编译新增或变更的模板，返回变更数量"""
+        with self._lock:
+            mtimes = self._scan()
+            current = dict(self._templates)
+            changed = 0
+            for relative_path, mtime in mtimes.items():
+                cached = current.get(relative_path)
+                if cached and cached[0] == mtime:
+                    continue
+                try:
+                    content = (self.root / relative_path).read_text(encoding='utf-8')
+                except OSError as read_error:
+                    logger.warning(f'Prompt模板读取失败: {relative_path}, {read_error}')
+                    continue
+                current[relative_path] = (mtime, CompiledTemplate(strip_frontmatter(content)))
+                changed += 1
+                if cached:
+                    logger.info(f'Prompt热更新加载: {relative_path}')
+            for relative_path in set(current) - set(mtimes):
+                del current[relative_path]
+                changed += 1
+            if changed:
+                # 整体替换字典，读路径无需加锁
+                if self._templates:
+                    self.reloads += 1
+                self._templates = current
+            return changed
+
+    def get(self, relative_path: str, fallback='') -> CompiledTemplate:
+        """返回编译后的模板；文件不存在时返回兜底模板（文本或已编译的模板）"""
+        entry = self._templates.get(relative_path)
+        if entry is not None:
+            return entry[1]
+        if isinstance(fallback, CompiledTemplate):
+            return fallback
+        return compile_template(fallback)
+
+    def version(self, relative_path: str) -> float:
+        """模板文件的 mtime，不存在时返回 0（使用兜底模板）"""
+        entry = self._templates.get(relative_path)
+        return entry[0] if entry is not None else 0.0
+
+    def start(self) -> None:
+        """启动变更监听：优先使用 watchdog，不可用时启动后台轮询线程"""
+        if self._watcher is not None or self.poll_interval <= 0:
+            return
+        if Observer is not None and self.root.is_dir():
+            observer = Observer()
+            observer.schedule(_ChangeHandler(self), str(self.root), recursive=True)
+            observer.daemon = True
+            observer.start()
+            self._watcher = observer
+            return
+        thread = threading.Thread(target=self._poll, name='prompt-template-poll', daemon=True)
+        thread.start()
+        self._watcher = thread
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.refresh()
+            except Exception as poll_error:  # pragma: no cover - 轮询线程不应退出
+                logger.warning(f'Prompt模板轮询失败: {poll_error}')
+
+    def stop(self) -> None:
+        self._stop.set()
+        if Observer is not None and isinstance(self._watcher, Observer):
+            self._watcher.stop()
+        self._watcher = None
+
+    def stats(self) -> Dict[str, Optional[object]]:
+        return {
+            'templates': len(self._templates),
+            'reloads': self.reloads,
+            'watcher': type(self._watcher).__name__ if self._watcher is not None else None
+        }
@@ -0,0 +1,119 @@
+"""
+请求级对话上下文
+
+一次章节请求中，研究提示词、检索摘要、合成提示词、意图关键词与检索 query
+都依赖同一份对话历史。RequestContext 在请求入口构建一次，
+缓存格式化文本、指纹、意图词与压缩后的对话，供各阶段直接复用。
+
+超长对话按轮次压缩为有界表示：保留首条用户消息（产品创意）与尽可能多的最近轮次，
+单轮内容超长时截断中间部分。
+"""
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from cache import fingerprint
+
+CONVERSATION_MAX_CHARS = int(os.getenv('DEEPRESEARCH_CONVERSATION_MAX_CHARS', 24000))
+TURN_MAX_CHARS = int(os.getenv('DEEPRESEARCH_TURN_MAX_CHARS', 6000))
+INTENT_MAX_KEYWORDS = 20
+
+INTENT_STOPWORDS = frozenset({
+    '的', '了', '和', '与', '及', '或', '以及', '对于', '关于', '基于', '进行', '分析', '如何',
+    '哪些', '什么', '是否', '我们', '你们', '他们', '这个', '那个', '一个', '需要', '可以', '项目',
+    '产品', '市场', '行业', '用户', '公司', '企业', '计划', '报告', '策略', '模式', '核心', '关键'
+})
+_INTENT_SPLIT_RE = re.compile(r'[\s,，。.;；:：/\\\-\(\)\[\]{}"\'\n\r\t]+')
+
+
+def format_turns(turns: List[Dict[str, Any]]) -> str:
+    return '\n'.join(f"{msg.get('role', 'user')}: {msg.get('content', '')}" for msg in turns)
+
+
+def _clip_turn(turn: Dict[str, Any], max_chars: int) -> Dict[str, Any]:
+    content = str(turn.get('content', ''))
+    if len(content) <= max_chars:
+        return turn
+    head = max_chars * 2 // 3
+    tail = max_chars - head
+    clipped = dict(turn)
+    clipped['content'] = f"{content[:head]}\n……（中间内容已省略）……\n{content[-tail:] if tail else ''}"
+    return clipped
+
+
+def compact_turns(
+    turns: List[Dict[str, Any]],
+    max_chars: int = CONVERSATION_MAX_CHARS,
+    turn_max_chars: int = TURN_MAX_CHARS
+) -> List[Dict[str, Any]]:
+    """将对话压缩到约 max_chars 字符以内，保留首条用户消息与最近的轮次（按原顺序）"""
+    clipped = [_clip_turn(turn, turn_max_chars) for turn in turns]
+    if sum(len(str(t.get('content', ''))) for t in clipped) <= max_chars:
+        return clipped
+
+    first_user = next((i for i, t in enumerate(clipped) if t.get('role') == 'user'), None)
+    used = len(str(clipped[first_user].get('content', ''))) if first_user is not None else 0
+    kept = []
+    for index in range(len(clipped) - 1, -1, -1):
+        if index == first_user:
+            continue
+        size = len(str(clipped[index].get('content', '')))
+        if kept and used + size > max_chars:
+            break
+        kept.append(index)
+        used += size
+    if first_user is not None:
+        kept.append(first_user)
+    return [clipped[i] for i in sorted(kept)]
+
+
+class RequestContext:
+    """对话历史的一次性预处理结果（只读）"""
+
+    __slots__ = ('raw', 'is_turn_list', 'turns', 'text', 'fingerprint', 'user_messages', 'intent_tokens')
+
+    def __init__(self, conversation_history: Any):
+        self.raw = conversation_history
+        self.is_turn_list = isinstance(conversation_history, list)
+        if self.is_turn_list:
+            self.turns = compact_turns(conversation_history)
+            self.text = format_turns(self.turns)
+            # 指纹基于完整对话，保证压缩不会让不同对话共享缓存
+            self.fingerprint = fingerprint(format_turns(conversation_history))
+        else:
+            text = str(conversation_history)
+            self.turns = [_clip_turn({'role': 'user', 'content': text}, CONVERSATION_MAX_CHARS)]
+            self.text = self.turns[0]['content']
+            self.fingerprint = fingerprint(text)
+        self.user_messages = [str(t.get('content', '')) for t in self.turns if t.get('role') == 'user']
+        self.intent_tokens = self._intent_tokens(self.text)
+
+    @classmethod
+    def of(cls, conversation_history: Any) -> 'RequestContext':
+        """已是 RequestContext 时原样返回，否则构建"""
+        if isinstance(conversation_history, cls):
+            return conversation_history
+        return cls(conversation_history)
+
+    @staticmethod
+    def _intent_tokens(text: str) -> tuple:
+        tokens = []
+        seen = set()
+        for token in _INTENT_SPLIT_RE.split(text.lower()):
+            if len(token) < 2 or token in INTENT_STOPWORDS or token in seen:
+                continue
+            seen.add(token)
+            tokens.append(token)
+            if len(tokens) >= INTENT_MAX_KEYWORDS:
+                break
+        return tuple(tokens)
+
+    @property
+    def last_user_message(self) -> Optional[str]:
+        return self.user_messages[-1] if self.user_messages else None
+
+    def format(self, turns: List[Dict[str, Any]]) -> str:
+        """格式化部分轮次（如预算裁剪后的对话），与 text 的格式保持一致"""
+        if self.is_turn_list:
+            return format_turns(turns)
+        return turns[0]['content'] if turns else ''
@@ -0,0 +1,406 @@
+"""
+上游调用重试策略
+
+所有 OpenRouter（chat.completions.create）与检索提供商调用统一经过 RetryPolicy：
+- 错误分类：超时/连接错误、408/409/425/429/5xx 可重试；鉴权失败与其余 4xx 直接失败；
+- 带抖动的指数退避（full jitter），429 优先遵循 Retry-After；
+- 可选对冲请求：调用耗时超过该调用历史延迟的指定分位数时再发一份，取先完成者；
+  主调用在调用方线程/协程中执行，只有备份请求另起线程，同时在途的备份请求数有上限，
+  先完成者胜出后取消另一份的截止时间（异步模式直接取消协程）；
+- 遵循请求截止时间（deadlines.py）：每次尝试前检查剩余时间与取消状态，退避等待超过剩余时间时不再重试，
+  等待期间被取消（如检索批次被放弃）时提前结束。
+
+默认值取自 config.Config（MAX_RETRIES / RETRY_DELAY）。
+"""
+import asyncio
+import contextvars
+import logging
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import deadlines
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE = 'retryable'
+FATAL = 'fatal'
+
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504}
+_RETRYABLE_NAMES = {
+    'APITimeoutError', 'APIConnectionError', 'TimeoutException', 'TransportError',
+    'ConnectError', 'ReadTimeout', 'ConnectTimeout', 'RemoteProtocolError', 'ReadError'
+}
+
+
+class UpstreamError(Exception):
+    """携带上游 HTTP 状态码的调用失败"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class RetriesExhausted(Exception):
+    """可重试错误在重试次数用尽后仍失败（服务内部已重试，调用方不应整体重试）"""
+
+    def __init__(self, name: str, attempts: int, last_error: BaseException):
+        super().__init__(f'{name} 重试{attempts}次后仍失败: {last_error}')
+        self.name = name
+        self.attempts = attempts
+        self.last_error = last_error
+
+
+def find_error(error: BaseException, error_type: type) -> Optional[BaseException]:
+    """沿异常链（__cause__ / __context__）查找指定类型的异常"""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        if isinstance(error, error_type):
+            return error
+        seen.add(id(error))
+        error = error.__cause__ or error.__context__
+    return None
+
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        response = getattr(error, 'response', None)
+        status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+
+def classify_error(error: BaseException) -> str:
+    """返回 RETRYABLE 或 FATAL"""
+    status = status_code_of(error)
+    if status is not None:
+        return RETRYABLE if status in RETRYABLE_STATUS or status >= 500 else FATAL
+    if isinstance(error, (TimeoutError, ConnectionError, asyncio.TimeoutError)):
+        return RETRYABLE
+    for cls in type(error).__mro__:
+        if cls.__name__ in _RETRYABLE_NAMES:
+            return RETRYABLE
+    return FATAL
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return max(0.0, float(headers.get('retry-after')))
+    except (TypeError, ValueError):
+        return None
+
+
+class _LatencyWindow:
+    def __init__(self, size: int):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100.0))
+        return ordered[index]
+
+
+class _HedgedCall:
+    """一次同步对冲调用的共享状态（主调用在调用方线程，备份在计时线程）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.winner = None
+        self.result = None
+        self.closed = False
+        self.backup_started = False
+        self.backup_error: Optional[BaseException] = None
+        self.backup_done = threading.Event()
+
+    def settle(self, winner: str, result: Any) -> bool:
+        """记录先成功的一方，已有胜者时返回 False"""
+        with self.lock:
+            if self.winner is not None:
+                return False
+            self.winner, self.result = winner, result
+            return True
+
+
+class RetryPolicy:
+    """重试 / 退避 / 对冲策略（线程安全，进程内共享）"""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 1.0,
+        max_delay: float = 20.0,
+        hedge_percentile: float = 0.0,
+        hedge_min_samples: int = 20,
+        latency_window: int = 200,
+        max_hedges: int = 8,
+        sleep: Optional[Callable[[float], None]] = None
+    ):
+        """
+        Args:
+            max_retries: 首次调用之外的最大重试次数
+            base_delay: 退避基数（秒），第 n 次重试最多等待 base_delay * 2^n
+            max_delay: 单次退避上限（秒）
+            hedge_percentile: 对冲触发分位数（如 95），0 表示关闭对冲
+            hedge_min_samples: 历史样本不足时不对冲
+            max_hedges: 同时在途的备份请求上限（所有调用共享），已满时不再对冲
+            sleep: 退避等待函数，默认可被请求取消打断（deadlines.sleep）
+        """
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = max(0.0, float(base_delay))
+        self.max_delay = max(self.base_delay, float(max_delay))
+        self.hedge_percentile = float(hedge_percentile)
+        self.hedge_min_samples = max(1, int(hedge_min_samples))
+        self._latency_window = latency_window
+        self._latencies: Dict[str, _LatencyWindow] = {}
+        self._lock = threading.Lock()
+        self._sleep = sleep or deadlines.sleep
+        self.max_hedges = max(1, int(max_hedges))
+        self._hedge_slots = threading.BoundedSemaphore(self.max_hedges)
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def from_config(cls, config) -> 'RetryPolicy':
+        return cls(
+            max_retries=config.MAX_RETRIES,
+            base_delay=config.RETRY_DELAY / 1000.0,
+            max_delay=float(os.getenv('DEEPRESEARCH_RETRY_MAX_DELAY', 20)),
+            hedge_percentile=float(os.getenv('DEEPRESEARCH_HEDGE_PERCENTILE', 0)),
+            hedge_min_samples=int(os.getenv('DEEPRESEARCH_HEDGE_MIN_SAMPLES', 20)),
+            max_hedges=int(os.getenv('DEEPRESEARCH_HEDGE_MAX_IN_FLIGHT', 8))
+        )
+
+    # ------------------------------------------------------------------
+    # 统计
+    # ------------------------------------------------------------------
+
+    def _count(self, name: str, field: str, amount: int = 1) -> None:
+        with self._lock:
+            counters = self._counters.setdefault(name, {
+                'calls': 0, 'attempts': 0, 'retries': 0, 'failures': 0,
+                'hedges': 0, 'hedge_wins': 0, 'hedges_skipped': 0
+            })
+            counters[field] += amount
+
+    def _window(self, name: str) -> _LatencyWindow:
+        window = self._latencies.get(name)
+        if window is None:
+            with self._lock:
+                window = self._latencies.setdefault(name, _LatencyWindow(self._latency_window))
+        return window
+
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """该调用的对冲触发延迟；未开启或样本不足时返回 None"""
+        if self.hedge_percentile <= 0:
+            return None
+        return self._window(name).percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {name: dict(counters) for name, counters in self._counters.items()}
+
+    def backoff(self, retry: int, error: Optional[BaseException] = None) -> float:
+        """第 retry 次重试（从 0 开始）前的等待时间"""
+        retry_after = _retry_after(error) if error is not None else None
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+    # ------------------------------------------------------------------
+    # 同步调用
+    # ------------------------------------------------------------------
+
+    def call(self, fn: Callable[[], Any], name: str, hedge: bool = False, max_retries: Optional[int] = None) -> Any:
+        """
+        按策略执行 fn
+
+        Args:
+            name: 调用名称（统计与延迟分位数按名称区分），如 'openrouter.synthesis'
+            hedge: 是否允许对冲（仅用于幂等且代价较低的调用）
+            max_retries: 覆盖默认重试次数
+        """
+        retries = self.max_retries if max_retries is None else max(0, int(max_retries))
+        self._count(name, 'calls')
+        for retry in range(retries + 1):
+            deadlines.check(name)
+            self._count(name, 'attempts')
+            started = time.monotonic()
+            try:
+                result = self._call_hedged(fn, name) if hedge else fn()
+            except Exception as error:
+                if classify_error(error) == FATAL:
+                    self._count(name, 'failures')
+                    raise
+                if retry >= retries:
+                    self._count(name, 'failures')
+                    if retries == 0:
+                        raise
+                    raise RetriesExhausted(name, retries, error) from error
+                delay = self.backoff(retry, error)
+                self._check_budget(name, delay, error)
+                self._count(name, 'retries')
+                logger.warning(f'{name} 调用失败，{delay:.2f}s 后第{retry + 1}次重试: {error}')
+                self._sleep(delay)
+                continue
+            self._window(name).add(time.monotonic() - started)
+            return result
+
+    def _check_budget(self, name: str, delay: float, error: BaseException) -> None:
+        """退避等待后已超过请求截止时间时不再重试"""
+        deadline = deadlines.current()
+        if deadline is not None and deadline.remaining() <= delay:
+            self._count(name, 'failures')
+            raise deadlines.DeadlineExceeded(name, deadline.budget) from error
+
+    def _acquire_hedge(self, name: str) -> bool:
+        """占用一个备份请求名额；已满时记录 hedges_skipped 并返回 False"""
+        if self._hedge_slots.acquire(blocking=False):
+            self._count(name, 'hedges')
+            return True
+        self._count(name, 'hedges_skipped')
+        return False
+
+    def _call_hedged(self, fn: Callable[[], Any], name: str) -> Any:
+        delay = self.hedge_delay(name)
+        if delay is None:
+            return fn()
+        # 两份调用各自在独立的子截止时间内执行，胜者确定后取消另一份（退避等待、阶段检查随之结束）
+        primary_deadline = deadlines.detach(math.inf)
+        backup_deadline = deadlines.detach(math.inf)
+        call = _HedgedCall()
+        # 备份调用沿用请求上下文（截止时间、阶段耗时）；延迟从主调用开始时计算
+        timer = threading.Timer(delay, self._run_backup, args=(
+            fn, name, contextvars.copy_context(), call, backup_deadline, primary_deadline
+        ))
+        timer.daemon = True
+        timer.start()
+
+        primary_error = None
+        try:
+            with deadlines.scope(primary_deadline):
+                result = fn()
+        except Exception as error:
+            primary_error = error
+        finally:
+            timer.cancel()
+            with call.lock:
+                call.closed = True
+                backup_started = call.backup_started
+
+        if primary_error is None and call.settle('primary', result):
+            backup_deadline.cancel()
+            return result
+        if call.winner == 'backup':
+            return call.result
+        if not backup_started:
+            raise primary_error
+        # 主调用失败而备份仍在进行：等待备份结果
+        call.backup_done.wait()
+        if call.winner == 'backup':
+            return call.result
+        raise call.backup_error or primary_error
+
+    def _run_backup(self, fn, name, context, call: _HedgedCall, backup_deadline, primary_deadline) -> None:
+        """计时线程：主调用超过对冲延迟仍未结束时发起备份调用"""
+        with call.lock:
+            if call.closed or not self._acquire_hedge(name):
+                return
+            call.backup_started = True
+        try:
+            result = context.run(self._scoped_call, fn, backup_deadline)
+        except Exception as error:
+            call.backup_error = error
+        else:
+            if call.settle('backup', result):
+                self._count(name, 'hedge_wins')
+                primary_deadline.cancel()
+        finally:
+            self._hedge_slots.release()
+            call.backup_done.set()
+
+    @staticmethod
+    def _scoped_call(fn: Callable[[], Any], deadline) -> Any:
+        with deadlines.scope(deadline):
+            return fn()
+
+    # ------------------------------------------------------------------
+    # 异步调用
+    # ------------------------------------------------------------------
+
+    async def acall(
+        self,
+        fn: Callable[[], Awaitable[Any]],
+        name: str,
+        hedge: bool = False,
+        max_retries: Optional[int] = None
+    ) -> Any:
+        """call 的异步版本，fn 每次调用返回新的协程"""
+        retries = self.max_retries if max_retries is None else max(0, int(max_retries))
+        self._count(name, 'calls')
+        for retry in range(retries + 1):
+            deadlines.check(name)
+            self._count(name, 'attempts')
+            started = time.monotonic()
+            try:
+                result = await (self._acall_hedged(fn, name) if hedge else fn())
+            except Exception as error:
+                if classify_error(error) == FATAL:
+                    self._count(name, 'failures')
+                    raise
+                if retry >= retries:
+                    self._count(name, 'failures')
+                    if retries == 0:
+                        raise
+                    raise RetriesExhausted(name, retries, error) from error
+                delay = self.backoff(retry, error)
+                self._check_budget(name, delay, error)
+                self._count(name, 'retries')
+                logger.warning(f'{name} 调用失败，{delay:.2f}s 后第{retry + 1}次重试: {error}')
+                await asyncio.sleep(delay)
+                continue
+            self._window(name).add(time.monotonic() - started)
+            return result
+
+    async def _acall_hedged(self, fn: Callable[[], Awaitable[Any]], name: str) -> Any:
+        delay = self.hedge_delay(name)
+        primary = asyncio.ensure_future(fn())
+        if delay is None:
+            return await primary
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+
+        if not self._acquire_hedge(name):
+            return await primary
+        backup = asyncio.ensure_future(fn())
+        pending = {primary, backup}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self._count(name, 'hedge_wins')
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            # 异步对冲可真正取消落后的请求
+            for task in pending:
+                task.cancel()
+            self._hedge_slots.release()
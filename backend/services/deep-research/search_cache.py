@@ -0,0 +1,159 @@
+"""
+检索结果持久化缓存
+
+基于本地 SQLite 文件，同一主机上的多个 worker 进程共享；
+支持 TTL、按总字节数淘汰以及 stale-while-revalidate。
+"""
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Any, Optional, Tuple
+
+from cache import fingerprint
+
+
+class SearchResultCache:
+    """检索结果缓存（SQLite）"""
+
+    def __init__(
+        self,
+        path: str,
+        ttl: float = 6 * 3600,
+        stale_ttl: float = 0,
+        max_bytes: int = 64 * 1024 * 1024
+    ):
+        """
+        Args:
+            path: SQLite 文件路径
+            ttl: 新鲜期（秒）
+            stale_ttl: 过期后仍可返回旧值并后台刷新的宽限期（秒），0 表示关闭
+            max_bytes: 缓存内容总字节上限，超出时按最近访问时间淘汰
+        """
+        self.path = path
+        self.ttl = float(ttl)
+        self.stale_ttl = float(stale_ttl)
+        self.max_bytes = int(max_bytes)
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._counter_lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._execute('''
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        ''')
+        self._execute('CREATE INDEX IF NOT EXISTS idx_search_cache_accessed ON search_cache(accessed_at)')
+
+    @classmethod
+    def from_env(cls) -> Optional['SearchResultCache']:
+        """按环境变量创建缓存；DEEPRESEARCH_SEARCH_CACHE=false 时返回 None"""
+        if os.getenv('DEEPRESEARCH_SEARCH_CACHE', 'true').lower() != 'true':
+            return None
+        default_path = os.path.join(tempfile.gettempdir(), 'thinkcraft-deep-research', 'search-cache.sqlite3')
+        return cls(
+            path=os.getenv('DEEPRESEARCH_SEARCH_CACHE_PATH', default_path),
+            ttl=float(os.getenv('DEEPRESEARCH_SEARCH_CACHE_TTL', 6 * 3600)),
+            stale_ttl=float(os.getenv('DEEPRESEARCH_SEARCH_CACHE_STALE_TTL', 0)),
+            max_bytes=int(os.getenv('DEEPRESEARCH_SEARCH_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+        )
+
+    @staticmethod
+    def make_key(provider: str, query: str, search_depth: str, max_results: int) -> str:
+        """规范化 query（大小写/空白）后与检索参数一起生成缓存键"""
+        normalized = ' '.join((query or '').lower().split())
+        return fingerprint(provider, normalized, search_depth, max_results)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()):
+        return self._connection().execute(sql, params)
+
+    def _count(self, field: str) -> None:
+        with self._counter_lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def get(self, key: str) -> Optional[Tuple[Any, bool]]:
+        """
+        读取缓存
+
+        Returns:
+            (value, is_stale)；未命中或已超出宽限期时返回 None
+        """
+        try:
+            row = self._execute(
+                'SELECT payload, created_at FROM search_cache WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            print(f'[SearchCache] 读取失败: {e}')
+            return None
+        if not row:
+            self._count('misses')
+            return None
+
+        payload, created_at = row
+        age = time.time() - created_at
+        if age > self.ttl + self.stale_ttl:
+            self._count('misses')
+            return None
+        stale = age > self.ttl
+        self._count('stale_hits' if stale else 'hits')
+        try:
+            self._execute('UPDATE search_cache SET accessed_at = ? WHERE key = ?', (time.time(), key))
+        except sqlite3.Error:
+            pass
+        return json.loads(payload), stale
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps(value, ensure_ascii=False)
+        now = time.time()
+        try:
+            self._execute(
+                'INSERT OR REPLACE INTO search_cache (key, payload, size, created_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (key, payload, len(payload.encode('utf-8')), now, now)
+            )
+            self._evict(now)
+        except sqlite3.Error as e:
+            print(f'[SearchCache] 写入失败: {e}')
+
+    def _evict(self, now: float) -> None:
+        self._execute('DELETE FROM search_cache WHERE created_at < ?', (now - self.ttl - self.stale_ttl,))
+        total = self._execute('SELECT COALESCE(SUM(size), 0) FROM search_cache').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        overflow = total - self.max_bytes
+        rows = self._execute('SELECT key, size FROM search_cache ORDER BY accessed_at ASC').fetchall()
+        victims = []
+        for key, size in rows:
+            if overflow <= 0:
+                break
+            victims.append((key,))
+            overflow -= size
+        self._connection().executemany('DELETE FROM search_cache WHERE key = ?', victims)
+
+    def stats(self) -> dict:
+        with self._counter_lock:
+            lookups = self.hits + self.stale_hits + self.misses
+            return {
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            }
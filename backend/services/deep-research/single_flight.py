@@ -0,0 +1,540 @@
+"""
+相同请求的合并执行（single-flight）
+
+同一请求指纹同时只执行一次流水线，重复请求（调用方超时重试、用户双击）挂到正在执行的计算上并共享其结果：
+- 进程内：第一个请求为 leader，其余线程/协程等待 leader 的结果（上游异常也原样共享）；
+- 同主机多 worker 进程：通过本地 SQLite 文件登记正在执行的请求，其它进程的重复请求轮询结果；
+- leader 定期续租，进程退出或执行超过 max_runtime 后租约过期，等待方接管重新执行；
+- leader 被中断（自身截止时间耗尽、客户端断开、任务取消、asyncio 取消）不属于等待方的结果，
+  不共享给等待方，由等待方在自己的截止时间内重新竞争执行。
+
+跨进程共享的结果需可 JSON 序列化；leader 失败时其它进程的等待方收到 LeaderFailed，
+其中带有 leader 登记的错误分类（describe_error 给出的响应体与 HTTP 状态码），按与 leader 相同的方式响应。
+等待方最多等待 wait_timeout 与本请求剩余时间（deadlines）中的较小值。
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+import deadlines
+from deadlines import DeadlineExceeded, RequestCancelled
+
+logger = logging.getLogger(__name__)
+
+
+class LeaderFailed(Exception):
+    """其它进程中执行同一请求的 leader 失败"""
+
+    def __init__(self, message: str, status: Optional[int] = None, body: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            status/body: leader 登记的 HTTP 状态码与错误响应体；leader 未登记分类时为 None
+        """
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class FlightTimeout(Exception):
+    """等待正在执行的相同请求超时"""
+
+
+class FlightStore:
+    """跨进程的执行登记与结果交接（SQLite）"""
+
+    def __init__(self, path: str, lease: float = 30, result_ttl: float = 60):
+        """
+        Args:
+            path: SQLite 文件路径
+            lease: leader 租约（秒），超过该时间未续租视为已放弃
+            result_ttl: 执行结束后结果保留的时间（秒），供仍在轮询的等待方读取
+        """
+        self.path = path
+        self.lease = float(lease)
+        self.result_ttl = float(result_ttl)
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._execute('''
+            CREATE TABLE IF NOT EXISTS flights (
+                key TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                status TEXT NOT NULL,
+                payload TEXT,
+                heartbeat_at REAL NOT NULL,
+                finished_at REAL
+            )
+        ''')
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()):
+        return self._connection().execute(sql, params)
+
+    def acquire(self, key: str, owner: str, joined: bool = False) -> bool:
+        """
+        尝试成为 key 的 leader
+
+        没有执行记录、租约已过期，或记录是加入前就已结束的旧结果（joined=False）时获得；
+        加入后等到的结果（joined=True）不会被覆盖。
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM flights WHERE finished_at < ?', (now - self.result_ttl,))
+            row = conn.execute('SELECT status, heartbeat_at FROM flights WHERE key = ?', (key,)).fetchone()
+            free = (
+                row is None
+                or (row[0] == 'running' and row[1] < now - self.lease)
+                or (row[0] != 'running' and not joined)
+            )
+            if free:
+                conn.execute(
+                    'INSERT OR REPLACE INTO flights (key, owner, status, payload, heartbeat_at, finished_at) '
+                    "VALUES (?, ?, 'running', NULL, ?, NULL)",
+                    (key, owner, now)
+                )
+            conn.execute('COMMIT')
+            return free
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def heartbeat(self, key: str, owner: str) -> None:
+        self._execute(
+            "UPDATE flights SET heartbeat_at = ? WHERE key = ? AND owner = ? AND status = 'running'",
+            (time.time(), key, owner)
+        )
+
+    def finish(self, key: str, owner: str, status: str, payload: str) -> None:
+        """记录执行结果（status 为 done 或 failed）"""
+        now = time.time()
+        self._execute(
+            'UPDATE flights SET status = ?, payload = ?, heartbeat_at = ?, finished_at = ? WHERE key = ? AND owner = ?',
+            (status, payload, now, now, key, owner)
+        )
+
+    def abandon(self, key: str, owner: str) -> None:
+        """放弃执行（leader 被中断）：删除登记，等待方重新获取执行权"""
+        self._execute('DELETE FROM flights WHERE key = ? AND owner = ?', (key, owner))
+
+    def poll(self, key: str) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Returns:
+            (状态, 结果)；状态为 running / abandoned / done / failed，无记录时返回 None
+        """
+        row = self._execute('SELECT status, payload, heartbeat_at FROM flights WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        status, payload, heartbeat_at = row
+        if status == 'running' and heartbeat_at < time.time() - self.lease:
+            return 'abandoned', None
+        return status, payload
+
+    def running(self) -> int:
+        return self._execute(
+            "SELECT COUNT(*) FROM flights WHERE status = 'running' AND heartbeat_at >= ?",
+            (time.time() - self.lease,)
+        ).fetchone()[0]
+
+
+def _encode(result: Any) -> Tuple[str, str]:
+    """leader 结果的登记状态与内容；不可序列化时其它进程的等待方收到 LeaderFailed"""
+    try:
+        return 'done', json.dumps(result, ensure_ascii=False)
+    except (TypeError, ValueError) as encode_error:
+        return 'failed', json.dumps({'message': f'结果无法跨进程共享: {encode_error}'}, ensure_ascii=False)
+
+
+def _leader_failed(payload: Optional[str]) -> LeaderFailed:
+    """按登记内容还原 leader 的失败（兼容只登记了错误信息的纯文本）"""
+    try:
+        failure = json.loads(payload) if payload else {}
+    except ValueError:
+        failure = None
+    if not isinstance(failure, dict):
+        failure = {'message': payload}
+    body = failure.get('body')
+    return LeaderFailed(
+        failure.get('message') or '相同请求执行失败',
+        status=failure.get('status'),
+        body=body if isinstance(body, dict) else None
+    )
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error', 'interrupted')
+
+    def __init__(self, done):
+        self.done = done
+        self.result = None
+        self.error = None
+        self.interrupted = False
+
+
+class SingleFlight:
+    """按 key 合并并发的相同调用"""
+
+    def __init__(
+        self,
+        store: Optional[FlightStore] = None,
+        wait_timeout: float = 600,
+        max_runtime: float = 900,
+        poll_interval: float = 0.25,
+        is_abort: Callable[[BaseException], bool] = None,
+        describe_error: Callable[[BaseException], Tuple[Dict[str, Any], int]] = None
+    ):
+        """
+        Args:
+            store: 跨进程登记（FlightStore），为空时只在进程内合并
+            wait_timeout: 等待方最长等待时间（秒）
+            max_runtime: leader 续租的最长时间（秒），超过后租约过期、等待方可接管
+            poll_interval: 等待其它进程结果时的轮询间隔（秒）
+            is_abort: 判断 leader 的异常是否为中断（不共享给等待方）；截止时间耗尽、客户端断开
+                与非 Exception 的 BaseException（如 asyncio.CancelledError）始终视为中断
+            describe_error: 将 leader 的异常转换为 (错误响应体, HTTP 状态码)，随失败结果登记，
+                其它进程的等待方通过 LeaderFailed 取得
+        """
+        self.store = store
+        self.wait_timeout = float(wait_timeout)
+        self.max_runtime = float(max_runtime)
+        self.poll_interval = float(poll_interval)
+        self.is_abort = is_abort
+        self.describe_error = describe_error
+        self.leaders = 0
+        self.followers = 0
+        self.takeovers = 0
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self._leases: Dict[Tuple[str, str], float] = {}
+        self._lease_lock = threading.Lock()
+        self._heartbeat_thread = None
+
+    @classmethod
+    def from_env(
+        cls,
+        is_abort: Callable[[BaseException], bool] = None,
+        describe_error: Callable[[BaseException], Tuple[Dict[str, Any], int]] = None
+    ) -> Optional['SingleFlight']:
+        """按环境变量创建；DEEPRESEARCH_SINGLE_FLIGHT=false 时返回 None"""
+        if os.getenv('DEEPRESEARCH_SINGLE_FLIGHT', 'true').lower() != 'true':
+            return None
+        store = None
+        if os.getenv('DEEPRESEARCH_SINGLE_FLIGHT_SHARED', 'true').lower() == 'true':
+            default_path = os.path.join(tempfile.gettempdir(), 'thinkcraft-deep-research', 'single-flight.sqlite3')
+            try:
+                store = FlightStore(
+                    path=os.getenv('DEEPRESEARCH_SINGLE_FLIGHT_PATH', default_path),
+                    lease=float(os.getenv('DEEPRESEARCH_SINGLE_FLIGHT_LEASE', 30))
+                )
+            except (OSError, sqlite3.Error) as store_error:
+                logger.warning(f'跨进程请求合并不可用，仅在进程内合并: {store_error}')
+        return cls(
+            store=store,
+            wait_timeout=float(os.getenv('DEEPRESEARCH_SINGLE_FLIGHT_WAIT', 600)),
+            max_runtime=float(os.getenv('DEEPRESEARCH_SINGLE_FLIGHT_MAX_RUNTIME', 900)),
+            is_abort=is_abort,
+            describe_error=describe_error
+        )
+
+    def _count(self, field: str) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def _interrupted(self, error: BaseException) -> bool:
+        """leader 的异常是否为中断（与请求本身无关，等待方不应继承）"""
+        if not isinstance(error, Exception) or isinstance(error, (DeadlineExceeded, RequestCancelled)):
+            return True
+        return bool(self.is_abort and self.is_abort(error))
+
+    def _failure(self, error: BaseException) -> str:
+        """leader 失败的登记内容：错误信息及其 HTTP 映射"""
+        failure = {'message': str(error)}
+        if self.describe_error is not None:
+            try:
+                body, status = self.describe_error(error)
+                return json.dumps(dict(failure, body=body, status=status), ensure_ascii=False)
+            except Exception as describe_error:
+                logger.warning(f'leader 错误分类失败，仅登记错误信息: {describe_error}')
+        return json.dumps(failure, ensure_ascii=False)
+
+    def _join(self, key: str, done_factory) -> Tuple[_Flight, bool]:
+        """取得 key 正在执行的 flight，没有时登记为 leader"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = self._flights[key] = _Flight(done_factory())
+            return flight, True
+
+    def _retry_after_interruption(self) -> None:
+        # leader 被中断：等待方在自身截止时间内重新竞争执行
+        deadlines.check('coalesced')
+        logger.info('相同请求的执行方被中断，重新执行')
+        self._count('takeovers')
+
+    # ------------------------------------------------------------------
+    # 同步
+    # ------------------------------------------------------------------
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        执行 fn，或等待正在执行的相同 key 的结果
+
+        Returns:
+            (结果, 是否为共享结果)
+        """
+        joined = False
+        while True:
+            flight, leader = self._join(key, threading.Event)
+            if leader:
+                break
+            if not joined:
+                joined = True
+                self._count('followers')
+            if not flight.done.wait(self._wait_limit()):
+                self._timed_out('等待相同请求超时')
+            if flight.interrupted:
+                self._retry_after_interruption()
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result, shared = self._do_shared(key, fn)
+            return flight.result, shared
+        except BaseException as error:
+            if self._interrupted(error):
+                flight.interrupted = True
+            else:
+                flight.error = error
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _do_shared(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        if self.store is None:
+            self._count('leaders')
+            return fn(), False
+
+        owner = f'{os.getpid()}:{uuid.uuid4().hex}'
+        deadline = time.monotonic() + self._wait_limit()
+        joined = False
+        while True:
+            try:
+                if self.store.acquire(key, owner, joined):
+                    self._took_over(joined)
+                    return self._lead(key, owner, fn), False
+                state = self.store.poll(key)
+            except sqlite3.Error as store_error:
+                logger.warning(f'跨进程请求合并登记失败，直接执行: {store_error}')
+                self._count('leaders')
+                return fn(), False
+            shared = self._shared_result(state, joined)
+            if shared is not None:
+                return shared
+            if not joined:
+                joined = True
+                self._count('followers')
+            if time.monotonic() >= deadline:
+                self._timed_out('等待其它进程中的相同请求超时')
+            time.sleep(self.poll_interval)
+
+    def _shared_result(self, state, joined: bool) -> Optional[Tuple[Any, bool]]:
+        """加入后等到的结束状态转换为 (结果, True)，仍在执行时返回 None"""
+        if state is None or not joined:
+            return None
+        status, payload = state
+        if status == 'done':
+            return json.loads(payload), True
+        if status == 'failed':
+            raise _leader_failed(payload)
+        return None
+
+    def _wait_limit(self) -> float:
+        return deadlines.timeout(self.wait_timeout)
+
+    def _timed_out(self, message: str) -> None:
+        # 请求自身截止时间先到（或客户端已断开）时抛出对应异常，否则为等待超时
+        deadlines.check('coalesced')
+        raise FlightTimeout(f'{message}（{self.wait_timeout:.0f}s）')
+
+    def _took_over(self, joined: bool) -> None:
+        # 等待中获得执行权：原 leader 租约已过期（进程退出或超过 max_runtime）
+        if joined:
+            logger.warning('相同请求的执行方已失联，接管执行')
+            self._count('takeovers')
+
+    def _lead(self, key: str, owner: str, fn: Callable[[], Any]) -> Any:
+        self._count('leaders')
+        self._hold_lease(key, owner)
+        try:
+            result = fn()
+        except BaseException as error:
+            if self._interrupted(error):
+                self._abandon_lease(key, owner)
+            else:
+                self._release_lease(key, owner, 'failed', self._failure(error))
+            raise
+        self._release_lease(key, owner, *_encode(result))
+        return result
+
+    # ------------------------------------------------------------------
+    # 异步（asyncio 服务模式）
+    # ------------------------------------------------------------------
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """do 的异步版本，fn 为协程函数；SQLite 登记在线程池中执行"""
+        joined = False
+        while True:
+            flight, leader = self._join(key, asyncio.Event)
+            if leader:
+                break
+            if not joined:
+                joined = True
+                self._count('followers')
+            try:
+                await asyncio.wait_for(flight.done.wait(), timeout=self._wait_limit())
+            except asyncio.TimeoutError:
+                self._timed_out('等待相同请求超时')
+            if flight.interrupted:
+                self._retry_after_interruption()
+                continue
+            if flight.error is not None:
+                raise flight.error
+            return flight.result, True
+
+        try:
+            flight.result, shared = await self._ado_shared(key, fn)
+            return flight.result, shared
+        except BaseException as error:
+            if self._interrupted(error):
+                flight.interrupted = True
+            else:
+                flight.error = error
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    async def _ado_shared(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        if self.store is None:
+            self._count('leaders')
+            return await fn(), False
+
+        owner = f'{os.getpid()}:{uuid.uuid4().hex}'
+        deadline = time.monotonic() + self._wait_limit()
+        joined = False
+        while True:
+            try:
+                if await asyncio.to_thread(self.store.acquire, key, owner, joined):
+                    self._took_over(joined)
+                    return await self._alead(key, owner, fn), False
+                state = await asyncio.to_thread(self.store.poll, key)
+            except sqlite3.Error as store_error:
+                logger.warning(f'跨进程请求合并登记失败，直接执行: {store_error}')
+                self._count('leaders')
+                return await fn(), False
+            shared = self._shared_result(state, joined)
+            if shared is not None:
+                return shared
+            if not joined:
+                joined = True
+                self._count('followers')
+            if time.monotonic() >= deadline:
+                self._timed_out('等待其它进程中的相同请求超时')
+            await asyncio.sleep(self.poll_interval)
+
+    async def _alead(self, key: str, owner: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        self._count('leaders')
+        self._hold_lease(key, owner)
+        try:
+            result = await fn()
+        except BaseException as error:
+            if self._interrupted(error):
+                # 取消时不再等待线程池，同步释放登记（本地 SQLite，耗时很短）
+                self._abandon_lease(key, owner)
+            else:
+                await asyncio.to_thread(self._release_lease, key, owner, 'failed', self._failure(error))
+            raise
+        await asyncio.to_thread(self._release_lease, key, owner, *_encode(result))
+        return result
+
+    # ------------------------------------------------------------------
+    # 租约
+    # ------------------------------------------------------------------
+
+    def _hold_lease(self, key: str, owner: str) -> None:
+        """登记续租；同一个后台线程为本进程所有 leader 续租"""
+        with self._lease_lock:
+            self._leases[(key, owner)] = time.monotonic() + self.max_runtime
+            if self._heartbeat_thread is None:
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, name='single-flight-heartbeat', daemon=True
+                )
+                self._heartbeat_thread.start()
+
+    def _release_lease(self, key: str, owner: str, status: str, payload: str) -> None:
+        with self._lease_lock:
+            self._leases.pop((key, owner), None)
+        try:
+            self.store.finish(key, owner, status, payload)
+        except sqlite3.Error as store_error:
+            logger.warning(f'跨进程请求合并结果写入失败: {store_error}')
+
+    def _abandon_lease(self, key: str, owner: str) -> None:
+        """leader 被中断：删除登记，其它进程的等待方随即竞争执行"""
+        with self._lease_lock:
+            self._leases.pop((key, owner), None)
+        try:
+            self.store.abandon(key, owner)
+        except sqlite3.Error as store_error:
+            logger.warning(f'跨进程请求合并登记释放失败: {store_error}')
+
+    def _heartbeat_loop(self) -> None:
+        interval = max(0.05, self.store.lease / 3)
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            with self._lease_lock:
+                # 超过 max_runtime 的 leader 不再续租，租约过期后由等待方接管
+                leases = [lease for lease, until in self._leases.items() if until > now]
+            for key, owner in leases:
+                try:
+                    self.store.heartbeat(key, owner)
+                except sqlite3.Error as store_error:
+                    logger.warning(f'跨进程请求合并续租失败: {store_error}')
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = {
+                'inFlight': len(self._flights),
+                'leaders': self.leaders,
+                'followers': self.followers,
+                'takeovers': self.takeovers,
+                'shared': self.store is not None
+            }
+        if self.store is not None:
+            try:
+                stats['hostInFlight'] = self.store.running()
+            except sqlite3.Error:
+                stats['hostInFlight'] = None
+        return stats
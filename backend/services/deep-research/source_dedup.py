@@ -0,0 +1,140 @@
+"""
+来源去重
+
+1. URL 规范化：去除跟踪参数、片段、默认端口、www./移动端前缀与末尾斜杠，参数排序；
+2. 近重复摘要折叠：对标题+摘要计算 64 位 SimHash，汉明距离不超过阈值视为同一内容（转载/聚合）。
+
+调用方需按得分降序传入来源，每组重复内容只保留第一条（即得分最高者）。
+"""
+import hashlib
+import re
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+TRACKING_PARAMS = {
+    'gclid', 'fbclid', 'msclkid', 'yclid', 'dclid', 'igshid', 'mc_cid', 'mc_eid',
+    'spm', 'from', 'source', 'ref', 'ref_src', 'share', 'share_token', 'scene', 'timestamp'
+}
+TRACKING_PREFIXES = ('utm_',)
+HOST_PREFIXES = ('www.', 'm.', 'mobile.', 'wap.', 'amp.')
+
+SIMHASH_BITS = 64
+DEFAULT_MAX_DISTANCE = 3
+_TOKEN_RE = re.compile(r'[a-z0-9]+|[一-鿿]')
+
+# 字节 -> 8 个 32 位计数通道（第 i 位为 1 时第 i 个通道为 1），各位的命中数用大整数加法一次累加
+_LANE_BITS = 32
+_LANE_MASK = (1 << _LANE_BITS) - 1
+_SPREAD = tuple(sum(((byte >> i) & 1) << (i * _LANE_BITS) for i in range(8)) for byte in range(256))
+
+
+def canonicalize_url(url: str) -> str:
+    """返回用于去重比较的规范化 URL（不用于展示）"""
+    url = (url or '').strip()
+    if not url:
+        return ''
+    try:
+        parts = urlsplit(url)
+    except ValueError:
+        return url.lower()
+
+    host = (parts.hostname or '').lower().rstrip('.')
+    for prefix in HOST_PREFIXES:
+        if host.startswith(prefix) and host.count('.') >= 2:
+            host = host[len(prefix):]
+            break
+    port = parts.port if parts.port not in (None, 80, 443) else None
+    netloc = f'{host}:{port}' if port else host
+
+    path = re.sub(r'/{2,}', '/', parts.path or '')
+    path = re.sub(r'/(index|default)\.(html?|php|aspx?)$', '/', path, flags=re.IGNORECASE)
+    path = path.rstrip('/')
+
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+    # 统一协议，http/https 视为同一资源
+    return urlunsplit(('https', netloc, path, urlencode(query), ''))
+
+
+def _shingles(text: str) -> List[str]:
+    tokens = _TOKEN_RE.findall((text or '').lower())
+    if len(tokens) < 3:
+        return tokens
+    return [''.join(tokens[i:i + 3]) for i in range(len(tokens) - 2)]
+
+
+def simhash(text: str) -> Optional[int]:
+    """64 位 SimHash；文本过短无法指纹化时返回 None"""
+    features = _shingles(text)
+    if len(features) < 4:
+        return None
+    blob = b''.join(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest() for feature in features)
+    # 某位为 1 的特征数超过一半即该位权重为正；按字节列查表累加，不逐位循环
+    half = len(features)
+    fingerprint = 0
+    for column in range(8):
+        counts = sum(map(_SPREAD.__getitem__, blob[column::8]))
+        # 摘要按大端解释：第 column 个字节对应指纹的第 (7 - column) 个字节
+        shift = (7 - column) * 8
+        for i in range(8):
+            if ((counts >> (i * _LANE_BITS)) & _LANE_MASK) * 2 > half:
+                fingerprint |= 1 << (shift + i)
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def dedupe_sources(
+    sources: List[Dict[str, Any]],
+    text_of: Optional[Callable[[Dict[str, Any]], str]] = None,
+    max_distance: int = DEFAULT_MAX_DISTANCE,
+    limit: Optional[int] = None
+) -> List[Dict[str, Any]]:
+    """
+    按规范化 URL 与内容指纹去重，保留每组中最靠前的来源
+
+    Args:
+        sources: 按优先级（得分）降序排列的来源
+        text_of: 提取用于指纹的文本，默认 title + snippet/content
+        max_distance: SimHash 汉明距离阈值
+        limit: 保留数量达到上限后停止扫描
+    """
+    text_of = text_of or (lambda s: f"{s.get('title', '')} {s.get('snippet') or s.get('content') or ''}")
+    kept = []
+    seen_urls = set()
+    # 按 4 段 16 位分桶：汉明距离 <= 3 的两个指纹至少有一段完全相同；阈值更大时退化为全量比较
+    banded = max_distance <= 3
+    buckets = [dict() for _ in range(4)]
+    fingerprints = []
+    for source in sources:
+        if limit is not None and len(kept) >= limit:
+            break
+        canonical = canonicalize_url(source.get('url', ''))
+        if canonical and canonical in seen_urls:
+            continue
+
+        fingerprint = simhash(text_of(source))
+        if fingerprint is not None:
+            bands = [(fingerprint >> (16 * i)) & 0xFFFF for i in range(4)]
+            if banded:
+                candidates = set()
+                for bucket, band in zip(buckets, bands):
+                    candidates.update(bucket.get(band, ()))
+            else:
+                candidates = fingerprints
+            if any(hamming_distance(fingerprint, other) <= max_distance for other in candidates):
+                continue
+            for bucket, band in zip(buckets, bands):
+                bucket.setdefault(band, []).append(fingerprint)
+            fingerprints.append(fingerprint)
+
+        if canonical:
+            seen_urls.add(canonical)
+        kept.append(source)
+    return kept
@@ -0,0 +1,268 @@
+"""
+本地上游替身服务（基准测试与离线联调）
+
+在本机启动两个 HTTP 服务，替代真实上游：
+- OpenRouter 兼容的 POST /api/v1/chat/completions（支持 stream=true 的 SSE 输出）；
+- Tavily 兼容的 POST /search。
+
+每个服务可单独配置延迟分布与错误率（错误按 429 / 500 交替返回，429 带 Retry-After）。
+
+单独运行：
+    python stub_upstreams.py --openrouter-latency lognormal:0.8:0.4 --tavily-latency uniform:0.2:0.6 --error-rate 0.02
+然后将 OPENROUTER_BASE_URL / DEEPRESEARCH_API_URL 指向输出的地址。
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from mock_provider import LatencyModel
+
+HOSTS = [
+    'www.statista.com', 'www.reuters.com', 'www.mckinsey.com', 'www.stats.gov.cn', 'www.36kr.com',
+    'zhuanlan.zhihu.com', 'news.example.org', 'blog.example.com'
+]
+_TOKEN_RE = re.compile(r'\S+')
+
+
+class StubConfig:
+    """单个替身服务的行为配置"""
+
+    def __init__(self, latency: LatencyModel = None, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency or LatencyModel()
+        self.error_rate = max(0.0, min(1.0, float(error_rate)))
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+
+    def next_fault(self) -> Optional[int]:
+        """本次请求应返回的错误状态码，正常时为 None"""
+        with self._lock:
+            self.requests += 1
+            if self.error_rate <= 0 or self._rng.random() >= self.error_rate:
+                return None
+            self.errors += 1
+            return 429 if self.errors % 2 else 500
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'latency': self.latency.describe(),
+                'errorRate': self.error_rate,
+                'requests': self.requests,
+                'errors': self.errors
+            }
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config: StubConfig = None
+
+    def log_message(self, format, *args):  # noqa: A002 - 覆盖基类签名
+        pass
+
+    def do_HEAD(self):
+        # 连接预热使用 HEAD /
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json({'error': 'invalid json'}, 400)
+            return
+
+        route = self.routes().get(self.path.rstrip('/'))
+        if route is None:
+            self._send_json({'error': f'not found: {self.path}'}, 404)
+            return
+
+        time.sleep(self.config.latency.sample())
+        fault = self.config.next_fault()
+        if fault is not None:
+            headers = {'Retry-After': '0'} if fault == 429 else {}
+            self._send_json({'error': {'message': f'stub fault {fault}', 'code': fault}}, fault, headers)
+            return
+        route(self, body)
+
+    def routes(self):
+        return {}
+
+    def _send_json(self, payload: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _prompt_text(body: Dict[str, Any]) -> str:
+    return '\n'.join(str(message.get('content', '')) for message in body.get('messages', []))
+
+
+def _chapter_markdown(prompt: str, max_tokens: int) -> str:
+    """按 max_tokens 生成长度相近、带引用编号的章节正文"""
+    citations = max(1, min(10, prompt.count('URL:') or prompt.count('http')))
+    paragraphs = ['## 核心结论', '']
+    budget = max(200, int(max_tokens * 0.6))
+    index = 0
+    while sum(len(p) for p in paragraphs) < budget:
+        index += 1
+        paragraphs.append(
+            f'第{index}点：市场需求持续增长，用户对智能化服务的付费意愿提升，渠道与竞品格局逐步清晰 [{index % citations + 1}]。'
+        )
+    return '\n'.join(paragraphs)
+
+
+class OpenRouterStubHandler(_StubHandler):
+    def routes(self):
+        return {
+            '/api/v1/chat/completions': OpenRouterStubHandler.chat_completions,
+            '/chat/completions': OpenRouterStubHandler.chat_completions
+        }
+
+    def chat_completions(self, body: Dict[str, Any]) -> None:
+        prompt = _prompt_text(body)
+        max_tokens = int(body.get('max_tokens') or 1000)
+        if max_tokens <= 300:
+            content = '宠物健身 智能设备 市场规模 用户痛点 竞品格局'
+        else:
+            content = _chapter_markdown(prompt, max_tokens)
+        prompt_tokens = len(prompt) // 2
+        completion_tokens = len(content) // 2
+        usage = {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens
+        }
+        model = body.get('model', 'stub-model')
+        if body.get('stream'):
+            self._stream(model, content, usage)
+            return
+        self._send_json({
+            'id': f'chatcmpl-stub-{int(time.time() * 1000)}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+            'usage': usage
+        })
+
+    def _stream(self, model: str, content: str, usage: Dict[str, int]) -> None:
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        created = int(time.time())
+
+        def chunk(delta=None, chunk_usage=None):
+            choices = [{'index': 0, 'delta': delta, 'finish_reason': None}] if delta is not None else []
+            payload = {
+                'id': 'chatcmpl-stub', 'object': 'chat.completion.chunk', 'created': created,
+                'model': model, 'choices': choices, 'usage': chunk_usage
+            }
+            self.wfile.write(f'data: {json.dumps(payload, ensure_ascii=False)}\n\n'.encode('utf-8'))
+
+        for start in range(0, len(content), 40):
+            chunk({'content': content[start:start + 40]})
+        chunk(chunk_usage=usage)
+        self.wfile.write(b'data: [DONE]\n\n')
+        self.close_connection = True
+
+
+class TavilyStubHandler(_StubHandler):
+    def routes(self):
+        return {'/search': TavilyStubHandler.search}
+
+    def search(self, body: Dict[str, Any]) -> None:
+        query = str(body.get('query', ''))
+        words = _TOKEN_RE.findall(query)[:8] or ['市场']
+        count = max(1, min(int(body.get('max_results') or 10), 20))
+        seed = sum(ord(ch) for ch in query)
+        rng = random.Random(seed)
+        results: List[Dict[str, Any]] = []
+        for index in range(count):
+            host = rng.choice(HOSTS)
+            topic = ' '.join(rng.sample(words, min(len(words), 3)))
+            results.append({
+                'title': f'{topic} 行业研究 {index + 1}',
+                'url': f'https://{host}/research/{seed % 997}-{index}',
+                'content': f'{topic}：' + '，'.join(rng.choice(words) for _ in range(60)),
+                'score': round(rng.uniform(0.5, 0.99), 3)
+            })
+        self._send_json({
+            'query': query,
+            'answer': f'{" ".join(words[:4])} 相关研究摘要。',
+            'results': results,
+            'response_time': 0.0
+        })
+
+
+class StubServer:
+    """在后台线程运行的替身服务"""
+
+    def __init__(self, handler: type, config: StubConfig = None, host: str = '127.0.0.1', port: int = 0):
+        self.config = config or StubConfig()
+        handler_class = type(handler.__name__, (handler,), {'config': self.config})
+        self.httpd = ThreadingHTTPServer((host, port), handler_class)
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'StubServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='stub-upstream', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_openrouter_stub(latency: str = 'fixed:0', error_rate: float = 0.0, seed: Optional[int] = None) -> StubServer:
+    """启动 OpenRouter 替身，base_url 为 server.url + '/api/v1'"""
+    return StubServer(OpenRouterStubHandler, StubConfig(LatencyModel.parse(latency, seed), error_rate, seed)).start()
+
+
+def start_tavily_stub(latency: str = 'fixed:0', error_rate: float = 0.0, seed: Optional[int] = None) -> StubServer:
+    """启动 Tavily 替身，api_url 为 server.url"""
+    return StubServer(TavilyStubHandler, StubConfig(LatencyModel.parse(latency, seed), error_rate, seed)).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--openrouter-latency', default='lognormal:0.8:0.4')
+    parser.add_argument('--tavily-latency', default='uniform:0.2:0.6')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    openrouter = start_openrouter_stub(args.openrouter_latency, args.error_rate, args.seed)
+    tavily = start_tavily_stub(args.tavily_latency, args.error_rate, args.seed)
+    print(f'OPENROUTER_BASE_URL={openrouter.url}/api/v1')
+    print(f'DEEPRESEARCH_API_URL={tavily.url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        openrouter.stop()
+        tavily.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import httpx
+
+import app as service
+import asgi_app
+
+
+def _call(method, path, body=None):
+    sent = []
+    payload = json.dumps(body).encode() if body is not None else b''
+
+    messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        # 与 ASGI 服务器一致：请求体读完后阻塞直到客户端断开
+        await asyncio.Event().wait()
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi_app.app({'type': 'http', 'method': method, 'path': path}, receive, send))
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+def _completion(content, tokens):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=tokens)
+    )
+
+
+class AsgiChapterTests(unittest.TestCase):
+    def test_chapter_runs_through_async_pipeline(self):
+        sources = [{'title': '来源A', 'url': 'https://a.example.com', 'snippet': '', 'relevance': 0.9}]
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create = mock.AsyncMock(side_effect=[
+            _completion('宠物健身 摘要', 5),
+            _completion('市场规模 [1]', 40)
+        ])
+        research = mock.Mock()
+        research.agenerate_chapter = mock.AsyncMock(return_value={'sources': sources})
+
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'), \
+                mock.patch.object(service, 'DEEPRESEARCH_API_KEY', 'key'), \
+                mock.patch.object(service, 'research_client', research), \
+                mock.patch.object(service, 'rank_and_filter_sources', return_value=sources), \
+                mock.patch.object(asgi_app, 'async_client', fake_client):
+            service.SUMMARY_CACHE.clear()
+            status, body = _call('POST', '/research/business-plan-chapter', {
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP'}]
+            })
+
+        self.assertEqual(status, 200)
+        # 检索摘要 + 合成
+        self.assertEqual(body['tokens'], 45)
+        self.assertIn('1. 来源A - https://a.example.com', body['content'])
+        self.assertEqual(research.agenerate_chapter.await_args.kwargs['summary_text'], '宠物健身 摘要')
+
+    def test_cpu_bound_steps_run_off_the_event_loop(self):
+        sources = [{'title': '来源A', 'url': 'https://a.example.com', 'snippet': '', 'relevance': 0.9}]
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create = mock.AsyncMock(side_effect=[
+            _completion('宠物健身 摘要', 5),
+            _completion('市场规模 [1]', 40)
+        ])
+        research = mock.Mock()
+        research.agenerate_chapter = mock.AsyncMock(return_value={'sources': sources})
+        threads = {}
+
+        def record(name, fn):
+            def wrapper(*args, **kwargs):
+                threads[name] = threading.current_thread()
+                return fn(*args, **kwargs)
+            return wrapper
+
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'), \
+                mock.patch.object(service, 'DEEPRESEARCH_API_KEY', 'key'), \
+                mock.patch.object(service, 'research_client', research), \
+                mock.patch.object(service, 'rank_and_filter_sources', record('rank', lambda *a, **k: sources)), \
+                mock.patch.object(service, 'synthesis_request', record('synthesis', service.synthesis_request)), \
+                mock.patch.object(
+                    service, 'finalize_chapter_content', record('finalize', service.finalize_chapter_content)
+                ), \
+                mock.patch.object(asgi_app, 'async_client', fake_client):
+            service.SUMMARY_CACHE.clear()
+            status, _ = _call('POST', '/research/business-plan-chapter', {
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP 事件循环'}]
+            })
+
+        self.assertEqual(status, 200)
+        self.assertEqual(set(threads), {'rank', 'synthesis', 'finalize'})
+        # 事件循环运行在主线程（asyncio.run）
+        self.assertNotIn(threading.main_thread(), threads.values())
+
+    def test_openrouter_client_uses_shared_transport(self):
+        transport = mock.Mock()
+        transport.aclient_for.return_value = httpx.AsyncClient()
+
+        async def run():
+            first, second = asgi_app.openrouter_client(), asgi_app.openrouter_client()
+            await transport.aclient_for.return_value.aclose()
+            return first, second
+
+        with mock.patch.object(service, 'HTTP_TRANSPORT', transport):
+            first, second = asyncio.run(run())
+
+        self.assertIs(first, second)
+        self.assertIs(first._client, transport.aclient_for.return_value)
+        transport.aclient_for.assert_called_once_with(service.OPENROUTER_BASE_URL)
+
+    def test_validation_and_unknown_route(self):
+        status, body = _call('POST', '/research/business-plan-chapter', {'chapterId': 'market-analysis'})
+        self.assertEqual(status, 400)
+        self.assertIn('conversationHistory', body['error'])
+        self.assertEqual(_call('GET', '/missing')[0], 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
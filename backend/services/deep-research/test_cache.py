@@ -0,0 +1,59 @@
+import time
+import unittest
+
+from cache import SizedTTLCache, TTLCache, fingerprint
+
+
+class TTLCacheTests(unittest.TestCase):
+    def test_lru_eviction_and_counters(self):
+        cache = TTLCache(maxsize=2, ttl=60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (2, 1, 1))
+
+    def test_entries_expire_after_ttl(self):
+        cache = TTLCache(maxsize=4, ttl=0.01)
+        cache.set('a', 1)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+
+    def test_fingerprint_separates_parts(self):
+        self.assertNotEqual(fingerprint('ab', 'c'), fingerprint('a', 'bc'))
+        self.assertEqual(fingerprint('a', 1), fingerprint('a', '1'))
+
+
+class SizedTTLCacheTests(unittest.TestCase):
+    def test_evicts_least_recently_used_to_stay_under_max_bytes(self):
+        cache = SizedTTLCache(max_bytes=10, ttl=60)
+        cache.set('a', b'1234')
+        cache.set('b', b'1234')
+        self.assertEqual(cache.get('a'), b'1234')
+        cache.set('c', b'1234')
+
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.stats()['bytes'], 8)
+        cache.set('a', b'12')
+        self.assertEqual(cache.stats()['bytes'], 6)
+
+    def test_oversized_values_are_not_cached(self):
+        cache = SizedTTLCache(max_bytes=4, ttl=60)
+        cache.set('a', b'12345')
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+    def test_expired_entries_release_their_bytes(self):
+        cache = SizedTTLCache(max_bytes=10, ttl=0.01)
+        cache.set('a', b'1234')
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['bytes'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+
+from chapters import CHAPTERS, DOCUMENT_CHAPTERS, get_chapter
+
+
+class ChapterRegistryTests(unittest.TestCase):
+    def test_every_document_chapter_is_registered(self):
+        for doc_type, chapter_ids in DOCUMENT_CHAPTERS.items():
+            for chapter_id in chapter_ids:
+                self.assertEqual(CHAPTERS[chapter_id].doc_type, doc_type)
+        self.assertEqual(len(DOCUMENT_CHAPTERS['business']), 9)
+        self.assertEqual(len(DOCUMENT_CHAPTERS['proposal']), 6)
+
+    def test_registry_is_immutable(self):
+        with self.assertRaises(TypeError):
+            CHAPTERS['market-analysis'] = None
+        with self.assertRaises(AttributeError):
+            CHAPTERS['market-analysis'].focus = ''
+
+    def test_renders_only_the_requested_query(self):
+        chapter = get_chapter('market-analysis')
+        query = chapter.render_query('user: 宠物健身APP')
+        self.assertIn('请对以下产品进行深度市场分析', query)
+        self.assertIn('user: 宠物健身APP', query)
+        self.assertEqual(chapter.prompt_path, 'chapters/market-analysis.md')
+        self.assertIn('mvp', get_chapter('product-solution').keywords)
+
+    def test_unregistered_chapter_uses_generic_templates(self):
+        chapter = get_chapter('custom-chapter')
+        self.assertIsNone(chapter.doc_type)
+        self.assertEqual(chapter.keywords, ('custom chapter',))
+        self.assertEqual(chapter.focus, 'custom chapter')
+        self.assertEqual(chapter.render_query('x'), '请基于以下内容生成custom-chapter章节：\nx')
+        self.assertIs(get_chapter('custom-chapter'), chapter)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,192 @@
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import app as service
+from circuit_breaker import (
+    BreakerRegistry, CircuitBreaker, CircuitOpenError, FailoverChain, ProvidersUnavailable
+)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class _Aborted(Exception):
+    pass
+
+
+def _fail():
+    raise RuntimeError('upstream down')
+
+
+class CircuitBreakerTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = _Clock()
+        self.breaker = CircuitBreaker(
+            'tavily', window_seconds=60, min_calls=4, failure_rate=0.5, open_seconds=30, clock=self.clock
+        )
+
+    def _fail_times(self, count):
+        for _ in range(count):
+            with self.assertRaises(RuntimeError):
+                self.breaker.call(_fail)
+
+    def test_opens_after_failure_rate_exceeded(self):
+        self.breaker.call(lambda: 'ok')
+        self.breaker.call(lambda: 'ok')
+        self._fail_times(1)
+        self.assertEqual(self.breaker.state, 'closed')
+        self._fail_times(1)
+        self.assertEqual(self.breaker.state, 'open')
+
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.call(lambda: 'ok')
+        self.assertAlmostEqual(raised.exception.retry_in, 30)
+        self.assertEqual(self.breaker.stats()['rejected'], 1)
+
+    def test_failures_outside_window_are_forgotten(self):
+        self._fail_times(3)
+        self.clock.now = 61
+        self._fail_times(1)
+        self.assertEqual(self.breaker.state, 'closed')
+
+    def test_half_open_probe_recovers_or_reopens(self):
+        self._fail_times(4)
+        self.clock.now = 30
+        self.assertEqual(self.breaker.state, 'half_open')
+
+        # 半开状态只放行一个探测请求
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, 'open')
+
+        self.clock.now = 60
+        self.assertEqual(self.breaker.call(lambda: 'ok'), 'ok')
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(self.breaker.stats()['calls'], 0)
+
+    def test_slow_calls_count_towards_opening(self):
+        breaker = CircuitBreaker('openrouter', min_calls=2, failure_rate=0.5, slow_call_seconds=10, clock=self.clock)
+        breaker.record_success(12)
+        breaker.record_success(11)
+        self.assertEqual(breaker.state, 'open')
+        self.assertEqual(breaker.stats()['slowCalls'], 2)
+
+    def test_long_synthesis_calls_do_not_open_openrouter_breaker(self):
+        breakers = BreakerRegistry(min_calls=2, failure_rate=0.5, slow_call_seconds=10, clock=self.clock)
+        elapsed = iter(float(i * 300) for i in range(20))
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='综合内容'))],
+            usage=SimpleNamespace(total_tokens=7)
+        )
+
+        with mock.patch.object(service, 'client', fake_client), \
+                mock.patch.object(service, 'BREAKERS', breakers), \
+                mock.patch('circuit_breaker.time', SimpleNamespace(monotonic=lambda: next(elapsed))):
+            for _ in range(4):
+                service.create_completion('synthesis', {'model': 'm', 'messages': []})
+            breaker = breakers.get('openrouter')
+            self.assertEqual(breaker.state, 'closed')
+            self.assertEqual(breaker.stats()['slowCalls'], 0)
+
+            # 检索摘要等短调用仍按默认阈值统计慢调用
+            for _ in range(4):
+                service.create_completion('summary', {'model': 'm', 'messages': []})
+            self.assertEqual(breaker.state, 'open')
+
+    def test_aborted_calls_release_probe_without_recording(self):
+        self._fail_times(4)
+        self.clock.now = 30
+        with self.assertRaises(_Aborted):
+            self.breaker.call(self._raise_aborted, is_abort=lambda error: isinstance(error, _Aborted))
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.assertTrue(self.breaker.allow())
+
+    @staticmethod
+    def _raise_aborted():
+        raise _Aborted()
+
+
+class FailoverChainTests(unittest.TestCase):
+    def setUp(self):
+        self.breakers = BreakerRegistry(min_calls=1, failure_rate=0.5, open_seconds=30)
+        self.chain = FailoverChain(self.breakers, is_abort=lambda error: isinstance(error, _Aborted))
+
+    def test_falls_through_to_next_provider_and_skips_open_breakers(self):
+        calls = []
+
+        def call(target):
+            calls.append(target)
+            if target == 'primary':
+                raise RuntimeError('503')
+            return {'content': target}
+
+        members = [('tavily', 'primary'), ('perplexity', 'backup')]
+        self.assertEqual(self.chain.run(members, call), ('perplexity', {'content': 'backup'}))
+        self.assertEqual(self.breakers.get('tavily').state, 'open')
+
+        # 主提供商熔断后不再被调用
+        self.assertEqual(self.chain.run(members, call)[0], 'perplexity')
+        self.assertEqual(calls, ['primary', 'backup', 'backup'])
+
+    def test_raises_when_all_providers_unavailable(self):
+        with self.assertRaises(ProvidersUnavailable) as raised:
+            self.chain.run([('tavily', 'a'), ('perplexity', 'b')], lambda target: _fail())
+        self.assertEqual(len(raised.exception.errors), 2)
+
+    def test_abort_stops_the_chain(self):
+        calls = []
+
+        def call(target):
+            calls.append(target)
+            raise _Aborted()
+
+        with self.assertRaises(_Aborted):
+            self.chain.run([('tavily', 'a'), ('perplexity', 'b')], call)
+        self.assertEqual(calls, ['a'])
+        self.assertEqual(self.breakers.get('tavily').state, 'closed')
+
+
+class PipelineFailoverTests(unittest.TestCase):
+    def test_unavailable_providers_fall_back_to_single_shot(self):
+        research = mock.Mock()
+        research.generate_chapter.side_effect = RuntimeError('tavily down')
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='单次生成内容'))],
+            usage=SimpleNamespace(total_tokens=7)
+        )
+        breakers = BreakerRegistry()
+
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'), \
+                mock.patch.object(service, 'DEEPRESEARCH_API_KEY', 'key'), \
+                mock.patch.object(service, 'OPENROUTER_API_KEY', 'key'), \
+                mock.patch.object(service, 'research_client', research), \
+                mock.patch.object(service, 'client', fake_client), \
+                mock.patch.object(service, 'BREAKERS', breakers), \
+                mock.patch.object(service, 'FAILOVER', FailoverChain(breakers)), \
+                mock.patch.object(service, 'generate_search_summary', return_value=None):
+            result = service.generate_chapter_content(
+                'market-analysis', [{'role': 'user', 'content': '宠物健身APP'}], research_depth='shallow'
+            )
+
+        self.assertEqual(result['provider'], 'openrouter')
+        self.assertTrue(result['content'].startswith('单次生成内容'))
+        self.assertEqual(fake_client.chat.completions.create.call_count, 1)
+
+    def test_open_circuit_maps_to_service_unavailable(self):
+        body, status = service.error_payload(CircuitOpenError('openrouter', 12.4))
+        self.assertEqual(status, 503)
+        self.assertFalse(body['retryable'])
+        self.assertEqual(body['retryAfter'], 12)
+
+
+if __name__ == '__main__':
+    unittest.main()
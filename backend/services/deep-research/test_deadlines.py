@@ -0,0 +1,299 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import app as service
+import asgi_app
+import deadlines
+from circuit_breaker import BreakerRegistry, FailoverChain
+from deadlines import Deadline, DeadlineExceeded, RequestCancelled
+from deep_research_client import DeepResearchClient
+from retry_policy import RetryPolicy, UpstreamError
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _completion(content, tokens):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+        usage=SimpleNamespace(total_tokens=tokens)
+    )
+
+
+class DeadlineTests(unittest.TestCase):
+    def test_from_request_reads_header_then_param(self):
+        header = Deadline.from_request({'x-deepresearch-timeout': '30'}, {'timeout': '5'}, default=590)
+        self.assertEqual(header.budget, 30)
+        self.assertEqual(Deadline.from_request({}, {'timeout': '5'}, default=590).budget, 5)
+        # 非法值使用默认值，超过上限时截断
+        self.assertEqual(Deadline.from_request({}, {'timeout': 'abc'}, default=590).budget, 590)
+        self.assertEqual(Deadline.from_request({}, {'timeout': '-1'}, default=590).budget, 590)
+        self.assertEqual(Deadline.from_request({}, {'timeout': '9999'}, default=590, maximum=600).budget, 600)
+
+    def test_check_and_timeout_follow_remaining_time(self):
+        clock = _Clock()
+        deadline = Deadline(10, clock=clock)
+        self.assertEqual(deadline.timeout(300), 10)
+        self.assertEqual(deadline.timeout(4), 4)
+        clock.now += 10
+        with self.assertRaises(DeadlineExceeded) as raised:
+            deadline.check('synthesis')
+        self.assertEqual(raised.exception.stage, 'synthesis')
+
+        cancelled = Deadline(10)
+        cancelled.reserve(5).cancel()
+        with self.assertRaises(RequestCancelled):
+            cancelled.check('search')
+
+    def test_stage_budgets(self):
+        clock = _Clock()
+        with deadlines.scope(Deadline(300, clock=clock)):
+            # 检索为合成预留 120s
+            with deadlines.stage(reserve=120, min_share=0.6) as retrieval:
+                self.assertAlmostEqual(retrieval.remaining(), 180)
+                self.assertAlmostEqual(deadlines.timeout(600), 180)
+            with deadlines.stage(max_share=0.15) as summary:
+                self.assertAlmostEqual(summary.remaining(), 45)
+            self.assertAlmostEqual(deadlines.timeout(600), 300)
+            clock.now += 200
+            # 剩余时间不足预留时，检索至少保留 60%
+            with deadlines.stage(reserve=120, min_share=0.6) as retrieval:
+                self.assertAlmostEqual(retrieval.remaining(), 60)
+
+        with deadlines.stage(reserve=120) as unset:
+            self.assertIsNone(unset)
+
+        # 异步任务：没有时间上限，阶段预算不变
+        unbounded = Deadline.unbounded(threading.Event())
+        with deadlines.scope(unbounded), deadlines.stage(reserve=120, min_share=0.6) as retrieval:
+            self.assertIs(retrieval, unbounded)
+            self.assertEqual(deadlines.timeout(300), 300)
+        self.assertEqual(deadlines.timeout(600), 600)
+
+
+class RetryDeadlineTests(unittest.TestCase):
+    def test_retry_stops_when_backoff_exceeds_remaining_time(self):
+        sleeps = []
+        policy = RetryPolicy(max_retries=5, sleep=sleeps.append)
+        policy.backoff = lambda retry, error=None: 5.0
+        calls = []
+
+        def fn():
+            calls.append(1)
+            raise UpstreamError('busy', 503)
+
+        with deadlines.scope(Deadline(1)):
+            with self.assertRaises(DeadlineExceeded) as raised:
+                policy.call(fn, name='openrouter.synthesis')
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sleeps, [])
+        self.assertIsInstance(raised.exception.__cause__, UpstreamError)
+
+    def test_expired_deadline_skips_the_call(self):
+        policy = RetryPolicy(max_retries=2)
+        fn = mock.Mock()
+        with deadlines.scope(Deadline(0)):
+            with self.assertRaises(DeadlineExceeded):
+                policy.call(fn, name='tavily.search')
+        fn.assert_not_called()
+
+
+class SearchCancellationTests(unittest.TestCase):
+    def test_concurrent_search_stops_waiting_when_cancelled(self):
+        research = DeepResearchClient(provider='tavily', api_key='key', search_concurrency=2)
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_search(query, depth):
+            release.wait(5)
+            return {'results': []}
+
+        deadline = Deadline(60)
+        threading.Timer(0.1, deadline.cancel).start()
+        started = time.monotonic()
+        with deadlines.scope(deadline):
+            with self.assertRaises(RequestCancelled):
+                research._run_search_queries(['q1', 'q2'], 'medium', search=slow_search)
+        self.assertLess(time.monotonic() - started, 2)
+
+
+    def test_abandoned_searches_stop_retrying(self):
+        policy = RetryPolicy(max_retries=50)
+        policy.backoff = lambda retry, error=None: 0.02
+        research = DeepResearchClient(provider='tavily', api_key='key', search_concurrency=2, retry_policy=policy)
+        attempts = []
+
+        def failing_search(query, depth):
+            def fn():
+                attempts.append(query)
+                raise UpstreamError('busy', 503)
+            return policy.call(fn, name='tavily.search')
+
+        # 等待达到上限后放弃仍在执行的检索
+        with mock.patch.object(research, '_wait_searches', side_effect=lambda *args: time.sleep(0.1)):
+            with self.assertRaises(Exception):
+                research._run_search_queries(['q1', 'q2'], 'medium', search=failing_search)
+        time.sleep(0.05)
+        settled = len(attempts)
+        time.sleep(0.2)
+
+        self.assertGreater(settled, 0)
+        self.assertEqual(len(attempts), settled)
+
+    def test_detached_deadline_cancels_independently(self):
+        parent = Deadline(60)
+        child = parent.detach(5)
+        child.cancel()
+        self.assertTrue(child.cancelled)
+        self.assertFalse(parent.cancelled)
+        self.assertLessEqual(child.remaining(), 5)
+
+        other = parent.detach(5)
+        parent.cancel()
+        self.assertTrue(other.cancelled)
+
+
+class ChapterDeadlineTests(unittest.TestCase):
+    def setUp(self):
+        self.breakers = BreakerRegistry()
+        self.fake_client = mock.Mock()
+        self.fake_client.chat.completions.create.return_value = _completion('# 市场分析', 30)
+
+    def _patches(self, research):
+        return [
+            mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'),
+            mock.patch.object(service, 'DEEPRESEARCH_API_KEY', 'key'),
+            mock.patch.object(service, 'FALLBACK_RESEARCH_CLIENTS', []),
+            mock.patch.object(service, 'research_client', research),
+            mock.patch.object(service, 'client', self.fake_client),
+            mock.patch.object(service, 'BREAKERS', self.breakers),
+            mock.patch.object(service, 'FAILOVER', FailoverChain(self.breakers, is_abort=service.is_interruption)),
+            mock.patch.object(service, 'generate_search_summary', return_value=None),
+            mock.patch.object(service, 'SINGLE_FLIGHT', None)
+        ]
+
+    def _post(self, research, headers):
+        patches = self._patches(research)
+        for patch in patches:
+            patch.start()
+        try:
+            return service.app.test_client().post('/research/business-plan-chapter', headers=headers, json={
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP 截止时间'}]
+            })
+        finally:
+            for patch in reversed(patches):
+                patch.stop()
+
+    def test_retrieval_over_budget_falls_back_to_single_shot(self):
+        research = mock.Mock()
+        research.generate_chapter.side_effect = DeadlineExceeded('search', 36)
+
+        response = self._post(research, {'X-DeepResearch-Timeout': '60'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['provider'], 'openrouter')
+        # 截止时间导致的中断不计入提供商失败
+        self.assertEqual(self.breakers.get('tavily').stats()['failures'], 0)
+        timeout = self.fake_client.chat.completions.create.call_args.kwargs['timeout']
+        self.assertLessEqual(timeout, 60)
+
+    def test_expired_request_returns_gateway_timeout(self):
+        research = mock.Mock()
+
+        def slow_retrieval(**kwargs):
+            time.sleep(0.1)
+            deadlines.check('search')
+
+        research.generate_chapter.side_effect = slow_retrieval
+
+        response = self._post(research, {'X-DeepResearch-Timeout': '0.05'})
+
+        body = response.get_json()
+        self.assertEqual(response.status_code, 504)
+        self.assertFalse(body['retryable'])
+        self.assertEqual(body['stage'], 'search')
+        self.fake_client.chat.completions.create.assert_not_called()
+
+    def test_stream_disconnect_cancels_the_deadline(self):
+        deadline = Deadline(60)
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'), \
+                mock.patch.object(service, 'DEEPRESEARCH_API_KEY', 'key'), \
+                mock.patch.object(service, 'generate_search_summary', return_value='摘要'):
+            events = service.stream_chapter_events(
+                'market-analysis', [{'role': 'user', 'content': '宠物健身APP'}], deadline=deadline
+            )
+            self.assertIn('started', next(events))
+            self.assertIn('summary', next(events))
+            events.close()
+
+        self.assertTrue(deadline.cancelled)
+
+
+class AsgiDeadlineTests(unittest.TestCase):
+    def _call(self, handler, messages, headers=()):
+        sent = []
+        messages = list(messages)
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'POST', 'path': '/slow', 'headers': list(headers)}
+        with mock.patch.dict(asgi_app.ROUTES, {('POST', '/slow'): handler}):
+            asyncio.run(asgi_app.app(scope, receive, send))
+        return sent
+
+    def test_disconnect_cancels_the_handler(self):
+        state = {}
+
+        async def slow(body, headers):
+            state['deadline'] = deadlines.current()
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                state['cancelled'] = True
+                raise
+            return {}, 200
+
+        sent = self._call(slow, [
+            {'type': 'http.request', 'body': b'{}', 'more_body': False},
+            {'type': 'http.disconnect'}
+        ])
+
+        self.assertEqual(sent, [])
+        self.assertTrue(state['cancelled'])
+        self.assertTrue(state['deadline'].cancelled)
+
+    def test_deadline_expiry_returns_gateway_timeout(self):
+        async def slow(body, headers):
+            await asyncio.sleep(5)
+            return {}, 200
+
+        sent = self._call(
+            slow,
+            [{'type': 'http.request', 'body': b'{}', 'more_body': False}],
+            headers=[(b'x-deepresearch-timeout', b'0.05')]
+        )
+
+        self.assertEqual(sent[0]['status'], 504)
+        self.assertFalse(json.loads(sent[1]['body'])['retryable'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from deep_research_client import DeepResearchClient
+from search_cache import SearchResultCache
+
+
+class _FakeResponse:
+    def __init__(self, status_code, payload=None, text=''):
+        self.status_code = status_code
+        self.is_success = 200 <= status_code < 300
+        self._payload = payload or {}
+        self.text = text
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+
+class _FakeSession:
+    def __init__(self, handler):
+        self.handler = handler
+        self.headers = {}
+
+    def post(self, url, json=None, timeout=None):
+        return self.handler(json)
+
+
+class TavilySearchFanOutTests(unittest.TestCase):
+    def _client(self, handler, **kwargs):
+        client = DeepResearchClient(api_key='test', provider='tavily', **kwargs)
+        client.session = _FakeSession(handler)
+        return client
+
+    def test_queries_run_concurrently(self):
+        active = {'now': 0, 'peak': 0}
+        lock = threading.Lock()
+
+        def handler(payload):
+            with lock:
+                active['now'] += 1
+                active['peak'] = max(active['peak'], active['now'])
+            time.sleep(0.05)
+            with lock:
+                active['now'] -= 1
+            return _FakeResponse(200, {'answer': payload['query'], 'results': []})
+
+        client = self._client(handler, search_concurrency=3)
+        results = client._run_search_queries(['q1', 'q2', 'q3'], 'medium')
+
+        self.assertEqual([r['answer'] for r in results], ['q1', 'q2', 'q3'])
+        self.assertEqual(active['peak'], 3)
+
+    def test_partial_failure_keeps_successful_queries(self):
+        def handler(payload):
+            if payload['query'] == 'bad':
+                return _FakeResponse(502, text='upstream error')
+            return _FakeResponse(200, {
+                'answer': '',
+                'results': [{
+                    'title': f"宠物 健身 {payload['query']}",
+                    'url': f"https://www.statista.com/{payload['query'].split()[-1]}",
+                    'content': '宠物 健身 市场'
+                }]
+            })
+
+        client = self._client(handler)
+        result = client._generate_with_tavily(['宠物 健身 good', 'bad', '宠物 健身 other'], 'medium', 3, None)
+
+        urls = [s['url'] for s in result['sources']]
+        self.assertIn('https://www.statista.com/good', urls)
+        self.assertIn('https://www.statista.com/other', urls)
+
+    def test_all_queries_failing_raises(self):
+        client = self._client(lambda payload: _FakeResponse(500, text='down'))
+        with self.assertRaises(Exception) as ctx:
+            client._run_search_queries(['a', 'b'], 'medium')
+        self.assertIn('Tavily请求失败', str(ctx.exception))
+
+
+class SearchCacheIntegrationTests(unittest.TestCase):
+    def test_repeated_query_is_served_from_cache(self):
+        calls = []
+
+        def handler(payload):
+            calls.append(payload['query'])
+            return _FakeResponse(200, {'answer': 'a', 'results': []})
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SearchResultCache(os.path.join(tmpdir, 'cache.sqlite3'))
+            client = DeepResearchClient(api_key='test', provider='tavily', search_cache=cache)
+            client.session = _FakeSession(handler)
+
+            client._search_tavily('宠物  健身', 'medium')
+            client._search_tavily('宠物 健身', 'medium')
+
+        self.assertEqual(calls, ['宠物 健身'])
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_only_search_calls_are_hedged(self):
+        def handler(payload):
+            return _FakeResponse(200, {'answer': 'a', 'results': [], 'choices': [{'message': {'content': 'c'}}]})
+
+        client = DeepResearchClient(api_key='test', provider='perplexity')
+        client.session = _FakeSession(handler)
+        with mock.patch.object(client.retry_policy, 'call', wraps=client.retry_policy.call) as call:
+            client._generate_with_perplexity('宠物健身 市场', 'medium', 1, None)
+            client._search_tavily('宠物 健身 对冲', 'medium')
+
+        self.assertEqual([c.kwargs['hedge'] for c in call.call_args_list], [False, True])
+
+    def test_async_cache_io_runs_off_the_event_loop(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache = SearchResultCache(os.path.join(tmpdir, 'cache.sqlite3'))
+            threads = []
+            get, put = cache.get, cache.set
+            cache.get = lambda key: threads.append(threading.current_thread()) or get(key)
+            cache.set = lambda key, value: threads.append(threading.current_thread()) or put(key, value)
+            client = DeepResearchClient(api_key='test', provider='tavily', search_cache=cache)
+
+            async def fetch():
+                return {'answer': 'a', 'results': []}
+
+            async def run():
+                first = await client._acached_search('tavily', '宠物 健身', 'basic', 5, fetch)
+                second = await client._acached_search('tavily', '宠物 健身', 'basic', 5, fetch)
+                return first, second
+
+            first, second = asyncio.run(run())
+
+        self.assertEqual(first, second)
+        # get/set/get 均不在事件循环线程（主线程）中执行
+        self.assertEqual(len(threads), 3)
+        self.assertNotIn(threading.main_thread(), threads)
+
+
+if __name__ == '__main__':
+    unittest.main()
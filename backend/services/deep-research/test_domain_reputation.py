@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import unittest
+
+from domain_reputation import DomainReputationIndex, DEFAULT_CONFIG_PATH, parse_host, parse_hosts
+
+
+class DomainReputationTests(unittest.TestCase):
+    def setUp(self):
+        self.index = DomainReputationIndex(DEFAULT_CONFIG_PATH)
+
+    def test_suffix_and_label_lookup(self):
+        self.assertEqual(self.index.tier('https://www.statista.com/report'), 'preferred')
+        self.assertEqual(self.index.tier('https://data.stats.gov.cn/x'), 'preferred')
+        self.assertEqual(self.index.tier('https://www.nih.gov'), 'preferred')
+        self.assertEqual(self.index.tier('https://forum.example.com/post-1'), 'deprioritized')
+        self.assertEqual(self.index.score('https://zhuanlan.zhihu.com/p/1', 'ranking'), -0.18)
+        self.assertEqual(self.index.score('https://www.reuters.com/a', 'filter'), 1.2)
+
+    def test_country_code_government_and_academic_hosts(self):
+        # 与原子串匹配（'.gov' / '.edu' 出现在 host 中即加分）的评分一致
+        for url in ('https://www.gov.uk/x', 'https://ed.gov.au', 'https://www.gov.sg', 'https://www.moe.edu.sg'):
+            self.assertEqual(self.index.score(url, 'ranking'), 0.22, url)
+            self.assertEqual(self.index.score(url, 'filter'), 1.2, url)
+        self.assertEqual(self.index.tier('https://www.ox.ac.uk'), 'preferred')
+        self.assertEqual(self.index.tier('https://www.u-tokyo.ac.jp'), 'preferred')
+        # 非国家顶级域下的同名标签不匹配
+        self.assertIsNone(self.index.tier('https://gov.example.com'))
+
+    def test_substrings_no_longer_match_unrelated_hosts(self):
+        self.assertIsNone(self.index.tier('https://governance-news.com/a'))
+        self.assertIsNone(self.index.tier('https://weblogic.example.com'))
+        self.assertIsNone(self.index.tier('https://notstatista.com'))
+
+    def test_parse_host_without_scheme(self):
+        self.assertEqual(parse_host('WWW.Example.COM:8080/path'), 'www.example.com')
+        self.assertEqual(parse_host(''), '')
+
+    def test_parse_hosts_matches_parse_host(self):
+        urls = [
+            'https://www.statista.com/report', 'http://WWW.Example.COM:8080', 'https://www.gov.uk./a?b#c',
+            'https://user:pw@forum.example.com/x', 'https://[::1]:8000/x', 'https://example.com:abc/',
+            'https://exa\tmple.com/', 'https://', '', 'www.example.com/path'
+        ]
+        self.assertEqual(parse_hosts(urls), [parse_host(url) for url in urls])
+        self.assertEqual(self.index.score_host('www.statista.com', 'ranking'), self.index.score(
+            'https://www.statista.com/x', 'ranking'
+        ))
+
+    def test_reload_picks_up_edits(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'reputation.json')
+            config = {'tiers': {'preferred': {'ranking': 0.3}}, 'domains': {'example.com': 'preferred'}}
+            with open(path, 'w') as f:
+                json.dump(config, f)
+            index = DomainReputationIndex(path, check_interval=0)
+            self.assertEqual(index.score('https://example.com', 'ranking'), 0.3)
+
+            config['tiers']['preferred']['ranking'] = 0.5
+            with open(path, 'w') as f:
+                json.dump(config, f)
+            os.utime(path, (1, 1))
+            self.assertEqual(index.score('https://example.com', 'ranking'), 0.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
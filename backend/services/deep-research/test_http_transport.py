@@ -0,0 +1,105 @@
+import asyncio
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from http_transport import PooledTransport, parse_pool_sizes
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def _reply(self, body=b''):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._reply()
+
+    def do_GET(self):
+        self._reply(b'x' * 65536)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self._reply(json.dumps({'authorization': self.headers.get('Authorization')}).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class PooledTransportTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        self.transport = PooledTransport(pool_size=4, pool_sizes={'127.0.0.1': 2})
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_parse_pool_sizes(self):
+        self.assertEqual(parse_pool_sizes('api.tavily.com=16, OpenRouter.ai=64,bad,x=y'), {
+            'api.tavily.com': 16,
+            'openrouter.ai': 64
+        })
+
+    def test_connections_are_reused(self):
+        session = self.transport.session({'Authorization': 'Bearer a'})
+        for _ in range(5):
+            self.assertEqual(session.post(f'{self.url}/search', json={}).json()['authorization'], 'Bearer a')
+
+        stats = self.transport.stats()[self.url]
+        self.assertEqual(stats['poolSize'], 2)
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['newConnections'], 1)
+        self.assertEqual(stats['reusedConnections'], 4)
+        self.assertEqual(stats['inFlight'], 0)
+
+    def test_headers_are_scoped_per_provider(self):
+        first = self.transport.session({'Authorization': 'Bearer a'})
+        second = self.transport.session({'Authorization': 'Bearer b'})
+        self.assertEqual(first.post(f'{self.url}/x', json={}).json()['authorization'], 'Bearer a')
+        self.assertEqual(second.post(f'{self.url}/x', json={}).json()['authorization'], 'Bearer b')
+        self.assertIs(self.transport.client_for(f'{self.url}/a'), self.transport.client_for(f'{self.url}/b'))
+
+    def test_streamed_response_stays_in_flight_until_closed(self):
+        client = self.transport.client_for(self.url)
+        with client.stream('GET', f'{self.url}/stream') as response:
+            next(response.iter_bytes())
+            self.assertEqual(self.transport.stats()[self.url]['inFlight'], 1)
+        self.assertEqual(self.transport.stats()[self.url]['inFlight'], 0)
+
+    def test_async_requests_use_the_shared_pool_and_stats(self):
+        session = self.transport.session({'Authorization': 'Bearer a'})
+
+        async def run():
+            try:
+                bodies = [(await session.apost(f'{self.url}/search', json={})).json() for _ in range(3)]
+                return bodies, self.transport.aclient_for(self.url) is self.transport.aclient_for(f'{self.url}/x')
+            finally:
+                await self.transport.aclose()
+
+        bodies, shared = asyncio.run(run())
+        self.assertTrue(shared)
+        self.assertEqual([body['authorization'] for body in bodies], ['Bearer a'] * 3)
+        stats = self.transport.stats()[self.url]
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual(stats['newConnections'], 1)
+        self.assertEqual(stats['inFlight'], 0)
+
+    def test_warm_opens_connections_up_to_pool_size(self):
+        self.transport.warm([f'{self.url}/api/v1'], connections=5, background=False)
+        stats = self.transport.stats()[self.url]
+        self.assertEqual(stats['requests'], 2)
+        self.assertLessEqual(stats['peakInFlight'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
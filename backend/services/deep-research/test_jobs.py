@@ -0,0 +1,68 @@
+import threading
+import time
+import unittest
+
+from jobs import JOB_CANCELLED, JOB_FAILED, JOB_SUCCEEDED, JobManager
+
+
+def _wait_finished(job, timeout=2.0):
+    deadline = time.time() + timeout
+    while job.finished_at is None and time.time() < deadline:
+        time.sleep(0.005)
+    return job
+
+
+class JobManagerTests(unittest.TestCase):
+    def test_job_reports_progress_and_result(self):
+        manager = JobManager(max_workers=1)
+
+        def runner(job):
+            job.report('search', 0.4, '检索外部来源')
+            return {'content': 'ok'}
+
+        job = _wait_finished(manager.submit('chapter', {}, runner))
+        data = job.to_dict()
+        self.assertEqual(data['status'], JOB_SUCCEEDED)
+        self.assertEqual(data['progress'], 1.0)
+        self.assertEqual(data['result'], {'content': 'ok'})
+
+    def test_running_job_is_cancelled_at_next_stage(self):
+        manager = JobManager(max_workers=1)
+        started = threading.Event()
+        release = threading.Event()
+
+        def runner(job):
+            job.report('summary', 0.1)
+            started.set()
+            release.wait(1)
+            job.report('synthesis', 0.7)
+            return 'never'
+
+        job = manager.submit('chapter', {}, runner)
+        started.wait(1)
+        manager.cancel(job.id)
+        release.set()
+
+        self.assertEqual(_wait_finished(job).status, JOB_CANCELLED)
+        self.assertNotIn('result', job.to_dict())
+
+    def test_queued_job_cancel_and_failure(self):
+        manager = JobManager(max_workers=1)
+        release = threading.Event()
+        blocker = manager.submit('chapter', {}, lambda job: release.wait(1))
+        queued = manager.submit('chapter', {}, lambda job: 'never')
+        manager.cancel(queued.id)
+        release.set()
+        _wait_finished(blocker)
+        self.assertEqual(queued.status, JOB_CANCELLED)
+
+        def boom(job):
+            raise RuntimeError('upstream 502')
+
+        failed = _wait_finished(manager.submit('chapter', {}, boom))
+        self.assertEqual(failed.status, JOB_FAILED)
+        self.assertIn('upstream 502', failed.to_dict()['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import random
+import unittest
+
+from keyword_matcher import KeywordMatcher
+
+
+class KeywordMatcherTests(unittest.TestCase):
+    def test_overlapping_and_nested_keywords(self):
+        matcher = KeywordMatcher(['he', 'she', 'his', 'hers', '市场', '市场规模', ''])
+        self.assertEqual(matcher.find('ushers'), {0, 1, 3})
+        self.assertEqual(matcher.find('中国市场规模增长'), {4, 5})
+        self.assertEqual(matcher.find(''), set())
+
+    def test_duplicate_keywords_report_every_index(self):
+        matcher = KeywordMatcher(['用户', '市场', '用户'])
+        self.assertEqual(matcher.find('用户需求'), {0, 2})
+
+    def test_weigh_counts_hits_and_weights_without_building_sets(self):
+        matcher = KeywordMatcher(['用户', '市场', '用户', '规模', ''], weights=[1.2, 1.2, 1.0, 1.0, 5.0])
+        matched, weighted = matcher.weigh('用户市场')
+        self.assertEqual(matched, 3)
+        self.assertAlmostEqual(weighted, 3.4)
+        self.assertEqual(matcher.weigh('无关'), (0, 0.0))
+        self.assertEqual(matcher.count('用户市场'), 3)
+
+    def test_matches_naive_substring_scan(self):
+        rng = random.Random(7)
+        alphabet = 'abc市场'
+        for _ in range(200):
+            keywords = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(8)]
+            text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+            expected = {idx for idx, keyword in enumerate(keywords) if keyword in text}
+            self.assertEqual(KeywordMatcher(keywords).find(text), expected, (keywords, text))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,158 @@
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import app as service
+import metrics
+from metrics import MetricsRegistry
+
+
+def _sample(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return None
+
+
+class RegistryRenderTests(unittest.TestCase):
+    def test_counter_gauge_and_histogram_exposition(self):
+        registry = MetricsRegistry()
+        calls = registry.counter('demo_calls', '调用次数', ('stage',))
+        in_flight = registry.gauge('demo_in_flight', '在途数')
+        latency = registry.histogram('demo_seconds', '耗时', ('stage',), buckets=(0.1, 1))
+
+        calls.inc(stage='summary')
+        calls.inc(2, stage='summary')
+        in_flight.labels().inc()
+        latency.observe(0.05, stage='summary')
+        latency.observe(0.5, stage='summary')
+        latency.observe(5, stage='summary')
+        text = registry.render()
+
+        self.assertIn('# TYPE demo_calls counter', text)
+        self.assertEqual(_sample(text, 'demo_calls_total{stage="summary"}'), 3)
+        self.assertEqual(_sample(text, 'demo_in_flight'), 1)
+        self.assertEqual(_sample(text, 'demo_seconds_bucket{stage="summary",le="0.1"}'), 1)
+        self.assertEqual(_sample(text, 'demo_seconds_bucket{stage="summary",le="1"}'), 2)
+        self.assertEqual(_sample(text, 'demo_seconds_bucket{stage="summary",le="+Inf"}'), 3)
+        self.assertEqual(_sample(text, 'demo_seconds_count{stage="summary"}'), 3)
+        self.assertAlmostEqual(_sample(text, 'demo_seconds_sum{stage="summary"}'), 5.55)
+
+    def test_rejects_mismatched_labels(self):
+        registry = MetricsRegistry()
+        calls = registry.counter('demo_calls', '调用次数', ('stage',))
+        with self.assertRaises(ValueError):
+            calls.inc(model='x')
+        with self.assertRaises(ValueError):
+            registry.gauge('demo_calls', '重复')
+
+    def test_collectors_export_cache_hit_rates(self):
+        registry = MetricsRegistry()
+        registry.register_collector(lambda: metrics.cache_metrics({
+            'summary': {'hits': 3, 'misses': 1, 'hit_rate': 0.75},
+            'search': None
+        }))
+        text = registry.render()
+        self.assertEqual(_sample(text, 'deepresearch_cache_hits_total{cache="summary"}'), 3)
+        self.assertEqual(_sample(text, 'deepresearch_cache_hit_ratio{cache="summary"}'), 0.75)
+        self.assertNotIn('cache="search"', text)
+
+
+class ServiceMetricsTests(unittest.TestCase):
+    def _value(self, prefix):
+        return _sample(metrics.REGISTRY.render(), prefix) or 0
+
+    def test_summary_tokens_and_stage_latency_are_recorded(self):
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='宠物 健身 市场规模'))],
+            usage=SimpleNamespace(prompt_tokens=90, completion_tokens=10, total_tokens=100)
+        )
+        tokens = f'deepresearch_tokens_total{{stage="summary",model="{service.MODEL_NAME}",kind="total"}}'
+        before_tokens = self._value(tokens)
+        before_count = self._value('deepresearch_stage_duration_seconds_count{stage="summary"}')
+
+        with mock.patch.object(service, 'OPENROUTER_API_KEY', 'key'), \
+                mock.patch.object(service, 'client', fake_client):
+            service.SUMMARY_CACHE.clear()
+            service.generate_search_summary([{'role': 'user', 'content': '宠物健身APP metrics'}], 'market-analysis')
+
+        self.assertEqual(self._value(tokens) - before_tokens, 100)
+        self.assertEqual(self._value('deepresearch_stage_duration_seconds_count{stage="summary"}') - before_count, 1)
+
+    def test_chapter_tokens_include_summary_call(self):
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.side_effect = [
+            SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content='宠物 健身 市场规模'))],
+                usage=SimpleNamespace(prompt_tokens=90, completion_tokens=10, total_tokens=100)
+            ),
+            SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content='综合内容'))],
+                usage=SimpleNamespace(prompt_tokens=500, completion_tokens=300, total_tokens=800)
+            )
+        ]
+        research = mock.Mock()
+        research.generate_chapter.return_value = {'content': '检索内容', 'sources': [], 'tokens': 5}
+
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'), \
+                mock.patch.object(service, 'DEEPRESEARCH_API_KEY', 'key'), \
+                mock.patch.object(service, 'OPENROUTER_API_KEY', 'key'), \
+                mock.patch.object(service, 'FALLBACK_RESEARCH_CLIENTS', []), \
+                mock.patch.object(service, 'research_client', research), \
+                mock.patch.object(service, 'client', fake_client):
+            service.SUMMARY_CACHE.clear()
+            result = service.generate_chapter_content(
+                'market-analysis', [{'role': 'user', 'content': '宠物健身APP tokens'}], research_depth='shallow'
+            )
+
+        self.assertEqual(fake_client.chat.completions.create.call_count, 2)
+        self.assertEqual(result['tokens'], 900)
+
+    def test_document_queue_gauges_track_submitted_chapters(self):
+        started, release = threading.Event(), threading.Event()
+        queued, active = metrics.DOCUMENT_QUEUED.value, metrics.DOCUMENT_ACTIVE.value
+
+        def chapter():
+            started.set()
+            release.wait(5)
+            return 'done'
+
+        future = service.submit_document_chapter(chapter)
+        self.assertTrue(started.wait(5))
+        self.assertEqual(metrics.DOCUMENT_QUEUED.value, queued)
+        self.assertEqual(metrics.DOCUMENT_ACTIVE.value, active + 1)
+        release.set()
+
+        self.assertEqual(future.result(5), 'done')
+        self.assertEqual(metrics.DOCUMENT_ACTIVE.value, active)
+        self.assertIn('deepresearch_document_queue_depth', metrics.REGISTRY.render())
+
+    def test_ranking_counts_kept_and_dropped_sources(self):
+        before_kept = self._value('deepresearch_ranked_sources_total{outcome="kept"}')
+        before_dropped = self._value('deepresearch_ranked_sources_total{outcome="dropped"}')
+        raw = [
+            {'title': '宠物健身市场规模', 'url': 'https://a.example.com/1', 'snippet': '宠物健身市场规模', 'relevance': 1},
+            {'title': '无关', 'url': 'https://b.example.com/2', 'snippet': '', 'relevance': 0}
+        ]
+        kept = service.rank_and_filter_sources(raw, [{'role': 'user', 'content': '宠物健身'}], 'market-analysis')
+
+        self.assertEqual(self._value('deepresearch_ranked_sources_total{outcome="kept"}') - before_kept, len(kept))
+        self.assertEqual(
+            self._value('deepresearch_ranked_sources_total{outcome="dropped"}') - before_dropped, 2 - len(kept)
+        )
+
+    def test_metrics_endpoint_serves_prometheus_text(self):
+        response = service.app.test_client().get('/metrics')
+        text = response.get_data(as_text=True)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        self.assertIn('# TYPE deepresearch_stage_duration_seconds histogram', text)
+        self.assertIn('deepresearch_in_flight_requests{endpoint="metrics_endpoint"} 1', text)
+        self.assertIn('deepresearch_cache_hit_ratio{cache="summary"}', text)
+
+
+if __name__ == '__main__':
+    unittest.main()
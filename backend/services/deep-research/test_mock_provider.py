@@ -0,0 +1,125 @@
+import asyncio
+import json
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import app as service
+from circuit_breaker import BreakerRegistry, FailoverChain
+from deep_research_client import DeepResearchClient
+from mock_provider import LatencyModel, MockSearchBackend
+from retry_policy import RetryPolicy, UpstreamError
+from source_dedup import canonicalize_url
+
+
+def _backend(**kwargs):
+    kwargs.setdefault('seed', 7)
+    kwargs.setdefault('sleep', lambda seconds: None)
+    return MockSearchBackend(**kwargs)
+
+
+class MockSearchBackendTests(unittest.TestCase):
+    def test_same_seed_gives_same_results(self):
+        first = _backend().search('宠物 健身 市场规模')
+        second = _backend().search('宠物 健身 市场规模')
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, _backend(seed=8).search('宠物 健身 市场规模'))
+
+    def test_result_counts_sizes_and_duplicates(self):
+        backend = _backend(results=(5, 15), duplicate_rate=0.3)
+        counts = []
+        urls = []
+        for index in range(20):
+            results = backend.search(f'宠物 健身 {index}')['results']
+            counts.append(len(results))
+            urls.extend(r['url'] for r in results)
+            for result in results:
+                self.assertTrue(12 <= len(result['title']) <= 48)
+                self.assertTrue(150 <= len(result['content']) <= 800)
+
+        self.assertTrue(all(5 <= count <= 15 for count in counts))
+        self.assertGreater(len(set(counts)), 1)
+        # 重复 URL 的原始字符串不同，规范化后相同
+        self.assertGreater(len(set(urls)), len({canonicalize_url(url) for url in urls}))
+
+    def test_latency_uses_the_configured_distribution(self):
+        slept = []
+        backend = _backend(latency=LatencyModel('fixed', 0.25), sleep=slept.append)
+        backend.search('q')
+        self.assertEqual(slept, [0.25])
+
+    def test_fault_injection(self):
+        slept = []
+        with self.assertRaises(TimeoutError):
+            _backend(timeout_rate=1.0, timeout_seconds=3, sleep=slept.append).search('q')
+        self.assertEqual(slept, [3])
+
+        with self.assertRaises(UpstreamError) as raised:
+            _backend(rate_limit_rate=1.0).search('q')
+        self.assertEqual(raised.exception.status_code, 429)
+
+        backend = _backend(malformed_rate=1.0)
+        with self.assertRaises(json.JSONDecodeError):
+            backend.search('q')
+        self.assertEqual(backend.stats()['faults'], {'timeout': 0, 'rate_limit': 0, 'malformed': 1})
+
+    def test_async_search_does_not_block_the_event_loop(self):
+        backend = _backend(latency=LatencyModel('fixed', 0.05))
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            await asyncio.gather(*(backend.asearch(f'q{index}') for index in range(10)))
+            return loop.time() - started
+
+        self.assertLess(asyncio.run(run()), 0.4)
+
+
+class MockProviderClientTests(unittest.TestCase):
+    def test_rate_limits_are_retried_and_malformed_queries_skipped(self):
+        backend = _backend(rate_limit_rate=0.3, malformed_rate=0.3)
+        client = DeepResearchClient(
+            provider='mock',
+            mock_backend=backend,
+            retry_policy=RetryPolicy(max_retries=3, base_delay=0, max_delay=0)
+        )
+        queries = [f'宠物健身 市场 {index}' for index in range(6)]
+
+        results = client._run_search_queries(queries, 'medium', search=client._search_mock)
+
+        self.assertGreater(backend.stats()['faults']['rate_limit'], 0)
+        self.assertTrue(0 < len(results) <= len(queries))
+
+    def test_chapter_pipeline_runs_ranking_and_synthesis(self):
+        backend = _backend(results=(10, 10), duplicate_rate=0.3)
+        research = DeepResearchClient(provider='mock', mock_backend=backend)
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='市场规模持续增长 [1]。'))],
+            usage=SimpleNamespace(total_tokens=9)
+        )
+        breakers = BreakerRegistry()
+
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'mock'), \
+                mock.patch.object(service, 'DEEPRESEARCH_API_KEY', None), \
+                mock.patch.object(service, 'FALLBACK_RESEARCH_CLIENTS', []), \
+                mock.patch.object(service, 'research_client', research), \
+                mock.patch.object(service, 'client', fake_client), \
+                mock.patch.object(service, 'BREAKERS', breakers), \
+                mock.patch.object(service, 'FAILOVER', FailoverChain(breakers)), \
+                mock.patch.object(service, 'generate_search_summary', return_value=None):
+            result = service.generate_chapter_content(
+                'market-analysis', [{'role': 'user', 'content': '宠物健身APP 市场规模'}], research_depth='shallow'
+            )
+
+        self.assertEqual(result['provider'], 'mock')
+        self.assertIn('synthesis', result['timings'])
+        self.assertIn('ranking', result['timings'])
+        self.assertGreater(backend.stats()['calls'], 0)
+        urls = [canonicalize_url(source['url']) for source in result['sources']]
+        self.assertTrue(urls)
+        self.assertEqual(len(urls), len(set(urls)))
+
+
+if __name__ == '__main__':
+    unittest.main()
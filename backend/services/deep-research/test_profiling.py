@@ -0,0 +1,124 @@
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import app as service
+import metrics
+from profiling import PROFILE_HEADER, RequestProfiler
+
+
+def _busy_work():
+    return sum(i * i for i in range(2000))
+
+
+class RequestTimingsTests(unittest.TestCase):
+    def test_stages_are_collected_only_inside_the_request_context(self):
+        metrics.observe_stage('ranking', 1.0)
+        with metrics.collect_timings() as timings:
+            metrics.observe_stage('summary', 0.5)
+            metrics.observe_stage('search', 0.25)
+            metrics.observe_stage('search', 0.25)
+
+            worker = threading.Thread(target=lambda: metrics.observe_stage('synthesis', 9))
+            worker.start()
+            worker.join()
+
+        result = timings.to_dict()
+        self.assertEqual(result['summary'], 0.5)
+        self.assertEqual(result['search'], 0.5)
+        self.assertNotIn('ranking', result)
+        # 未复制上下文的线程不计入当前请求
+        self.assertNotIn('synthesis', result)
+        self.assertIn('total', result)
+
+    def test_chapter_response_carries_timings(self):
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content='章节内容'))],
+            usage=SimpleNamespace(total_tokens=5)
+        )
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'openrouter'), \
+                mock.patch.object(service, 'FALLBACK_RESEARCH_CLIENTS', []), \
+                mock.patch.object(service, 'client', fake_client):
+            result = service.generate_chapter_content(
+                'market-analysis', [{'role': 'user', 'content': '宠物健身APP'}], research_depth='shallow'
+            )
+
+        self.assertEqual(
+            set(result['timings']), {'prompt', 'single-shot', 'post-processing', 'total'}
+        )
+
+
+class RequestProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.profiler = RequestProfiler(self.directory.name, enabled=True, keep=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_requested_only_when_enabled(self):
+        self.assertTrue(self.profiler.requested({PROFILE_HEADER: '1'}, {}))
+        self.assertTrue(self.profiler.requested({}, {'profile': 'true'}))
+        self.assertFalse(self.profiler.requested({}, {}))
+        disabled = RequestProfiler(self.directory.name, enabled=False)
+        self.assertFalse(disabled.requested({PROFILE_HEADER: '1'}, {}))
+
+    def test_profile_is_saved_and_reported(self):
+        with self.profiler.profile('market-analysis') as record:
+            _busy_work()
+
+        info = record.to_dict()
+        self.assertEqual(info['url'], f'/debug/profiles/{record.profile_id}')
+        self.assertTrue(record.path.is_file())
+        report = self.profiler.report(record.profile_id)
+        self.assertIn('_busy_work', report)
+        self.assertIsNone(self.profiler.report('../../etc/passwd'))
+
+    def test_not_requested_yields_none_and_old_profiles_are_pruned(self):
+        with self.profiler.profile('x', requested=False) as record:
+            self.assertIsNone(record)
+        for _ in range(3):
+            with self.profiler.profile('x'):
+                _busy_work()
+        self.assertEqual(len(self.profiler.list()), 2)
+
+    def test_concurrent_profile_is_skipped(self):
+        with self.profiler.profile('outer'):
+            with self.profiler.profile('inner') as inner:
+                pass
+        self.assertIn('skipped', inner.to_dict())
+
+
+class ProfileRouteTests(unittest.TestCase):
+    def test_chapter_request_with_profile_header(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        profiler = RequestProfiler(directory.name, enabled=True)
+
+        def fake_generate(**params):
+            _busy_work()
+            return {'chapterId': params['chapter_id'], 'timings': {'total': 0.1}}
+
+        client = service.app.test_client()
+        with mock.patch.object(service, 'PROFILER', profiler), \
+                mock.patch.object(service, 'generate_chapter_content', side_effect=fake_generate):
+            response = client.post('/research/business-plan-chapter', headers={PROFILE_HEADER: '1'}, json={
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP'}]
+            })
+            profile = response.get_json()['profile']
+            report = client.get(profile['url'])
+
+        self.assertEqual(report.status_code, 200)
+        self.assertIn('fake_generate', report.get_data(as_text=True))
+
+    def test_debug_endpoint_hidden_when_disabled(self):
+        response = service.app.test_client().get('/debug/profiles')
+        self.assertEqual(response.status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
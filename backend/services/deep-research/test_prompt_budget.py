@@ -0,0 +1,66 @@
+import unittest
+
+import app
+from prompt_budget import estimate_tokens, fit_to_budget
+
+
+def _sources(count):
+    return [
+        {'title': f'来源{i}', 'url': f'https://example.com/{i}', 'snippet': f'第{i}条：' + '市场规模与增长数据' * 20}
+        for i in range(count)
+    ]
+
+
+class EstimateTokensTests(unittest.TestCase):
+    def test_cjk_and_ascii(self):
+        self.assertEqual(estimate_tokens(''), 0)
+        self.assertEqual(estimate_tokens('市场规模'), 4)
+        self.assertEqual(estimate_tokens('abcdefgh'), 2)
+
+
+class FitToBudgetTests(unittest.TestCase):
+    def render(self, turns, sources):
+        return '\n'.join(t['content'] for t in turns) + '\n' + '\n'.join(s['snippet'] for s in sources)
+
+    def test_under_budget_is_untouched(self):
+        turns = [{'role': 'user', 'content': '宠物健身'}]
+        prompt, kept_turns, kept_sources, report = fit_to_budget(self.render, turns, _sources(2), 10000)
+        self.assertEqual(len(kept_sources), 2)
+        self.assertEqual(report.saved_tokens, 0)
+
+    def test_drops_lowest_sources_then_oldest_turns(self):
+        turns = [{'role': 'user', 'content': f'第{i}轮' + '对话' * 50} for i in range(4)]
+        prompt, kept_turns, kept_sources, report = fit_to_budget(
+            self.render, turns, _sources(8), 900, min_sources=3
+        )
+        self.assertLessEqual(report.final_tokens, 900)
+        self.assertEqual([s['title'] for s in kept_sources], ['来源0', '来源1', '来源2'])
+        self.assertEqual(kept_turns[-1]['content'], turns[-1]['content'])
+        self.assertGreater(report.saved_tokens, 0)
+
+    def test_truncates_single_oversized_turn(self):
+        turns = [{'role': 'user', 'content': '长' * 5000}]
+        prompt, kept_turns, _, report = fit_to_budget(self.render, turns, [], 1000)
+        self.assertTrue(report.truncated)
+        self.assertLessEqual(report.final_tokens, 1000)
+
+
+class SynthesisPromptTests(unittest.TestCase):
+    def test_sources_are_inserted_in_full_only_once(self):
+        sources = _sources(2)
+        prompt, kept, report = app.assemble_synthesis_prompt(
+            'market-analysis', [{'role': 'user', 'content': '宠物健身APP'}], sources
+        )
+        self.assertEqual(prompt.count(sources[0]['snippet']), 1)
+        self.assertEqual(prompt.count('[1] 来源0 - https://example.com/0'), 2)
+        self.assertGreater(report.saved_tokens, 0)
+
+    def test_budget_trims_sources_used_for_citations(self):
+        conversation = [{'role': 'user', 'content': '宠物健身APP'}]
+        prompt, kept, report = app.assemble_synthesis_prompt('market-analysis', conversation, _sources(10), 1500)
+        self.assertLess(len(kept), 10)
+        self.assertNotIn(f'[{len(kept) + 1}] ', prompt)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from prompt_templates import CompiledTemplate, TemplateRegistry
+
+
+class CompiledTemplateTests(unittest.TestCase):
+    def test_single_pass_render(self):
+        template = CompiledTemplate('章节: {chapter_id}\n{conversation}\n{unknown}')
+        rendered = template.render(chapter_id='market-analysis', conversation='user: 含有 {chapter_id} 的对话')
+        # 代入的对话文本不会被再次替换，未提供的占位符原样保留
+        self.assertEqual(rendered, '章节: market-analysis\nuser: 含有 {chapter_id} 的对话\n{unknown}')
+        self.assertEqual(template.placeholders, {'chapter_id', 'conversation', 'unknown'})
+
+
+class TemplateRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / 'chapters').mkdir()
+        (self.root / 'chapters' / 'market-analysis.md').write_text(
+            '---\nmetadata:\n  name: x\n---\n市场分析：{conversation}', encoding='utf-8'
+        )
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_preloads_and_strips_frontmatter(self):
+        registry = TemplateRegistry(self.root, poll_interval=0)
+        template = registry.get('chapters/market-analysis.md')
+        self.assertEqual(template.render(conversation='宠物'), '市场分析：宠物')
+        self.assertGreater(registry.version('chapters/market-analysis.md'), 0)
+        self.assertEqual(registry.get('missing.md', '兜底{conversation}').render(conversation='a'), '兜底a')
+        self.assertEqual(registry.version('missing.md'), 0.0)
+
+    def test_reloads_only_on_refresh(self):
+        registry = TemplateRegistry(self.root, poll_interval=0)
+        path = self.root / 'chapters' / 'market-analysis.md'
+        path.write_text('新模板：{conversation}', encoding='utf-8')
+        os.utime(path, (time.time() + 10, time.time() + 10))
+        self.assertEqual(registry.get('chapters/market-analysis.md').render(conversation='a'), '市场分析：a')
+
+        self.assertEqual(registry.refresh(), 1)
+        self.assertEqual(registry.get('chapters/market-analysis.md').render(conversation='a'), '新模板：a')
+        self.assertEqual(registry.stats()['reloads'], 1)
+
+        path.unlink()
+        registry.refresh()
+        self.assertEqual(registry.version('chapters/market-analysis.md'), 0.0)
+
+    def test_background_poll_picks_up_changes(self):
+        registry = TemplateRegistry(self.root, poll_interval=0.05)
+        registry.start()
+        try:
+            (self.root / 'synthesis.md').write_text('合成：{sources}', encoding='utf-8')
+            deadline = time.time() + 2
+            while registry.version('synthesis.md') == 0.0 and time.time() < deadline:
+                time.sleep(0.02)
+            self.assertEqual(registry.get('synthesis.md').render(sources='[1]'), '合成：[1]')
+        finally:
+            registry.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import unittest
+
+import app
+from request_context import RequestContext, compact_turns
+
+
+class RequestContextTests(unittest.TestCase):
+    def test_matches_previous_formatting(self):
+        history = [
+            {'role': 'user', 'content': '做一个宠物健身APP'},
+            {'role': 'assistant', 'content': '目标用户是谁？'}
+        ]
+        context = RequestContext(history)
+        self.assertEqual(context.text, 'user: 做一个宠物健身APP\nassistant: 目标用户是谁？')
+        self.assertEqual(context.last_user_message, '做一个宠物健身APP')
+        self.assertIs(RequestContext.of(context), context)
+        self.assertEqual(app.format_conversation(context), context.text)
+
+    def test_string_history(self):
+        context = RequestContext('宠物健身 app')
+        self.assertEqual(context.text, '宠物健身 app')
+        self.assertIn('app', context.intent_tokens)
+
+    def test_intent_keywords_skip_stopwords_and_duplicates(self):
+        context = RequestContext([{'role': 'user', 'content': 'Pet fitness 项目 pet 健身 的'}])
+        self.assertEqual(context.intent_tokens, ('user', 'pet', 'fitness', '健身'))
+        keywords = app._extract_intent_keywords(context, 'market-analysis')
+        self.assertEqual(keywords[-3:], ['pet', 'fitness', '健身'])
+
+    def test_long_conversation_is_bounded(self):
+        history = [{'role': 'user', 'content': '产品创意：宠物健身'}]
+        history += [{'role': 'assistant' if i % 2 else 'user', 'content': f'第{i}轮' + '内容' * 500} for i in range(200)]
+        turns = compact_turns(history, max_chars=10000, turn_max_chars=2000)
+        self.assertLessEqual(sum(len(t['content']) for t in turns), 10000 + 2000)
+        self.assertEqual(turns[0]['content'], '产品创意：宠物健身')
+        self.assertTrue(turns[-1]['content'].startswith('第199轮'))
+
+    def test_fingerprint_uses_full_history(self):
+        base = [{'role': 'user', 'content': '创意'}] + [{'role': 'user', 'content': 'x' * 7000}] * 10
+        changed = [{'role': 'user', 'content': '创意'}, {'role': 'user', 'content': 'y'}] + base[2:]
+        self.assertNotEqual(RequestContext(base).fingerprint, RequestContext(changed).fingerprint)
+        self.assertNotEqual(
+            app.summary_cache_key(base, 'market-analysis'),
+            app.summary_cache_key(changed, 'market-analysis')
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,244 @@
+import json
+import threading
+import time
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import app as service
+from circuit_breaker import BreakerRegistry, FailoverChain
+from deep_research_client import DeepResearchClient
+
+
+def _fake_chapter(chapter_id, conversation_history, **kwargs):
+    if chapter_id == 'team-structure':
+        raise RuntimeError('upstream timeout')
+    return {'chapterId': chapter_id, 'content': f'# {chapter_id}', 'sources': [], 'tokens': 10}
+
+
+class DocumentEndpointTests(unittest.TestCase):
+    def setUp(self):
+        self.client = service.app.test_client()
+
+    def test_document_returns_chapters_in_order_and_failures(self):
+        with mock.patch.object(service, 'generate_chapter_content', side_effect=_fake_chapter), \
+                mock.patch.object(service, 'uses_retrieval_provider', return_value=True), \
+                mock.patch.object(service, 'generate_search_summary', return_value='摘要') as summary:
+            response = self.client.post('/research/document', json={
+                'type': 'business',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP'}]
+            })
+
+        body = response.get_json()
+        self.assertEqual(response.status_code, 200)
+        expected = [c for c in service.DOCUMENT_CHAPTERS['business'] if c != 'team-structure']
+        self.assertEqual([c['chapterId'] for c in body['chapters']], expected)
+        self.assertEqual(body['failures'][0]['chapterId'], 'team-structure')
+        self.assertEqual(body['tokens'], 10 * len(expected))
+        self.assertEqual(summary.call_count, 1)
+        # 共享摘要覆盖全部章节，而不是以文档类型作为章节
+        self.assertEqual(summary.call_args.args[1], ', '.join(service.DOCUMENT_CHAPTERS['business']))
+
+    def test_document_rejects_foreign_chapter(self):
+        response = self.client.post('/research/document', json={
+            'type': 'proposal',
+            'conversationHistory': [{'role': 'user', 'content': 'x'}],
+            'chapterIds': ['market-analysis']
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class ChapterErrorTests(unittest.TestCase):
+    def test_exhausted_upstream_retries_are_not_retryable(self):
+        client = service.app.test_client()
+        exhausted = service.RetriesExhausted('openrouter.synthesis', 5, TimeoutError('read timeout'))
+        with mock.patch.object(service, 'generate_chapter_content', side_effect=exhausted):
+            response = client.post('/research/business-plan-chapter', json={
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP'}]
+            })
+
+        body = response.get_json()
+        self.assertEqual(response.status_code, 502)
+        self.assertFalse(body['retryable'])
+        self.assertEqual(body['attempts'], 6)
+
+
+def _chunk(content=None, usage=None):
+    choices = [SimpleNamespace(delta=SimpleNamespace(content=content))] if content is not None else []
+    return SimpleNamespace(choices=choices, usage=usage)
+
+
+class ChapterResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.client = service.app.test_client()
+        self.request = {
+            'chapterId': 'market-analysis',
+            'conversationHistory': [{'role': 'user', 'content': '宠物健身APP'}]
+        }
+
+    def _post(self, body=None, headers=None):
+        return self.client.post('/research/business-plan-chapter', json=body or self.request, headers=headers)
+
+    def test_repeated_request_is_served_from_cache(self):
+        with mock.patch.object(service, 'CHAPTER_CACHE', service.SizedTTLCache(max_bytes=1 << 20, ttl=60)), \
+                mock.patch.object(service, 'generate_chapter_content', side_effect=_fake_chapter) as generate:
+            first = self._post()
+            second = self._post()
+            bypassed = self._post(headers={service.CHAPTER_CACHE_HEADER: 'bypass'})
+            other_depth = self._post(dict(self.request, researchDepth='deep'))
+
+        self.assertEqual(first.headers[service.CHAPTER_CACHE_HEADER], 'MISS')
+        self.assertEqual(second.headers[service.CHAPTER_CACHE_HEADER], 'HIT')
+        self.assertEqual(second.get_json(), first.get_json())
+        self.assertEqual(bypassed.headers[service.CHAPTER_CACHE_HEADER], 'BYPASS')
+        self.assertEqual(other_depth.headers[service.CHAPTER_CACHE_HEADER], 'MISS')
+        self.assertEqual(generate.call_count, 3)
+
+    def test_key_changes_with_conversation_and_model(self):
+        history = self.request['conversationHistory']
+        key = service.chapter_cache_key('market-analysis', history, 'business', 'medium')
+        self.assertNotEqual(
+            key, service.chapter_cache_key('market-analysis', [{'role': 'user', 'content': '社区团购'}], 'business', 'medium')
+        )
+        with mock.patch.object(service, 'MODEL_NAME', 'other/model'):
+            self.assertNotEqual(key, service.chapter_cache_key('market-analysis', history, 'business', 'medium'))
+
+    def test_degraded_results_are_not_cached(self):
+        cache = service.SizedTTLCache(max_bytes=1 << 20, ttl=60)
+        with mock.patch.object(service, 'CHAPTER_CACHE', cache), \
+                mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'):
+            service.store_chapter_result('k', {'provider': 'openrouter'})
+        self.assertEqual(len(cache), 0)
+
+    def test_disabled_cache_adds_no_header(self):
+        with mock.patch.object(service, 'CHAPTER_CACHE', None), \
+                mock.patch.object(service, 'generate_chapter_content', side_effect=_fake_chapter):
+            response = self._post()
+        self.assertNotIn(service.CHAPTER_CACHE_HEADER, response.headers)
+
+
+class _FakeStream(list):
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class ChapterStreamTests(unittest.TestCase):
+    def _events(self, body):
+        events = []
+        for block in body.strip().split('\n\n'):
+            lines = dict(line.split(': ', 1) for line in block.split('\n'))
+            events.append((lines['event'], json.loads(lines['data'])))
+        return events
+
+    def test_stream_emits_stages_tokens_and_final_result(self):
+        sources = [{'title': '来源A', 'url': 'https://a.example.com', 'snippet': '', 'relevance': 0.9}]
+        stream = _FakeStream([_chunk('市场'), _chunk('规模 [1]'), _chunk(usage=SimpleNamespace(total_tokens=42))])
+        fake_client = mock.Mock()
+        fake_client.chat.completions.create.return_value = stream
+
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'), \
+                mock.patch.object(service, 'DEEPRESEARCH_API_KEY', 'key'), \
+                mock.patch.object(service, 'client', fake_client), \
+                mock.patch.object(service, 'generate_search_summary', return_value='摘要'), \
+                mock.patch.object(service, 'collect_chapter_sources', return_value=({}, sources)):
+            response = service.app.test_client().post('/research/business-plan-chapter/stream', json={
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP'}]
+            })
+            events = self._events(response.get_data(as_text=True))
+
+        self.assertEqual(response.mimetype, 'text/event-stream')
+        stages = [data['stage'] for name, data in events if name == 'stage']
+        self.assertEqual(stages, ['started', 'summary', 'sources', 'synthesis'])
+        tokens = [data['content'] for name, data in events if name == 'token']
+        self.assertEqual(tokens, ['市场', '规模 [1]'])
+        name, done = events[-1]
+        self.assertEqual(name, 'done')
+        self.assertEqual(done['tokens'], 42)
+        self.assertIn('1. 来源A - https://a.example.com', done['content'])
+        self.assertTrue(stream.closed)
+
+
+class ResearchJobRouteTests(unittest.TestCase):
+    def test_submit_then_poll_job(self):
+        def fake_generate(progress_callback=None, **params):
+            progress_callback('synthesis', 0.7, '合成')
+            return {'chapterId': params['chapter_id'], 'content': 'ok'}
+
+        client = service.app.test_client()
+        with mock.patch.object(service, 'generate_chapter_content', side_effect=fake_generate):
+            submitted = client.post('/research/jobs', json={
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP'}]
+            })
+            self.assertEqual(submitted.status_code, 202)
+            job_id = submitted.get_json()['jobId']
+            for _ in range(200):
+                body = client.get(f'/research/jobs/{job_id}').get_json()
+                if body['status'] == 'succeeded':
+                    break
+                time.sleep(0.005)
+
+        self.assertEqual(body['result']['chapterId'], 'market-analysis')
+        self.assertEqual(client.get('/research/jobs/missing').status_code, 404)
+
+    def test_cancel_during_search_stops_the_job(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        research = DeepResearchClient(provider='tavily', api_key='key', search_concurrency=2)
+        calls = []
+
+        def search(query, depth):
+            calls.append(query)
+            if len(calls) > 1:
+                release.wait(5)
+            return {'results': [], 'answer': ''}
+
+        research._search_tavily = search
+        fake_client = mock.Mock()
+        breakers = BreakerRegistry()
+        client = service.app.test_client()
+
+        with mock.patch.object(service, 'DEEPRESEARCH_PROVIDER', 'tavily'), \
+                mock.patch.object(service, 'DEEPRESEARCH_API_KEY', 'key'), \
+                mock.patch.object(service, 'FALLBACK_RESEARCH_CLIENTS', []), \
+                mock.patch.object(service, 'research_client', research), \
+                mock.patch.object(service, 'client', fake_client), \
+                mock.patch.object(service, 'BREAKERS', breakers), \
+                mock.patch.object(service, 'FAILOVER', FailoverChain(breakers, is_abort=service.is_interruption)), \
+                mock.patch.object(service, 'generate_search_summary', return_value='宠物健身APP 线上课程'):
+            job_id = client.post('/research/jobs', json={
+                'chapterId': 'market-analysis',
+                # 对话较长时拆分为多条检索 query
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP 任务取消 ' + '线上课程 ' * 80}]
+            }).get_json()['jobId']
+            # 等到第一条 query 完成的进度上报
+            for _ in range(400):
+                body = client.get(f'/research/jobs/{job_id}').get_json()
+                if body['stage'] == 'search' and body['progress'] > 0.2:
+                    break
+                time.sleep(0.005)
+            self.assertGreater(body['progress'], 0.2)
+            self.assertIn('检索完成', body['message'])
+
+            cancelled_at = time.monotonic()
+            client.delete(f'/research/jobs/{job_id}')
+            for _ in range(400):
+                body = client.get(f'/research/jobs/{job_id}').get_json()
+                if body['status'] != 'running':
+                    break
+                time.sleep(0.005)
+
+        # 其余检索仍阻塞时任务即结束，且不再发出合成请求
+        self.assertEqual(body['status'], 'cancelled')
+        self.assertLess(time.monotonic() - cancelled_at, 1.5)
+        self.assertFalse(release.is_set())
+        fake_client.chat.completions.create.assert_not_called()
+        self.assertEqual(breakers.get('tavily').stats()['failures'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,177 @@
+import asyncio
+import threading
+import time
+import unittest
+
+import deadlines
+from retry_policy import (
+    FATAL, RETRYABLE, RetriesExhausted, RetryPolicy, UpstreamError, classify_error, find_error
+)
+
+
+class _Response:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class _StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f'status {status_code}')
+        self.response = _Response(status_code, headers)
+
+
+class ClassifyErrorTests(unittest.TestCase):
+    def test_status_codes(self):
+        self.assertEqual(classify_error(UpstreamError('x', 429)), RETRYABLE)
+        self.assertEqual(classify_error(UpstreamError('x', 503)), RETRYABLE)
+        self.assertEqual(classify_error(_StatusError(502)), RETRYABLE)
+        self.assertEqual(classify_error(UpstreamError('x', 401)), FATAL)
+        self.assertEqual(classify_error(_StatusError(400)), FATAL)
+
+    def test_transport_errors(self):
+        self.assertEqual(classify_error(TimeoutError()), RETRYABLE)
+        self.assertEqual(classify_error(ConnectionResetError()), RETRYABLE)
+        self.assertEqual(classify_error(ValueError('bug')), FATAL)
+
+
+class RetryPolicyTests(unittest.TestCase):
+    def _policy(self, **kwargs):
+        self.sleeps = []
+        return RetryPolicy(sleep=self.sleeps.append, **kwargs)
+
+    def test_retries_retryable_errors_with_backoff(self):
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if len(calls) < 3:
+                raise UpstreamError('busy', 503)
+            return 'ok'
+
+        policy = self._policy(max_retries=3, base_delay=1.0, max_delay=5.0)
+        self.assertEqual(policy.call(fn, name='t'), 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(self.sleeps), 2)
+        self.assertTrue(0 <= self.sleeps[0] <= 1.0 and 0 <= self.sleeps[1] <= 2.0)
+        self.assertEqual(policy.stats()['t']['retries'], 2)
+
+    def test_fatal_errors_are_not_retried(self):
+        policy = self._policy(max_retries=3)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            raise UpstreamError('unauthorized', 401)
+
+        with self.assertRaises(UpstreamError):
+            policy.call(fn, name='t')
+        self.assertEqual(len(calls), 1)
+
+    def test_exhausted_retries_are_marked(self):
+        policy = self._policy(max_retries=2)
+        with self.assertRaises(RetriesExhausted) as ctx:
+            policy.call(lambda: (_ for _ in ()).throw(UpstreamError('down', 500)), name='t')
+        self.assertEqual(ctx.exception.attempts, 2)
+        wrapped = None
+        try:
+            try:
+                raise ctx.exception
+            except Exception as inner:
+                raise Exception(f'DeepResearch生成失败: {inner}')
+        except Exception as outer:
+            wrapped = outer
+        self.assertIs(find_error(wrapped, RetriesExhausted), ctx.exception)
+
+    def test_retry_after_is_respected(self):
+        policy = self._policy(max_retries=1, max_delay=30)
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                raise _StatusError(429, {'retry-after': '7'})
+            return 'ok'
+
+        policy.call(fn, name='t')
+        self.assertEqual(self.sleeps, [7.0])
+
+    def _warmed_hedge_policy(self, **kwargs):
+        policy = RetryPolicy(max_retries=0, hedge_percentile=50, hedge_min_samples=3, **kwargs)
+        for _ in range(3):
+            policy.call(lambda: time.sleep(0.01), name='search', hedge=True)
+        return policy
+
+    def test_hedged_request_takes_faster_copy(self):
+        policy = self._warmed_hedge_policy()
+        lock = threading.Lock()
+        calls = []
+
+        def fn():
+            with lock:
+                calls.append(threading.current_thread())
+                first = len(calls) == 1
+            # 主调用被放弃（截止时间取消）时提前结束
+            deadlines.sleep(1.0) if first else time.sleep(0.01)
+            return 'slow' if first else 'fast'
+
+        started = time.monotonic()
+        self.assertEqual(policy.call(fn, name='search', hedge=True), 'fast')
+        self.assertLess(time.monotonic() - started, 0.5)
+        # 主调用在调用方线程执行，只有备份另起线程
+        self.assertIs(calls[0], threading.current_thread())
+        self.assertIsNot(calls[1], threading.current_thread())
+        self.assertEqual(policy.stats()['search']['hedge_wins'], 1)
+
+    def test_losing_backup_is_abandoned(self):
+        policy = self._warmed_hedge_policy()
+        backup_finished = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                time.sleep(0.1)
+                return 'primary'
+            deadlines.sleep(5.0)
+            backup_finished.set()
+            return 'backup'
+
+        self.assertEqual(policy.call(fn, name='search', hedge=True), 'primary')
+        self.assertTrue(backup_finished.wait(1.0))
+        self.assertEqual(policy.stats()['search']['hedges'], 1)
+        self.assertEqual(policy.stats()['search']['hedge_wins'], 0)
+
+    def test_hedges_in_flight_are_capped(self):
+        policy = self._warmed_hedge_policy(max_hedges=1)
+        results = []
+
+        def run():
+            results.append(policy.call(lambda: deadlines.sleep(0.2) or 'ok', name='search', hedge=True))
+
+        threads = [threading.Thread(target=run) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['ok', 'ok'])
+        self.assertEqual(policy.stats()['search']['hedges'], 1)
+        self.assertEqual(policy.stats()['search']['hedges_skipped'], 1)
+
+    def test_async_call_retries(self):
+        policy = self._policy(max_retries=2, base_delay=0)
+        calls = []
+
+        async def fn():
+            calls.append(1)
+            if len(calls) == 1:
+                raise TimeoutError()
+            return 'ok'
+
+        self.assertEqual(asyncio.run(policy.acall(fn, name='t')), 'ok')
+        self.assertEqual(len(calls), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
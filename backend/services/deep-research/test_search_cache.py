@@ -0,0 +1,52 @@
+import os
+import tempfile
+import time
+import unittest
+
+from search_cache import SearchResultCache
+
+
+class SearchResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'cache.sqlite3')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_normalizes_query_whitespace_and_case(self):
+        a = SearchResultCache.make_key('tavily', ' Pet  Fitness APP ', 'basic', 10)
+        b = SearchResultCache.make_key('tavily', 'pet fitness app', 'basic', 10)
+        c = SearchResultCache.make_key('tavily', 'pet fitness app', 'advanced', 10)
+        self.assertEqual(a, b)
+        self.assertNotEqual(a, c)
+
+    def test_round_trip_is_shared_between_instances(self):
+        SearchResultCache(self.path).set('k', {'results': [1, 2]})
+        value, stale = SearchResultCache(self.path).get('k')
+        self.assertEqual(value, {'results': [1, 2]})
+        self.assertFalse(stale)
+
+    def test_stale_window(self):
+        cache = SearchResultCache(self.path, ttl=0.01, stale_ttl=60)
+        cache.set('k', 'v')
+        time.sleep(0.02)
+        self.assertEqual(cache.get('k'), ('v', True))
+
+        expired = SearchResultCache(self.path, ttl=0.01, stale_ttl=0)
+        self.assertIsNone(expired.get('k'))
+
+    def test_size_eviction_drops_least_recently_accessed(self):
+        cache = SearchResultCache(self.path, max_bytes=250)
+        cache.set('old', 'x' * 100)
+        time.sleep(0.01)
+        cache.set('new', 'y' * 100)
+        time.sleep(0.01)
+        cache.set('newest', 'z' * 100)
+
+        self.assertIsNone(cache.get('old'))
+        self.assertIsNotNone(cache.get('newest'))
+
+
+if __name__ == '__main__':
+    unittest.main()
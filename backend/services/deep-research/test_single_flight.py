@@ -0,0 +1,388 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import app as service
+import deadlines
+from deadlines import Deadline, DeadlineExceeded, RequestCancelled
+from jobs import JobCancelled
+from retry_policy import RetriesExhausted
+from single_flight import FlightStore, FlightTimeout, LeaderFailed, SingleFlight
+
+
+class InProcessSingleFlightTests(unittest.TestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+        started = threading.Event()
+        release = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(2)
+            return {'content': '章节'}
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            leader = executor.submit(flight.do, 'k', compute)
+            started.wait(2)
+            followers = [executor.submit(flight.do, 'k', compute) for _ in range(3)]
+            time.sleep(0.05)
+            release.set()
+            results = [leader.result()] + [future.result() for future in followers]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results[0], ({'content': '章节'}, False))
+        self.assertTrue(all(shared for _, shared in results[1:]))
+        self.assertEqual(flight.stats()['followers'], 3)
+        # 执行结束后的相同请求重新执行
+        self.assertEqual(flight.do('k', lambda: 'again'), ('again', False))
+
+    def test_leader_error_is_shared(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError('upstream down')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, 'k', fail)
+            started.wait(2)
+            follower = executor.submit(flight.do, 'k', fail)
+            with self.assertRaises(RuntimeError):
+                leader.result()
+            with self.assertRaisesRegex(RuntimeError, 'upstream down'):
+                follower.result()
+
+    def test_cancelled_leader_is_not_shared_and_follower_runs_again(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        joined = threading.Event()
+
+        def cancelled():
+            started.set()
+            joined.wait(2)
+            time.sleep(0.05)
+            raise RequestCancelled('客户端已断开')
+
+        def follow():
+            joined.set()
+            return flight.do('k', lambda: 'follower result')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, 'k', cancelled)
+            started.wait(2)
+            follower = executor.submit(follow)
+            with self.assertRaises(RequestCancelled):
+                leader.result()
+            self.assertEqual(follower.result(), ('follower result', False))
+        self.assertEqual(flight.stats()['takeovers'], 1)
+
+    def test_leader_deadline_expiry_is_not_shared(self):
+        flight = SingleFlight()
+        started = threading.Event()
+        joined = threading.Event()
+
+        def expire():
+            with deadlines.scope(Deadline(0.05)):
+                started.set()
+                joined.wait(2)
+                time.sleep(0.1)
+                deadlines.check('synthesis')
+
+        def follow():
+            joined.set()
+            return flight.do('k', lambda: 'follower result')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, 'k', expire)
+            started.wait(2)
+            follower = executor.submit(follow)
+            with self.assertRaises(DeadlineExceeded):
+                leader.result()
+            self.assertEqual(follower.result(), ('follower result', False))
+        self.assertEqual(flight.stats()['takeovers'], 1)
+
+    def test_is_abort_marks_wrapped_interruptions(self):
+        flight = SingleFlight(is_abort=service.is_interruption)
+        started = threading.Event()
+        joined = threading.Event()
+
+        def cancelled_job():
+            started.set()
+            joined.wait(2)
+            time.sleep(0.05)
+            try:
+                raise JobCancelled('任务已取消')
+            except JobCancelled as cancelled:
+                raise RuntimeError('检索中止') from cancelled
+
+        def follow():
+            joined.set()
+            return flight.do('k', lambda: 'follower result')
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, 'k', cancelled_job)
+            started.wait(2)
+            follower = executor.submit(follow)
+            with self.assertRaises(RuntimeError):
+                leader.result()
+            self.assertEqual(follower.result(), ('follower result', False))
+        self.assertEqual(flight.stats()['takeovers'], 1)
+
+    def test_follower_wait_times_out(self):
+        flight = SingleFlight(wait_timeout=0.05)
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.3)
+            return 1
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            leader = executor.submit(flight.do, 'k', slow)
+            started.wait(2)
+            with self.assertRaises(FlightTimeout):
+                flight.do('k', slow)
+            self.assertEqual(leader.result(), (1, False))
+
+    def test_async_calls_share_one_execution(self):
+        flight = SingleFlight()
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {'content': '章节'}
+
+        async def run():
+            return await asyncio.gather(*(flight.ado('k', compute) for _ in range(5)))
+
+        results = asyncio.run(run())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sum(shared for _, shared in results), 4)
+
+    def test_async_cancelled_leader_does_not_cancel_followers(self):
+        flight = SingleFlight()
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return 'follower result'
+
+        async def run():
+            leader = asyncio.ensure_future(flight.ado('k', lambda: asyncio.sleep(10)))
+            await asyncio.sleep(0.01)
+            follower = asyncio.ensure_future(flight.ado('k', compute))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await leader
+            return await follower
+
+        self.assertEqual(asyncio.run(run()), ('follower result', False))
+        self.assertEqual(flight.stats()['takeovers'], 1)
+
+
+class CrossProcessSingleFlightTests(unittest.TestCase):
+    """两个 SingleFlight 实例共享同一个 FlightStore 文件，相当于同主机的两个 worker 进程"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'flights.sqlite3')
+
+    def _worker(self, lease=30, **kwargs):
+        return SingleFlight(FlightStore(self.path, lease=lease), poll_interval=0.01, **kwargs)
+
+    def test_duplicate_in_other_process_receives_leader_result(self):
+        first, second = self._worker(), self._worker()
+        started = threading.Event()
+
+        def compute():
+            started.set()
+            time.sleep(0.2)
+            return {'content': '章节', 'tokens': 10}
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(first.do, 'k', compute)
+            started.wait(2)
+            result, shared = second.do('k', lambda: self.fail('重复请求不应再次执行'))
+
+        self.assertEqual(leader.result(), ({'content': '章节', 'tokens': 10}, False))
+        self.assertEqual((result, shared), ({'content': '章节', 'tokens': 10}, True))
+
+    def test_leader_failure_is_reported_to_other_process(self):
+        first, second = self._worker(), self._worker()
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise RuntimeError('upstream down')
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(first.do, 'k', fail)
+            started.wait(2)
+            with self.assertRaisesRegex(LeaderFailed, 'upstream down'):
+                second.do('k', lambda: 'unused')
+            with self.assertRaises(RuntimeError):
+                leader.result()
+
+    def test_leader_error_classification_is_shared_with_other_process(self):
+        first = self._worker(describe_error=service.error_payload)
+        second = self._worker(describe_error=service.error_payload)
+        started = threading.Event()
+
+        def fail():
+            started.set()
+            time.sleep(0.1)
+            raise RetriesExhausted('tavily.search', 3, TimeoutError('read timeout'))
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(first.do, 'k', fail)
+            started.wait(2)
+            with self.assertRaises(LeaderFailed) as failed:
+                second.do('k', lambda: 'unused')
+            with self.assertRaises(RetriesExhausted) as exhausted:
+                leader.result()
+
+        # 等待方与 leader 的响应一致（502，不建议整体重试）
+        self.assertEqual(service.error_payload(failed.exception), service.error_payload(exhausted.exception))
+        body, status = service.error_payload(failed.exception)
+        self.assertEqual(status, 502)
+        self.assertFalse(body['retryable'])
+        self.assertEqual(body['attempts'], 4)
+
+    def test_interrupted_leader_hands_over_to_other_process(self):
+        first, second = self._worker(), self._worker()
+        started = threading.Event()
+
+        def cancelled():
+            started.set()
+            time.sleep(0.1)
+            raise RequestCancelled('客户端已断开')
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(first.do, 'k', cancelled)
+            started.wait(2)
+            result, shared = second.do('k', lambda: 'recomputed')
+            with self.assertRaises(RequestCancelled):
+                leader.result()
+
+        self.assertEqual((result, shared), ('recomputed', False))
+        self.assertEqual(second.stats()['takeovers'], 1)
+
+    def test_abandoned_leader_is_taken_over(self):
+        store = FlightStore(self.path, lease=0.2)
+        # 模拟 leader 进程登记后退出、不再续租
+        self.assertTrue(store.acquire('k', 'dead-worker'))
+
+        worker = self._worker(lease=0.2)
+        result, shared = worker.do('k', lambda: 'recomputed')
+
+        self.assertEqual((result, shared), ('recomputed', False))
+        self.assertEqual(worker.stats()['takeovers'], 1)
+
+    def test_long_running_leader_keeps_its_lease(self):
+        first, second = self._worker(lease=0.15), self._worker(lease=0.15)
+        started = threading.Event()
+
+        def compute():
+            started.set()
+            time.sleep(0.5)
+            return 'done'
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            leader = executor.submit(first.do, 'k', compute)
+            started.wait(2)
+            self.assertEqual(second.do('k', lambda: 'duplicate'), ('done', True))
+        self.assertEqual(leader.result(), ('done', False))
+
+    def test_finished_results_are_not_reused_by_later_requests(self):
+        first, second = self._worker(), self._worker()
+        first.do('k', lambda: 'old')
+        self.assertEqual(second.do('k', lambda: 'new'), ('new', False))
+
+
+class ChapterRouteCoalescingTests(unittest.TestCase):
+    def test_duplicate_chapter_requests_run_the_pipeline_once(self):
+        started = threading.Event()
+        calls = []
+
+        def fake_generate(**params):
+            calls.append(params['chapter_id'])
+            started.set()
+            time.sleep(0.2)
+            return {'chapterId': params['chapter_id'], 'content': '# 市场分析', 'provider': 'openrouter'}
+
+        def post():
+            return service.app.test_client().post('/research/business-plan-chapter', json={
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP 重复请求'}]
+            })
+
+        with mock.patch.object(service, 'SINGLE_FLIGHT', SingleFlight()), \
+                mock.patch.object(service, 'generate_chapter_content', side_effect=fake_generate):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                first = executor.submit(post)
+                started.wait(2)
+                second = executor.submit(post)
+                responses = [first.result(), second.result()]
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r.status_code for r in responses], [200, 200])
+        self.assertEqual(responses[0].get_json(), responses[1].get_json())
+        self.assertNotIn(service.COALESCED_HEADER, responses[0].headers)
+        self.assertEqual(responses[1].headers[service.COALESCED_HEADER], 'true')
+
+    def test_follower_with_longer_deadline_does_not_inherit_leader_timeout(self):
+        started = threading.Event()
+        calls = []
+
+        def fake_generate(**params):
+            calls.append(params['chapter_id'])
+            started.set()
+            # 模拟流水线各阶段检查本请求的截止时间
+            for _ in range(15):
+                time.sleep(0.02)
+                deadlines.check('synthesis')
+            return {'chapterId': params['chapter_id'], 'content': '# 市场分析', 'provider': 'openrouter'}
+
+        def post(timeout):
+            return service.app.test_client().post('/research/business-plan-chapter', headers={
+                deadlines.DEADLINE_HEADER: timeout
+            }, json={
+                'chapterId': 'market-analysis',
+                'conversationHistory': [{'role': 'user', 'content': '宠物健身APP 截止时间不同的重复请求'}]
+            })
+
+        with mock.patch.object(service, 'SINGLE_FLIGHT', SingleFlight(is_abort=service.is_interruption)), \
+                mock.patch.object(service, 'generate_chapter_content', side_effect=fake_generate):
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                short = executor.submit(post, '0.1')
+                started.wait(2)
+                patient = executor.submit(post, '30')
+                responses = [short.result(), patient.result()]
+
+        self.assertEqual(responses[0].status_code, 504)
+        self.assertEqual(responses[1].status_code, 200)
+        self.assertEqual(responses[1].get_json()['content'], '# 市场分析')
+        # 等待方在 leader 超时后自行执行，结果不是共享的
+        self.assertNotIn(service.COALESCED_HEADER, responses[1].headers)
+        self.assertEqual(len(calls), 2)
+
+    def test_wait_timeout_maps_to_gateway_timeout(self):
+        body, status = service.error_payload(FlightTimeout('等待相同请求超时'))
+        self.assertEqual(status, 504)
+        self.assertTrue(body['retryable'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import hashlib
+import random
+import unittest
+from unittest import mock
+
+import source_dedup
+from source_dedup import SIMHASH_BITS, _shingles, canonicalize_url, dedupe_sources, simhash
+
+
+def _bitwise_simhash(text):
+    """逐位累加的参考实现"""
+    features = _shingles(text)
+    if len(features) < 4:
+        return None
+    weights = [0] * SIMHASH_BITS
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class CanonicalizeUrlTests(unittest.TestCase):
+    def test_equivalent_urls_collapse(self):
+        variants = [
+            'https://www.example.com/report/?utm_source=x&id=2&utm_medium=y',
+            'http://example.com/report?id=2#section',
+            'https://m.example.com:443/report/?id=2&spm=a1',
+        ]
+        self.assertEqual(len({canonicalize_url(url) for url in variants}), 1)
+
+    def test_meaningful_differences_are_kept(self):
+        self.assertNotEqual(
+            canonicalize_url('https://example.com/report?id=2'),
+            canonicalize_url('https://example.com/report?id=3')
+        )
+        self.assertNotEqual(
+            canonicalize_url('https://a.example.com/report'),
+            canonicalize_url('https://b.example.com/report')
+        )
+
+
+class SimhashTests(unittest.TestCase):
+    def test_matches_bitwise_reference(self):
+        rng = random.Random(11)
+        words = ['宠物', '健身', 'app', '用户', '市场', '规模', 'growth', '2025']
+        for _ in range(300):
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(0, 60)))
+            self.assertEqual(simhash(text), _bitwise_simhash(text), text)
+
+
+class DedupeSourcesTests(unittest.TestCase):
+    def test_syndicated_copy_is_dropped_and_best_kept(self):
+        snippet = '2025年中国宠物健身市场规模达到120亿元，同比增长35%，智能穿戴设备渗透率持续提升，用户付费意愿明显增强'
+        sources = [
+            {'title': '宠物健身市场报告', 'url': 'https://www.statista.com/pet', 'snippet': snippet},
+            {'title': '宠物健身市场报告', 'url': 'https://news.sohu.com/a/1', 'snippet': snippet + '。'},
+            {'title': '宠物健身市场报告', 'url': 'https://statista.com/pet/?utm_source=feed', 'snippet': 'x'},
+            {'title': '竞品格局', 'url': 'https://www.reuters.com/b', 'snippet': '主要竞品包括多家智能项圈厂商，市场前三名占据约六成份额，差异化集中在数据服务'},
+        ]
+
+        kept = dedupe_sources(sources)
+        self.assertEqual([s['url'] for s in kept], ['https://www.statista.com/pet', 'https://www.reuters.com/b'])
+
+    def test_limit_stops_after_enough_unique_sources(self):
+        sources = [{'title': f't{i}', 'url': f'https://example.com/{i}', 'snippet': ''} for i in range(20)]
+        self.assertEqual(len(dedupe_sources(sources, limit=5)), 5)
+
+    def test_only_unique_urls_within_limit_are_fingerprinted(self):
+        sources = [
+            {'title': '报告', 'url': 'https://www.example.com/a', 'snippet': '宠物健身市场规模持续增长'},
+            {'title': '报告', 'url': 'https://example.com/a/?utm_source=x', 'snippet': '宠物健身市场规模持续增长'},
+            {'title': '竞品', 'url': 'https://example.com/b', 'snippet': '主要竞品包括多家智能项圈厂商'},
+            {'title': '渠道', 'url': 'https://example.com/c', 'snippet': '线上渠道占比超过六成'},
+        ]
+        with mock.patch.object(source_dedup, 'simhash', wraps=simhash) as fingerprint:
+            kept = dedupe_sources(sources, limit=2)
+        self.assertEqual(len(kept), 2)
+        self.assertEqual(fingerprint.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
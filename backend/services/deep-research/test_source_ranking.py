@@ -1,5 +1,9 @@
+import random
 import unittest
+from unittest import mock
 
+import app
+import batch_ranking
 from app import append_canonical_source_list, rank_and_filter_sources
 
 
@@ -45,6 +49,33 @@ class SourceRankingTests(unittest.TestCase):
         self.assertTrue(any("statista.com" in item["url"] for item in ranked))
         self.assertTrue(all(item.get("relevance", 0) >= 0.75 for item in ranked))
 
+    @unittest.skipUnless(batch_ranking.available(), "numpy not installed")
+    def test_batch_ranking_matches_python_path(self):
+        rng = random.Random(3)
+        words = ["宠物", "健身", "app", "用户", "痛点", "机会", "市场", "需求", "noise", "thread"]
+        hosts = [
+            "www.statista.com", "forum.example.com", "news.example.org", "WWW.Reuters.com:8443",
+            "user@www.gov.uk.", "[::1]", "bad host.example.com"
+        ]
+        conversation = [{"role": "user", "content": "做一个面向宠物主的智能健身APP，关注用户痛点和市场机会"}]
+        raw_sources = [
+            {
+                "title": " ".join(rng.choice(words) for _ in range(4)),
+                "url": f"https://{rng.choice(hosts)}/item-{i}",
+                "snippet": " ".join(rng.choice(words) for _ in range(12)),
+                "relevance": rng.random(),
+            }
+            for i in range(300)
+        ]
+
+        def ranked(threshold):
+            with mock.patch.object(app, "BATCH_RANKING_MIN_SOURCES", threshold):
+                result = rank_and_filter_sources([dict(s) for s in raw_sources], conversation, "project-summary")
+            return [(item["url"], item["relevance"]) for item in result]
+
+        self.assertEqual(ranked(float("inf")), ranked(0))
+        self.assertTrue(ranked(0))
+
     def test_append_canonical_source_list_replaces_existing_list(self):
         content = "## 结论\n这是正文\n\n## 来源清单\n1. 旧来源 - https://old.example.com"
         sources = [
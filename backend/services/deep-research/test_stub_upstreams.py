@@ -0,0 +1,54 @@
+import unittest
+
+import httpx
+
+from bench_service import percentile
+from stub_upstreams import LatencyModel, start_openrouter_stub, start_tavily_stub
+
+
+class LatencyModelTests(unittest.TestCase):
+    def test_parse_specs(self):
+        self.assertEqual(LatencyModel.parse('fixed:0.2').sample(), 0.2)
+        uniform = LatencyModel.parse('uniform:0.1:0.3', seed=1)
+        self.assertTrue(all(0.1 <= uniform.sample() <= 0.3 for _ in range(50)))
+        lognormal = LatencyModel.parse('lognormal:0.5:0.3', seed=1)
+        samples = sorted(lognormal.sample() for _ in range(201))
+        self.assertAlmostEqual(samples[100], 0.5, delta=0.1)
+        with self.assertRaises(ValueError):
+            LatencyModel.parse('pareto:1')
+
+    def test_nearest_rank_percentile(self):
+        values = [float(i) for i in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertIsNone(percentile([], 50))
+
+
+class StubServerTests(unittest.TestCase):
+    def test_openrouter_stub_speaks_chat_completions(self):
+        server = start_openrouter_stub()
+        self.addCleanup(server.stop)
+        response = httpx.post(f'{server.url}/api/v1/chat/completions', json={
+            'model': 'm', 'max_tokens': 2000, 'messages': [{'role': 'user', 'content': 'URL: a\nURL: b'}]
+        })
+        body = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('[1]', body['choices'][0]['message']['content'])
+        self.assertGreater(body['usage']['total_tokens'], 0)
+
+    def test_tavily_stub_echoes_query_terms_and_injects_faults(self):
+        server = start_tavily_stub()
+        self.addCleanup(server.stop)
+        body = httpx.post(f'{server.url}/search', json={'query': '宠物 健身 市场', 'max_results': 5}).json()
+        self.assertEqual(len(body['results']), 5)
+        self.assertTrue(all('宠物' in r['content'] or '健身' in r['content'] for r in body['results']))
+
+        failing = start_tavily_stub(error_rate=1.0)
+        self.addCleanup(failing.stop)
+        statuses = [httpx.post(f'{failing.url}/search', json={'query': 'x'}).status_code for _ in range(2)]
+        self.assertEqual(statuses, [429, 500])
+        self.assertEqual(failing.config.stats()['errors'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
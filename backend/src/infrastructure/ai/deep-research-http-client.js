@@ -59,6 +59,11 @@ export async function callDeepResearchService(
         error.code === 'ENOTFOUND' || // 域名解析失败
         (error.response && error.response.status >= 500); // 服务器错误
 
+      // 服务内部已按重试策略重试过上游调用（retryable: false），不再整体重试流水线
+      if (error.response && error.response.data && error.response.data.retryable === false) {
+        throw new Error(`DeepResearch服务错误: ${error.response.data.error || error.message}`);
+      }
+
       // 如果是超时错误（ECONNABORTED），不重试，直接抛出
       if (error.code === 'ECONNABORTED') {
         throw new Error('DeepResearch生成超时（10分钟），请检查服务状态或稍后重试');